@@ -4,38 +4,47 @@
 #                                                                              #
 #   This plugin warns and temporarily bans players who use bad language.       #
 #                                                                              #
-#   The list of bannedwords are configurable here, by modifying the variables  #
-#   RACIST_WORDS, EXPLITIVES, and VULGAR_WORDS.  The duration of the temporary #
-#   ban and the violation limit can be configured here as well.                #
+#   The list of banned words is configurable here, by modifying the variables  #
+#   RACIST_WORDS, EXPLITIVES, and VULGAR_WORDS, or per-server, by setting the  #
+#   'word_list_file' option.  Word list files are reloaded when they change.   #
+#   The duration of the temporary ban and the violation limit can be           #
+#   configured here as well.                                                   #
 #                                                                              #
 ################################################################################
 
+from ZDStack.Plugins import subscribes_to
+from ZDStack.ZDSWordMatcher import WordMatcher
+
 RACIST_WORDS = ['nigger', 'kike', 'wop', 'spic', 'cracker', 'honky',
                 'porchmonkey', 'beaner', 'gook', 'wetback']
 EXPLITIVES = ['fuck', 'shit', 'damn', 'ass', 'bitch', 'faggot', 'fag', 'phag']
 VULGAR_WORDS = ['cock', 'cunt', 'pussy', 'dick', 'anus', 'asshole', 'vagina',
                 'penis']
 BAD_WORDS = RACIST_WORDS + EXPLITIVES + VULGAR_WORDS
+BAD_WORDS_MATCHER = WordMatcher(BAD_WORDS)
 BAD_LANGUAGE_LIMIT = 2
 BAN_LENGTH = 15 # 15 minutes
 
+@subscribes_to(event_types=['message'])
 def clean_language(event, zserv):
-    if not event.type == 'message':
+    ###
+    # An empty word list turns filtering off, so only fall back to the
+    # built-in words when there's no word list at all.
+    ###
+    matcher = zserv.get_word_matcher()
+    if matcher is None:
+        matcher = BAD_WORDS_MATCHER
+    if matcher.search(event.data['message']) is None:
         return
-    contents = event.data['message'].lower()
     p = event.data['messenger']
-    for w in BAD_WORDS:
-        if w in contents:
-            if not hasattr(p, 'bad_language'):
-                p.bad_language = 0
-            p.bad_language += 1
-            if p.bad_language >= BAD_LANGUAGE_LIMIT:
-                p.bad_language = 0
-                reason = "Language - %d minute ban" % (BAN_LENGTH)
-                zserv.zaddtimedban(BAN_LENGTH, p.ip, reason=reason)
-            else:
-                zs = "%s, this is a clean language server.  %d more violations"
-                zs += " and you will be temporarily banned."
-                zserv.zsay(zs % (p.name, BAD_LANGUAGE_LIMIT - p.bad_language))
-            break
+    violations = zserv.plugin_state.player_map('clean_language_violations', 0)
+    bad_language = violations.add(p)
+    if bad_language >= BAD_LANGUAGE_LIMIT:
+        violations.pop(p)
+        reason = "Language - %d minute ban" % (BAN_LENGTH)
+        zserv.zaddtimedban(BAN_LENGTH, p.ip, reason=reason)
+    else:
+        zs = "%s, this is a clean language server.  %d more violations"
+        zs += " and you will be temporarily banned."
+        zserv.zsay(zs % (p.name, BAD_LANGUAGE_LIMIT - bad_language))
 
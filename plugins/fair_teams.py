@@ -17,18 +17,22 @@
 
 from __future__ import with_statement
 
+import random
+
 from threading import Timer
 from ZDStack import TEAM_COLORS, PlayerNotFoundError
+from ZDStack.Plugins import subscribes_to
 from ZDStack.ZServ import TEAM_MODES
 
 BALANCE_WINDOW = 15 # 15 seconds
 
 ###
-# Because we've already acquired the ZServ's event lock, we don't separate
-# locks around our data structures like zserv.fair_teams_player_timers and
-# zserv.fair_teams_team_timer_running.
+# The timers waiting on players and teams are kept in the ZServ's plugin
+# state, so they're forgotten when the round ends.  Team sizes and scores are
+# kept up to date by ZDStack itself, so we don't have to count them.
 ###
 
+@subscribes_to(event_types=['team_switch', 'team_join', 'disconnection'])
 def fair_teams(event, zserv):
     ###
     # We put this here so it's not picked up by inspect() looking for
@@ -36,19 +40,13 @@ def fair_teams(event, zserv):
     ###
     from ZDStack import get_zdslog
     zdslog = get_zdslog()
-    if not hasattr(zserv, 'fair_teams_balance_window'):
-        zserv.fair_teams_balance_window = BALANCE_WINDOW
-    if not hasattr(zserv, 'fair_teams_player_timers'):
-        zserv.fair_teams_player_timers = list()
-    if not hasattr(zserv, 'fair_teams_team_timer_running'):
-        zserv.fair_teams_team_timer_running = False
     if not zserv.game_mode in TEAM_MODES:
         return
-    if not event.type in ('team_switch', 'team_join', 'disconnection'):
-        return
-    zdslog.debug("Player Timers: %s" % (zserv.fair_teams_player_timers))
-    _ds = "Team Timer Running: %s"
-    zdslog.debug(_ds % (zserv.fair_teams_team_timer_running))
+    state = zserv.plugin_state
+    player_timers = state.player_map('fair_teams_player_timers')
+    team_timers = state.counter('fair_teams_team_timers')
+    zdslog.debug("Player Timers: %s" % (player_timers.items()))
+    zdslog.debug("Team Timers Running: %s" % (team_timers.value))
     zdslog.debug("Event Type: %s" % (event.type))
     try:
         player = zserv.players.get(event.data['player'])
@@ -59,7 +57,7 @@ def fair_teams(event, zserv):
         return
     spec_colors = [x for x in TEAM_COLORS if x not in zserv.playing_colors]
     max_teams = len(zserv.playing_colors)
-    playing_players = len([x for x in zserv.players if x.playing])
+    playing_players = state.get_playing_player_count()
     min_players = playing_players / max_teams
     max_players = min_players + (playing_players % max_teams)
 
@@ -70,8 +68,8 @@ def fair_teams(event, zserv):
             if not losing_team_colors:
                 losing_team_colors.append(playing_color)
             else:
-                score = zserv.team_scores[playing_color]
-                losing_score = zserv.team_scores[losing_team_colors[0]]
+                score = state.get_team_score(playing_color)
+                losing_score = state.get_team_score(losing_team_colors[0])
                 if score < losing_score:
                     losing_team_colors = [playing_color]
                 elif score == losing_score:
@@ -84,7 +82,7 @@ def fair_teams(event, zserv):
             return [y for y in x if y.color == team_color and y.playing]
 
     def _count_team_members(team_color):
-        return len(_get_team_members(team_color))
+        return state.get_team_member_count(team_color)
 
     def _group_teams():
         above_average = []
@@ -121,24 +119,20 @@ def fair_teams(event, zserv):
             msg2 = "%d seconds or random players from offending teams will "
             msg3 = "be kicked"
         msg = msg1 + msg2 + msg3
-        t = Timer(zserv.fair_teams_balance_window, _team_retribution,
-                  args=[True])
+        t = Timer(BALANCE_WINDOW, _team_retribution, args=[True])
         t.start()
-        zserv.fair_teams_team_timer_running = True
-        msg = msg % tuple(above_average + [zserv.fair_teams_balance_window])
+        team_timers.add()
+        msg = msg % tuple(above_average + [BALANCE_WINDOW])
         zserv.zsay(msg)
 
     def _player_retribution(player, new_team, check_again, timer):
         zdslog.debug("This is _player_retribution")
-        zserv.fair_teams_player_timers.remove(timer)
+        if player_timers.get(player) is timer:
+            player_timers.pop(player)
         zdslog.debug("Player.color: %s" % (player.color))
         zdslog.debug("New_team: %s" % (new_team))
         if player.playing and player.color == new_team:
             zdslog.debug("Player has not switched teams")
-            max_teams = len(zserv.playing_colors)
-            playing_players = len([x for x in zserv.players if x.playing])
-            min_players = playing_players / max_teams
-            max_players = min_players + (playing_players % max_teams)
             above_average, within_range, below_average = _group_teams()
             losing_teams = _get_losing_teams()
             if new_team in above_average:
@@ -149,7 +143,7 @@ def fair_teams(event, zserv):
                 zserv.zkick(player.number, msg)
             else:
                 zdslog.debug("Player avoided a swift kick")
-        if not zserv.fair_teams_team_timer_running and check_again:
+        if not team_timers.value and check_again:
             ###
             # We're not checking for a specific player this time, so do a
             # _check_teams()
@@ -157,17 +151,16 @@ def fair_teams(event, zserv):
             _check_teams(False)
 
     def _team_retribution(check_again):
-        zserv.fair_teams_team_timer_running = False
-        max_teams = len(zserv.playing_colors)
-        playing_players = len([x for x in zserv.players if x.playing])
-        min_players = playing_players / max_teams
-        max_players = min_players + (playing_players % max_teams)
+        team_timers.reset()
+        playing_players = state.get_playing_player_count()
+        max_players = (playing_players / max_teams) + \
+                      (playing_players % max_teams)
         above_average, within_range, below_average = _group_teams()
         for team in above_average:
             members = _get_team_members(team)
             for x in range(len(members) - max_players):
                 player_number = random.choice(members).number
-                zserv.kick(player_number, "Keep the teams balanced")
+                zserv.zkick(player_number, "Keep the teams balanced")
                 members = _get_team_members(team)
         if check_again:
             _check_teams(False)
@@ -206,12 +199,11 @@ def fair_teams(event, zserv):
             msg3 = "joining the winning team."
         else:
             return
-        for player_timer in zserv.fair_teams_player_timers:
-            if player == player_timer.args[0]:
-                ###
-                # Clock's already ticking, leave this one alone for now.
-                ###
-                return
+        if player in player_timers:
+            ###
+            # Clock's already ticking, leave this one alone for now.
+            ###
+            return
         ###
         # At this point, this player does not yet have a timer waiting on
         # them.
@@ -224,15 +216,14 @@ def fair_teams(event, zserv):
         msg1 = "The %s team has too many players, even the teams within %d "
         msg2 = "seconds, or %s will be kicked for "
         m = msg1 + msg2 + msg3
-        m = m % (team, zserv.fair_teams_balance_window, player.name)
+        m = m % (team, BALANCE_WINDOW, player.name)
         zserv.zsay(m)
         args = [player, team, True]
-        t = Timer(zserv.fair_teams_balance_window, _player_retribution,
-                  args=args)
+        t = Timer(BALANCE_WINDOW, _player_retribution, args=args)
         args.append(t)
-        zserv.fair_teams_player_timers.append(t)
+        player_timers.set(player, t)
         t.start()
-    elif not zserv.fair_teams_team_timer_running:
+    elif not team_timers.value:
         ###
         # Player(s) have disconnected, so players from the other team might
         # need to switch over to fill the gaps.
@@ -17,21 +17,18 @@ KICK_LIMIT = 2
 BAN_LENGTH = 15 # 15 minutes
 
 from ZDStack import PlayerNotFoundError
+from ZDStack.Plugins import subscribes_to
 
+@subscribes_to(event_types=['kick_command'])
 def kick_limit(event, zserv):
-    if not event.type == 'kick_command':
+    try:
+        player_name = event.data['player_name']
+        player = zserv.players.get(name=player_name)
+    except PlayerNotFoundError:
         return
-    with zserv.players.lock:
-        try:
-            player_name = event.data['player_name']
-            player = zserv.players.get(name=player_name, acquire_lock=False)
-        except PlayerNotFoundError:
-            return
-        if not hasattr(player, 'number_of_kicks'):
-            player.number_of_kicks = 0
-        player.number_of_kicks += 1
-        if player.number_of_kicks >= KICK_LIMIT:
-            player.number_of_kicks = 0
-            reason = "Exceeded the kick limit - %d minute ban" % (BAN_LENGTH)
-            zserv.zaddtimedban(BAN_LENGTH, player.ip, reason=reason)
+    kicks = zserv.plugin_state.player_map('kick_limit_kicks', 0)
+    if kicks.add(player) >= KICK_LIMIT:
+        kicks.pop(player)
+        reason = "Exceeded the kick limit - %d minute ban" % (BAN_LENGTH)
+        zserv.zaddtimedban(BAN_LENGTH, player.ip, reason=reason)
 
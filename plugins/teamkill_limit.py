@@ -13,39 +13,37 @@
 
 from __future__ import with_statement
 
+from ZDStack import PlayerNotFoundError
 from ZDStack.ZServ import FFA_MODES, DUEL_MODES
+from ZDStack.Plugins import subscribes_to
 
 TEAMKILL_LIMIT = 5
 BAN_LENGTH = 15 # 15 minutes
 
+@subscribes_to(event_types=['frag'])
 def ban_teamkillers(event, zserv):
-    if not event.type == 'frag' or not 'fragger' in event.data or \
+    if not 'fragger' in event.data or \
            zserv.game_mode in FFA_MODES + DUEL_MODES:
         ###
-        # Ignore non-frag events and suicides.  Also in a FFA or Duel, player
+        # Ignore suicides.  Also in a FFA or Duel, player
         # colors will both be None, so ignore those modes too.
         ###
         return
     try:
-        ###
-        # Cover all our bases here and monkeypatch both fragger and fraggee.
-        ###
         fragger = zserv.players.get(name=event.data['fragger'])
-        if not hasattr(fragger, 'teamkills'):
-            fragger.teamkills = 0
         fraggee = zserv.players.get(name=event.data['fraggee'])
-        if not hasattr(fraggee, 'teamkills'):
-            fraggee.teamkills = 0
     except PlayerNotFoundError:
         return
-    if fragger.color == fraggee.color:
-        fragger.teamkills += 1
-    if fragger.teamkills == (TEAMKILL_LIMIT - 1):
+    if fragger.color != fraggee.color:
+        return
+    teamkills = zserv.plugin_state.player_map('teamkill_limit_teamkills', 0)
+    fragger_teamkills = teamkills.add(fragger)
+    if fragger_teamkills == (TEAMKILL_LIMIT - 1):
         msg = "%s, one more teamkill and you will be temporarily banned "
         msg += "for %d minutes"
         zserv.zsay(msg % (fragger.name, BAN_LENGTH))
-    elif fragger.teamkills >= TEAMKILL_LIMIT:
-        fragger.teamkills = 0
+    elif fragger_teamkills >= TEAMKILL_LIMIT:
+        teamkills.pop(fragger)
         reason = 'Exceeded the teamkill limit - %d minute ban' % (BAN_LENGTH)
         zserv.zaddtimedban(BAN_LENGTH, fragger.ip, reason)
 
@@ -15,14 +15,18 @@
 
 from __future__ import with_statement
 
+from ZDStack.Plugins import subscribes_to
+
+@subscribes_to(event_types=['player_lookup'])
 def unique_players(event, zserv):
     ###
-    # Really, this should monkeypatch PlayersList.add() for every zserv.
+    # ZDStack counts connected players by name, so most of the time we don't
+    # have to look through the players list at all.
     ###
-    if not event.type == 'player_lookup':
-        return
     reason = "Player names must unique, %s is already in use"
     player_name = event.data['player_name']
+    if zserv.plugin_state.get_name_count(player_name) < 2:
+        return
     found = False
     with zserv.players.lock:
         for p in zserv.players:
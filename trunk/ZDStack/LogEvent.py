@@ -1,7 +1,20 @@
+def _intern(s):
+    """Interns a string, if possible.
+
+    :param s: the string to intern
+    :type s: string
+    :returns: the interned string, or s itself if it can't be interned
+              (i.e., it's a unicode string or None)
+
+    """
+    if type(s) is str:
+        return intern(s)
+    return s
+
 class LogEvent(object):
 
     """LogEvent represents an event occurring in a log file.
-    
+
     .. attribute:: dt
         A datetime representing the time at which the event occurred.
     .. attribute:: type
@@ -10,18 +23,55 @@ class LogEvent(object):
         A dict containing event-specific data.
     .. attribute:: category
         A string representing the category of the event.
-    
+    .. attribute:: line
+        The line from which the event was parsed, if any.
+
+    There are a lot of LogEvents (one per line of zserv output), so
+    LogEvent uses __slots__ and interns its type and category strings.
+    event_data can also be given as a tuple of (key, value) pairs, in
+    which case the 'data' dict isn't built until something asks for it.
+
     """
 
+    __slots__ = ('dt', '_type', '_data', '_category', 'line')
+
     def __init__(self, event_dt, event_type, event_data, event_category,
                        line=''):
         """Initializes a LogEvent instance."""
         self.dt = event_dt
-        self.type = event_type
-        self.data = event_data
-        self.category = event_category
+        self._type = _intern(event_type)
+        self._data = event_data
+        self._category = _intern(event_category)
         self.line = line
 
+    def _get_type(self):
+        return self._type
+
+    def _set_type(self, event_type):
+        self._type = _intern(event_type)
+
+    def _get_category(self):
+        return self._category
+
+    def _set_category(self, event_category):
+        self._category = _intern(event_category)
+
+    def _get_data(self):
+        if type(self._data) is tuple:
+            ###
+            # Most events' data is never looked at (junk events, for example)
+            # so we only build the dict when we have to.
+            ###
+            self._data = dict(self._data)
+        return self._data
+
+    def _set_data(self, event_data):
+        self._data = event_data
+
+    type = property(_get_type, _set_type)
+    category = property(_get_category, _set_category)
+    data = property(_get_data, _set_data)
+
     def __str__(self):
         return "<Event %s at %s>" % (self.type, self.dt)
 
@@ -1,12 +1,124 @@
+from __future__ import with_statement
+
 import os
 import imp
+import _ast
+import struct
+import cPickle
 import inspect
-import compileall
+import py_compile
+
+from threading import Lock
+
+from ZDStack import get_zdslog
+
+zdslog = get_zdslog()
+
+###
+# The name of the file in the plugin folder that the plugin manifest is saved
+# in, see PluginLoader.
+###
+MANIFEST_FILE = '.zdstack_plugins'
 
 ###
 # Whoa, badass black magic.
 ###
 
+def subscribes_to(event_types=None, event_categories=None):
+    """A decorator that subscribes a plugin to events.
+
+    :param event_types: the types of events the plugin handles
+    :type event_types: list of strings
+    :param event_categories: the categories of events the plugin
+                             handles
+    :type event_categories: list of strings
+
+    Plugins are only called for events whose type is in event_types
+    or whose category is in event_categories.  Plugins that don't use
+    this decorator are called for every event.  For example::
+
+        from ZDStack.Plugins import subscribes_to
+
+        @subscribes_to(event_types=['frag'])
+        def ban_teamkillers(event, zserv):
+            ...
+
+    Callable class plugins can instead define 'event_types' and
+    'event_categories' class attributes.
+
+    """
+    def decorator(plugin):
+        plugin.event_types = frozenset(event_types or ())
+        plugin.event_categories = frozenset(event_categories or ())
+        return plugin
+    return decorator
+
+def handles_event(plugin, event_type, event_category):
+    """Tests whether a plugin is subscribed to an event.
+
+    :param plugin: the plugin to test
+    :type plugin: function
+    :param event_type: the type of the event
+    :type event_type: string
+    :param event_category: the category of the event
+    :type event_category: string
+    :rtype: boolean
+
+    """
+    event_types = getattr(plugin, 'event_types', None)
+    event_categories = getattr(plugin, 'event_categories', None)
+    if event_types is None and event_categories is None:
+        ###
+        # Plugins that don't subscribe to anything get everything.
+        ###
+        return True
+    return event_type in (event_types or ()) or \
+           event_category in (event_categories or ())
+
+class DispatchTable(object):
+
+    """DispatchTable maps events to the plugins subscribed to them.
+
+    .. attribute:: plugins
+        The list of plugins this DispatchTable was built from.
+
+    The table is filled in as events are seen, so after the first
+    event of a given type and category, finding its plugins is a
+    single dict lookup.  Plugins are always returned in the same order
+    they're listed in 'plugins'.
+
+    """
+
+    def __init__(self, plugins):
+        """Initializes a DispatchTable.
+
+        :param plugins: the plugins to dispatch events to
+        :type plugins: list of functions
+
+        """
+        self.plugins = plugins
+        self._table = dict()
+
+    def get_plugins(self, event):
+        """Gets the plugins subscribed to an event.
+
+        :param event: the event
+        :type event: :class:`~ZDStack.LogEvent.LogEvent`
+        :rtype: tuple of functions
+
+        """
+        key = (event.type, event.category)
+        try:
+            return self._table[key]
+        except KeyError:
+            ###
+            # Two threads can race to fill in the same key, but they'll
+            # both come up with the same tuple, so it doesn't matter.
+            ###
+            x = tuple([p for p in self.plugins if handles_event(p, *key)])
+            self._table[key] = x
+            return x
+
 def is_plugin(p):
     """Test if something is a plugin.
 
@@ -15,58 +127,234 @@ def is_plugin(p):
     :rtype: Boolean
 
     """
-    return not p.startswith('__init__.py') and p.endswith('.pyc')
+    return not p.startswith('__init__.py') and p.endswith('.py')
+
+def get_defined_names(path):
+    """Gets the names a plugin file defines, without importing it.
 
-def get_modules(plugin_path):
-    """Get compiled plugin modules.
+    :param path: the full path to the plugin file
+    :type path: string
+    :rtype: list of strings
+    :returns: the names of the file's top-level functions, classes
+              and variables, i.e. the plugins it may define
 
-    :param plugin_path: a string representing the full path to the
-                        plugin folder
-    :rtype: list of compiled plugin module objects
+    If the file can't be parsed, an empty list is returned.
 
     """
-    modules = []
-    compileall.compile_dir(plugin_path, quiet=True)
-    plugin_names = [x for x in os.listdir(plugin_path) if is_plugin(x)]
-    for p in [os.path.join(plugin_path, x) for x in plugin_names]:
-        info = inspect.getmoduleinfo(p)
-        if not info:
-            continue
+    try:
+        fobj = open(path, 'rU')
         try:
-            m = imp.load_compiled(info[0], p)
-        except ImportError:
-            m = imp.load_source(info[0], p)
-        modules.append(m)
-    return modules
+            source = fobj.read()
+        finally:
+            fobj.close()
+        tree = compile(source, path, 'exec', _ast.PyCF_ONLY_AST)
+    except (IOError, SyntaxError), e:
+        zdslog.error("Error parsing plugin file %s: %s" % (path, e))
+        return []
+    names = list()
+    for node in tree.body:
+        if isinstance(node, (_ast.FunctionDef, _ast.ClassDef)):
+            names.append(node.name)
+        elif isinstance(node, _ast.Assign):
+            names.extend([x.id for x in node.targets
+                                 if isinstance(x, _ast.Name)])
+    return names
 
 def extract_module_callables(module):
     """Extract the functions from a plugin module.
 
-    :param module: a plugin module.  get_modules returns a list of
-                   these.
+    :param module: a plugin module
     :rtype: a list of function objects
 
+    Functions imported into the module from elsewhere (like
+    :func:`subscribes_to`) are skipped.
+
     """
     functions = []
     for m in [x for x in inspect.getmembers(module) if x[0] != '__builtins__']:
         if inspect.isfunction(m[1]):
-            functions.append(m[1])
+            if m[1].__module__ == module.__name__:
+                functions.append(m[1])
         elif inspect.isclass(m[1]) and hasattr(m[1], '__call__'):
-            f = lambda event, zserv: m[1](event, zserv)()
+            f = lambda event, zserv, cls=m[1]: cls(event, zserv)()
             f.__name__ = m[0]
+            for attr in ('event_types', 'event_categories', 'timeout'):
+                if hasattr(m[1], attr):
+                    setattr(f, attr, getattr(m[1], attr))
             functions.append(f)
     return functions
 
-def get_plugins(plugin_path):
-    """Get all plugin functions.
+def get_compiled_mtime(compiled_path):
+    """Gets the source modification time a compiled file was made from.
 
-    :param plugin_path: a string representing the full path to the
-                        plugin folder.
-    :rtype: a list of functions
+    :param compiled_path: the full path to the compiled (.pyc) file
+    :type compiled_path: string
+    :rtype: int
+    :returns: the modification time of the source file (in whole
+              seconds) recorded in the compiled file's header, or None
+              if the file can't be read or was compiled by a different
+              version of Python
 
     """
-    plugins = []
-    for module in get_modules(plugin_path):
-        plugins.extend(extract_module_callables(module))
-    return plugins
+    try:
+        fobj = open(compiled_path, 'rb')
+        try:
+            header = fobj.read(8)
+        finally:
+            fobj.close()
+    except (IOError, OSError):
+        return None
+    if len(header) < 8 or header[:4] != imp.get_magic():
+        return None
+    return struct.unpack('<I', header[4:])[0]
+
+class PluginLoader(object):
+
+    """PluginLoader finds and loads the plugins in a plugin folder.
+
+    .. attribute:: plugin_path
+        A string representing the full path to the plugin folder.
+
+    .. attribute:: manifest_file
+        A string representing the full path to the file the manifest
+        is saved in.
+
+    .. attribute:: lock
+        A Lock that must be acquired before using manifest or modules.
+
+    .. attribute:: manifest
+        A dict mapping plugin file names to
+        (<float: mtime>, <list: names>) tuples, see
+        :func:`get_defined_names`.
+
+    .. attribute:: modules
+        A dict mapping the names of loaded plugin files to
+        (<float: mtime>, <list: plugins>) tuples.
+
+    Plugin files are parsed, not imported, to find out which plugins
+    they may define, and the results are saved in the manifest keyed
+    by the files' modification times, so unchanged files aren't parsed
+    again, even after a restart.  Only files that may define requested
+    plugins are imported, and they're only compiled if they've changed
+    since they were last compiled, i.e. if their modification time
+    differs (older or newer) from the one recorded in the compiled
+    file.  Files that have changed are imported again the next time
+    their plugins are requested, so plugins can be reloaded without
+    restarting ZDStack.
+
+    """
+
+    def __init__(self, plugin_path):
+        """Initializes a PluginLoader.
+
+        :param plugin_path: the full path to the plugin folder
+        :type plugin_path: string
+
+        """
+        self.plugin_path = plugin_path
+        self.manifest_file = os.path.join(plugin_path, MANIFEST_FILE)
+        self.lock = Lock()
+        self.manifest = self._load_manifest()
+        self.modules = dict()
+
+    def _load_manifest(self):
+        if not os.path.isfile(self.manifest_file):
+            return dict()
+        try:
+            fobj = open(self.manifest_file, 'rb')
+            try:
+                manifest = cPickle.load(fobj)
+            finally:
+                fobj.close()
+        except Exception, e:
+            es = "Error loading plugin manifest %s, ignoring it: %s"
+            zdslog.error(es % (self.manifest_file, e))
+            return dict()
+        if not isinstance(manifest, dict):
+            return dict()
+        return manifest
+
+    def _save_manifest(self):
+        tmp_file = self.manifest_file + '.tmp'
+        try:
+            fobj = open(tmp_file, 'wb')
+            try:
+                cPickle.dump(self.manifest, fobj, 2)
+            finally:
+                fobj.close()
+            os.rename(tmp_file, self.manifest_file)
+        except Exception, e:
+            es = "Error saving plugin manifest %s: %s"
+            zdslog.error(es % (self.manifest_file, e))
+
+    def _scan(self):
+        changed = False
+        file_names = [x for x in os.listdir(self.plugin_path) if is_plugin(x)]
+        for file_name in file_names:
+            path = os.path.join(self.plugin_path, file_name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            entry = self.manifest.get(file_name)
+            if entry and entry[0] == mtime:
+                continue
+            self.manifest[file_name] = (mtime, get_defined_names(path))
+            changed = True
+        for file_name in [x for x in self.manifest if x not in file_names]:
+            del self.manifest[file_name]
+            self.modules.pop(file_name, None)
+            changed = True
+        if changed:
+            self._save_manifest()
+
+    def _load(self, file_name, mtime):
+        loaded = self.modules.get(file_name)
+        if loaded and loaded[0] == mtime:
+            return loaded[1]
+        path = os.path.join(self.plugin_path, file_name)
+        compiled_path = path + 'c'
+        module_name = os.path.splitext(file_name)[0]
+        try:
+            ###
+            # Files restored with their original times (by 'cp -p',
+            # 'rsync -a' or tar) can be older than their compiled files, so
+            # any difference means the compiled file is stale.
+            ###
+            if get_compiled_mtime(compiled_path) != \
+               int(mtime) & 0xFFFFFFFF:
+                py_compile.compile(path, compiled_path, doraise=True)
+            try:
+                module = imp.load_compiled(module_name, compiled_path)
+            except ImportError:
+                module = imp.load_source(module_name, path)
+        except Exception, e:
+            zdslog.error("Error loading plugin file %s: %s" % (path, e))
+            plugins = []
+        else:
+            plugins = extract_module_callables(module)
+            if loaded:
+                zdslog.info("Reloaded plugin file %s" % (path))
+        self.modules[file_name] = (mtime, plugins)
+        return plugins
+
+    def get_plugins(self, names='all'):
+        """Gets plugins.
+
+        :param names: the names of the plugins to get, if 'all', gets
+                      all plugins
+        :type names: list of strings or string
+        :rtype: a list of functions
+
+        """
+        plugins = []
+        with self.lock:
+            self._scan()
+            for file_name in sorted(self.manifest):
+                mtime, defined_names = self.manifest[file_name]
+                if names != 'all' and \
+                   not [x for x in defined_names if x in names]:
+                    continue
+                plugins.extend(self._load(file_name, mtime))
+        return [x for x in plugins if names == 'all' or x.__name__ in names]
 
@@ -11,10 +11,19 @@
 #
 ###
 
+from __future__ import with_statement
+
 import sys
+import time
+import Queue
+import select
+import socket
+import httplib
 import datetime
 import SocketServer
 
+from threading import BoundedSemaphore, Lock
+
 try:
     import fcntl
 except ImportError:
@@ -23,11 +32,12 @@ except ImportError:
 from types import StringType
 from SimpleXMLRPCServer import SimpleXMLRPCDispatcher, \
                                SimpleXMLRPCRequestHandler
-from xmlrpclib import Fault, Transport, SafeTransport, ServerProxy, \
+from xmlrpclib import Fault, Transport, ServerProxy, ProtocolError, \
                       FastMarshaller, Marshaller, _Method
 
-from ZDStack import RPCAuthenticationError, get_json_module, get_zdslog, \
-                    get_debugging
+from ZDStack import ZDSThreadPool
+from ZDStack import MAX_TIMEOUT, RPCAuthenticationError, RPCServerBusyError, \
+                    get_json_module, get_zdslog, get_debugging
 
 class JSONRPCException(Exception):
 
@@ -49,6 +59,9 @@ class AuthenticatedRPCDispatcher(SimpleXMLRPCDispatcher):
         A string representing the authenticating username
     .. attribute:: password
         A string representing the authenticating password
+    .. attribute:: method_semaphores
+        A dict mapping method names to the BoundedSemaphores that limit
+        how many calls to them can run at once.
 
     """
 
@@ -57,9 +70,12 @@ class AuthenticatedRPCDispatcher(SimpleXMLRPCDispatcher):
         self.username = username
         self.password = password
         self.methods_requiring_authentication = set()
+        self.method_semaphores = dict()
+        self.concurrency_groups = dict()
 
     def register_function(self, function, name=None,
-                          requires_authentication=False):
+                          requires_authentication=False,
+                          max_concurrency=None, concurrency_group=None):
         """Registers a function to respond to RPC requests.
 
         :param function: the function to register
@@ -70,12 +86,37 @@ class AuthenticatedRPCDispatcher(SimpleXMLRPCDispatcher):
         :param requires_authentication: whether or not the function
                                         requires authentication.
         :type requires_authentication: boolean
+        :param max_concurrency: optional, the maximum number of calls
+                                to the function that can run at once;
+                                unlimited by default.
+        :type max_concurrency: int
+        :param concurrency_group: optional, the name of a group of
+                                  functions that share a single
+                                  max_concurrency limit.  The limit is
+                                  set by the first function registered
+                                  in the group.
+        :type concurrency_group: string
+
+        Calls over the limit are refused with a
+        :class:`~ZDStack.RPCServerBusyError` instead of waiting, so they
+        don't tie up the server's worker threads.
 
         """
         name = name or function.__name__
         self.funcs[name] = function
         if requires_authentication:
             self.methods_requiring_authentication.add(name)
+        if concurrency_group:
+            if concurrency_group not in self.concurrency_groups:
+                if not max_concurrency:
+                    es = "Concurrency group [%s] requires a limit"
+                    raise ValueError(es % (concurrency_group))
+                semaphore = BoundedSemaphore(max_concurrency)
+                self.concurrency_groups[concurrency_group] = semaphore
+            semaphore = self.concurrency_groups[concurrency_group]
+            self.method_semaphores[name] = semaphore
+        elif max_concurrency:
+            self.method_semaphores[name] = BoundedSemaphore(max_concurrency)
 
     def _dispatch(self, method, params):
         """Dispatches an RPC call.
@@ -93,13 +134,188 @@ class AuthenticatedRPCDispatcher(SimpleXMLRPCDispatcher):
             username, password, params = params[0], params[1], params[2:]
             if (username, password) != (self.username, self.password):
                 raise RPCAuthenticationError(username)
-        return SimpleXMLRPCDispatcher._dispatch(self, method, params)
+        semaphore = self.method_semaphores.get(method)
+        if semaphore is None:
+            return SimpleXMLRPCDispatcher._dispatch(self, method, params)
+        if not semaphore.acquire(False):
+            raise RPCServerBusyError(method)
+        try:
+            return SimpleXMLRPCDispatcher._dispatch(self, method, params)
+        finally:
+            semaphore.release()
+
+class PooledThreadingMixIn:
+
+    """Handles requests with a fixed pool of worker threads.
+
+    .. attribute:: worker_count
+        An int representing the number of worker threads; if 0,
+        requests are handled one at a time by the thread calling
+        handle_request().
+    .. attribute:: worker_name
+        A string used to name the worker threads.
+    .. attribute:: pending_requests
+        A Queue of accepted requests waiting for a worker thread.
+    .. attribute:: keep_processing_requests
+        A boolean that, when set to False, stops the worker threads.
+
+    Unlike SocketServer.ThreadingMixIn, which starts a new thread for
+    every request, the number of threads (and queued requests) is
+    bounded, so a flood of clients can't exhaust the process.  Requests
+    accepted while the queue is full are dropped; the size of the queue
+    is set by the zdstack_rpc_max_pending_requests option.
+
+    """
+
+    worker_count = 0
+    worker_name = 'RPC'
+    pending_requests = None
+    keep_processing_requests = False
+
+    def start_workers(self, worker_count, max_pending_requests=None):
+        """Starts the worker threads.
+
+        :param worker_count: the number of worker threads to start
+        :type worker_count: int
+        :param max_pending_requests: optional, the maximum number of
+                                     requests waiting for a worker
+                                     thread; defaults to 4 times
+                                     worker_count
+        :type max_pending_requests: int
+
+        Threads don't survive a fork(), so this must be called after
+        daemonizing.
+
+        """
+        if worker_count < 1:
+            return
+        max_pending_requests = max_pending_requests or worker_count * 4
+        self.pending_requests = Queue.Queue(max_pending_requests)
+        self.keep_processing_requests = True
+        self.worker_count = worker_count
+        for x in range(worker_count):
+            ZDSThreadPool.get_thread(
+                self._process_pending_request,
+                '%s Worker Thread %d' % (self.worker_name, x + 1),
+                lambda: self.keep_processing_requests == True
+            )
+
+    def stop_workers(self):
+        """Stops the worker threads.
+
+        The worker threads quit after their current requests, they
+        should be joined afterwards.
+
+        """
+        self.keep_processing_requests = False
+        self.worker_count = 0
+
+    def can_keep_alive(self):
+        """Returns True if a connection can be kept open for more requests.
+
+        Waiting for a client's next request ties up a worker thread, so
+        connections are only kept open if there are worker threads and
+        no requests are waiting for one.
+
+        """
+        return bool(self.worker_count) and self.pending_requests.empty()
+
+    def process_request(self, request, client_address):
+        if not self.worker_count:
+            SocketServer.BaseServer.process_request(self, request,
+                                                    client_address)
+            return
+        try:
+            self.pending_requests.put_nowait((request, client_address))
+        except Queue.Full:
+            es = "Too many pending %s requests, dropping request from %s:%s"
+            get_zdslog().error(es % ((self.worker_name,) + client_address))
+            self.close_request(request)
+
+    def _process_pending_request(self):
+        try:
+            request, client_address = \
+                self.pending_requests.get(block=True, timeout=MAX_TIMEOUT)
+        except Queue.Empty:
+            return
+        try:
+            self.finish_request(request, client_address)
+        except:
+            self.handle_error(request, client_address)
+        self.close_request(request)
 
 class BaseRPCRequestHandler(SimpleXMLRPCRequestHandler):
 
-    """BaseRPCRequestHandler allows a configurable transport MIME-Type."""
+    """BaseRPCRequestHandler allows a configurable transport MIME-Type.
+
+    HTTP/1.1 clients can send several requests over one connection, as
+    long as the server has worker threads to spare (see
+    :meth:`~ZDStack.RPCServer.PooledThreadingMixIn.can_keep_alive`).
+    A connection is closed if it's idle for keep_alive_timeout seconds,
+    or as soon as another request is waiting for a worker thread, so
+    idle connections can't starve the worker pool.
+
+    """
 
     transport_mimetype = 'text/plain'
+    protocol_version = 'HTTP/1.1'
+
+    ###
+    # Don't let a slow client tie up a worker thread forever.
+    ###
+    timeout = 30
+    keep_alive_timeout = 5
+
+    ###
+    # How often an idle connection checks whether other requests are
+    # waiting for its worker thread.
+    ###
+    keep_alive_poll_interval = 0.1
+
+    def _wait_for_request(self):
+        """Waits for the client's next request.
+
+        :rtype: boolean
+        :returns: whether or not the client sent another request
+
+        Gives up after keep_alive_timeout seconds, or as soon as
+        another request is waiting for a worker thread.
+
+        """
+        pending_requests = getattr(self.server, 'pending_requests', None)
+        stop_time = time.time() + self.keep_alive_timeout
+        while 1:
+            if pending_requests is not None and \
+               not pending_requests.empty():
+                return False
+            remaining = stop_time - time.time()
+            if remaining <= 0:
+                return False
+            try:
+                r, w, x = select.select(
+                    [self.connection], [], [],
+                    min(remaining, self.keep_alive_poll_interval)
+                )
+            except select.error:
+                return False
+            if r:
+                return True
+
+    def handle(self):
+        """Handles requests until the connection should be closed."""
+        self.close_connection = 1
+        self.handle_one_request()
+        while not self.close_connection:
+            ###
+            # Clients wait for each response before sending another request,
+            # so there's never anything buffered in rfile here.
+            ###
+            if not self._wait_for_request():
+                break
+            try:
+                self.handle_one_request()
+            except socket.error:
+                break
 
     def do_POST(self):
         """Handles the HTTP POST request.
@@ -141,29 +357,33 @@ class BaseRPCRequestHandler(SimpleXMLRPCRequestHandler):
             ###
             # This is just for debugging.
             ###
+            self.close_connection = 1
             if get_debugging():
                 self.send_response(200)
                 self.send_header("Content-type", self.transport_mimetype)
                 self.send_header("Content-length", str(len(s)))
+                self.send_header("Connection", "close")
                 self.end_headers()
                 self.wfile.write(s)
-                # shut down the connection
                 self.wfile.flush()
             else:
                 self.send_response(500)
+                self.send_header("Content-length", "0")
+                self.send_header("Connection", "close")
                 self.end_headers()
-            self.connection.shutdown(1)
-            self.end_headers()
         else:
             # got a valid RPC response
+            if not self.close_connection and \
+               not self.server.can_keep_alive():
+                self.close_connection = 1
             self.send_response(200)
             self.send_header("Content-type", self.transport_mimetype)
             self.send_header("Content-length", str(len(response)))
+            if self.close_connection:
+                self.send_header("Connection", "close")
             self.end_headers()
             self.wfile.write(response)
-            # shut down the connection
             self.wfile.flush()
-            self.connection.shutdown(1)
 
     def log_message(self, format, *args):
         """Logs a message
@@ -193,7 +413,8 @@ class JSONRPCRequestHandler(BaseRPCRequestHandler):
 
     tranport_mimetype = 'application/json'
 
-class XMLRPCServer(SocketServer.TCPServer, AuthenticatedRPCDispatcher):
+class XMLRPCServer(PooledThreadingMixIn, SocketServer.TCPServer,
+                   AuthenticatedRPCDispatcher):
 
     allow_reuse_address = True
 
@@ -236,26 +457,59 @@ class JSONRPCServer(XMLRPCServer):
         existing method through subclassing is the prefered means
         of changing method dispatch behavior.
 
+        If the data is a list of calls (a JSON-RPC 2.0 batch), each
+        call is dispatched in turn and a list of responses is returned.
+        Per the spec, JSON-RPC 2.0 notifications (calls without an
+        'id') get no response.
+
         """
         try:
-            try:
-                d = get_json_module().loads(data)
-            except Exception, e:
-                if get_debugging():
-                    import traceback
-                    tb = traceback.format_exc()
-                else:
-                    tb = 'Parse Error'
-                error = self.exception_to_dict(e, '000', tb)
-                return self.generate_response(None, error)
-            if not 'method' in d:
+            d = get_json_module().loads(data)
+        except Exception, e:
+            if get_debugging():
+                import traceback
+                tb = traceback.format_exc()
+            else:
+                tb = 'Parse Error'
+            error = self.exception_to_dict(e, '000', tb)
+            return self.generate_response(None, error)
+        if not isinstance(d, list):
+            return self._dispatch_call(d, dispatch_method)
+        if not d:
+            error = self.exception_to_dict(Exception('Empty Batch'), '000',
+                                           '')
+            return self.generate_response(None, error)
+        responses = list()
+        for call in d:
+            response = self._dispatch_call(call, dispatch_method)
+            if isinstance(call, dict) and call.get('jsonrpc') == '2.0' and \
+               'id' not in call:
+                continue
+            responses.append(response)
+        return '[%s]' % (', '.join(responses))
+
+    def _dispatch_call(self, d, dispatch_method=None):
+        """Dispatches a single JSON-RPC call.
+
+        :param d: the unmarshalled call
+        :type d: dict
+        :param dispatch_method: optional, a method to use instead of
+                                _dispatch
+        :type dispatch_method: function
+        :rtype: string
+        :returns: the marshalled (JSON) response
+
+        """
+        id, params, version = (None, [], None)
+        try:
+            if not isinstance(d, dict) or not 'method' in d:
                 error = self.exception_to_dict(Exception('Bad Call'), '000', '')
                 return self.generate_response(None, error)
-            id, params = (None, [])
             if 'id' in d:
                 id = d['id']
             if 'params' in d:
                 params = d['params']
+            version = d.get('jsonrpc')
             if dispatch_method is not None:
                 result = dispatch_method(d['method'], params)
             else:
@@ -267,8 +521,8 @@ class JSONRPCServer(XMLRPCServer):
             else:
                 tb = 'Server Error'
             error = self.exception_to_dict(e, '000', tb)
-            return self.generate_response(None, error)
-        return self.generate_response(result, None, id)
+            return self.generate_response(None, error, id, version)
+        return self.generate_response(result, None, id, version)
 
     def datetime_to_seconds(self, dt):
         """Converts a datetime instance into seconds since the epoch.
@@ -287,7 +541,8 @@ class JSONRPCServer(XMLRPCServer):
         td = dt - epoch
         return (td.days * 86400) + td.seconds
 
-    def generate_response(self, result=None, error=None, id=None):
+    def generate_response(self, result=None, error=None, id=None,
+                                jsonrpc=None):
         """Generates a JSON response.
 
         :param result: the output of the RPC method call
@@ -295,6 +550,9 @@ class JSONRPCServer(XMLRPCServer):
         :type error: dict
         :param id: the id number of the request
         :type id: integer
+        :param jsonrpc: optional, the 'jsonrpc' member of the request,
+                        echoed back if given (i.e. '2.0')
+        :type jsonrpc: string
 
         """
         # print >> sys.stderr, "generate_response got %s, %s, %s" % (result,
@@ -307,6 +565,8 @@ class JSONRPCServer(XMLRPCServer):
             out['error'] = error
         if id is not None:
             out['id'] = id
+        if jsonrpc is not None:
+            out['jsonrpc'] = jsonrpc
         out = get_json_module().dumps(out, default=self.datetime_to_seconds)
         return out
 
@@ -371,28 +631,209 @@ class JSONRPCServer(XMLRPCServer):
             out['address'] == self.address
         return out
 
-class JSONTransport(Transport):
+class ConnectionPool(object):
 
-    ###
-    # def request(self, host, handler, request_body, verbose=0):
-    #     # issue XML-RPC request
-    #     h = self.make_connection(host)
-    #     if verbose:
-    #         h.set_debuglevel(1)
-    #     self.send_request(h, handler, request_body)
-    #     self.send_host(h, host)
-    #     self.send_user_agent(h)
-    #     self.send_content(h, request_body)
-    #     errcode, errmsg, headers = h.getreply()
-    #     if errcode != 200:
-    #         raise ProtocolError(host + handler, errcode, errmsg, headers)
-    #     self.verbose = verbose
-    #     try:
-    #         sock = h._conn.sock
-    #     except AttributeError:
-    #         sock = None
-    #     return self._parse_response(h.getfile(), sock)
-    ###
+    """ConnectionPool keeps idle HTTP connections open for reuse.
+
+    .. attribute:: max_idle
+        An int representing the maximum number of idle connections
+        kept open to each host.
+    .. attribute:: lock
+        A Lock that must be acquired before modifying connections.
+    .. attribute:: connections
+        A dict mapping ('scheme', 'host') tuples to lists of idle
+        connections.
+
+    """
+
+    def __init__(self, max_idle=4):
+        """Initializes a ConnectionPool.
+
+        :param max_idle: optional, the maximum number of idle
+                         connections kept open to each host, defaults
+                         to 4
+        :type max_idle: int
+
+        """
+        self.max_idle = max_idle
+        self.lock = Lock()
+        self.connections = dict()
+
+    def get(self, key):
+        """Gets an idle connection.
+
+        :param key: the scheme and host of the connection
+        :type key: tuple ('scheme', 'host')
+        :rtype: httplib.HTTPConnection, or None if there are no idle
+                connections to the host
+
+        """
+        with self.lock:
+            idle = self.connections.get(key)
+            if idle:
+                return idle.pop()
+        return None
+
+    def put(self, key, connection):
+        """Returns a connection to the pool.
+
+        :param key: the scheme and host of the connection
+        :type key: tuple ('scheme', 'host')
+        :param connection: the connection
+        :type connection: httplib.HTTPConnection
+
+        If there are already max_idle idle connections to the host, the
+        connection is closed instead.
+
+        """
+        with self.lock:
+            idle = self.connections.setdefault(key, list())
+            if len(idle) < self.max_idle:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def clear(self):
+        """Closes all idle connections."""
+        with self.lock:
+            connections = self.connections
+            self.connections = dict()
+        for idle in connections.values():
+            for connection in idle:
+                connection.close()
+
+###
+# Proxies share connections unless they're given a transport with its own
+# pool, so scripts that create a proxy per call still reuse connections.
+###
+CONNECTION_POOL = ConnectionPool()
+
+class KeepAliveTransport(Transport):
+
+    """Sends XML-RPC requests over persistent HTTP/1.1 connections.
+
+    .. attribute:: connection_pool
+        The :class:`~ZDStack.RPCServer.ConnectionPool` that idle
+        connections are kept in.
+
+    """
+
+    scheme = 'http'
+
+    def __init__(self, use_datetime=0, connection_pool=None):
+        """Initializes a KeepAliveTransport.
+
+        :param use_datetime: whether or not to unmarshal dates as
+                             datetime instances
+        :type use_datetime: boolean
+        :param connection_pool: optional, the pool to keep idle
+                                connections in, defaults to
+                                CONNECTION_POOL
+        :type connection_pool: :class:`~ZDStack.RPCServer.ConnectionPool`
+
+        """
+        Transport.__init__(self, use_datetime)
+        self.connection_pool = connection_pool or CONNECTION_POOL
+
+    def new_connection(self, host):
+        """Creates a new connection.
+
+        :param host: the host to connect to
+        :type host: string
+        :rtype: httplib.HTTPConnection
+
+        """
+        host, extra_headers, x509 = self.get_host_info(host)
+        return httplib.HTTPConnection(host)
+
+    def request(self, host, handler, request_body, verbose=0):
+        """Sends a request, returning the parsed response.
+
+        :param host: the host to send the request to
+        :type host: string
+        :param handler: the path to send the request to
+        :type handler: string
+        :param request_body: the marshalled request
+        :type request_body: string
+        :param verbose: whether or not to print debugging output
+        :type verbose: boolean
+
+        If an idle connection was closed by the server, the request is
+        sent again over a new connection.
+
+        """
+        self.verbose = verbose
+        key = (self.scheme, host)
+        connection = self.connection_pool.get(key)
+        if connection is not None:
+            try:
+                response = self._send_request(connection, host, handler,
+                                              request_body, verbose)
+            except (socket.error, httplib.HTTPException):
+                ###
+                # The server probably timed out the idle connection.
+                ###
+                connection.close()
+                connection = None
+        if connection is None:
+            connection = self.new_connection(host)
+            try:
+                response = self._send_request(connection, host, handler,
+                                              request_body, verbose)
+            except:
+                connection.close()
+                raise
+        try:
+            data = response.read()
+        except:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            self.connection_pool.put(key, connection)
+        if response.status != 200:
+            raise ProtocolError(host + handler, response.status,
+                                response.reason, response.msg)
+        if verbose:
+            print "body:", repr(data)
+        return self.parse_body(data)
+
+    def _send_request(self, connection, host, handler, request_body,
+                            verbose):
+        if verbose:
+            connection.set_debuglevel(1)
+        connection.putrequest('POST', handler, skip_host=True)
+        self.send_host(connection, host)
+        self.send_user_agent(connection)
+        self.send_content(connection, request_body)
+        return connection.getresponse()
+
+    def parse_body(self, data):
+        """Parses a response body.
+
+        :param data: the body of the response
+        :type data: string
+        :returns: the unmarshalled response
+
+        """
+        p, u = self.getparser()
+        p.feed(data)
+        p.close()
+        return u.close()
+
+class SafeKeepAliveTransport(KeepAliveTransport):
+
+    """Sends XML-RPC requests over persistent HTTPS connections."""
+
+    scheme = 'https'
+
+    def new_connection(self, host):
+        return _new_https_connection(self, host)
+
+class JSONTransport(KeepAliveTransport):
+
+    """Sends JSON-RPC requests over persistent HTTP/1.1 connections."""
 
     def send_content(self, connection, request_body):
         connection.putheader("Content-Type", 'application/json')
@@ -401,36 +842,35 @@ class JSONTransport(Transport):
         if request_body:
             connection.send(request_body)
 
-    def _parse_response(self, file, sock):
-        response = ''
-        if sock:
-            chunk = sock.recv(1024)
-        else:
-            chunk = file.read(1024)
-        while chunk:
-            response += chunk
-            if sock:
-                chunk = sock.recv(1024)
-            else:
-                chunk = file.read(1024)
-        if self.verbose:
-            print "body:", repr(response)
-        file.close()
-        return get_json_module().loads(response)
+    def parse_body(self, data):
+        return get_json_module().loads(data)
 
 class SafeJSONTransport(JSONTransport):
-    """Handles an HTTPS transaction to an XML-RPC server."""
 
-    def make_connection(self, host):
-        import httplib
-        host, extra_headers, x509 = self.get_host_info(host)
-        try:
-            HTTPS = httplib.HTTPS
-        except AttributeError:
-            es = "your version of httplib doesn't support HTTPS"
-            raise NotImplementedError(es)
-        else:
-            return HTTPS(host, None, **(x509 or {}))
+    """Sends JSON-RPC requests over persistent HTTPS connections."""
+
+    scheme = 'https'
+
+    def new_connection(self, host):
+        return _new_https_connection(self, host)
+
+def _new_https_connection(transport, host):
+    """Creates a new HTTPS connection.
+
+    :param transport: the transport creating the connection
+    :type transport: :class:`~ZDStack.RPCServer.KeepAliveTransport`
+    :param host: the host to connect to
+    :type host: string
+    :rtype: httplib.HTTPSConnection
+
+    """
+    host, extra_headers, x509 = transport.get_host_info(host)
+    try:
+        HTTPSConnection = httplib.HTTPSConnection
+    except AttributeError:
+        es = "your version of httplib doesn't support HTTPS"
+        raise NotImplementedError(es)
+    return HTTPSConnection(host, None, **(x509 or {}))
 
 class BaseProxy(ServerProxy):
 
@@ -447,9 +887,9 @@ class XMLProxy(object):
         protocol, uri = urllib.splittype(uri)
         if transport is None:
             if protocol == 'http':
-                self.__transport = Transport(use_datetime)
+                self.__transport = KeepAliveTransport(use_datetime)
             elif protocol == 'https':
-                self.__transport = SafeTransport(use_datetime)
+                self.__transport = SafeKeepAliveTransport(use_datetime)
             else:
                 raise IOError("unsupported XML-RPC protocol")
         else:
@@ -561,6 +1001,52 @@ class JSONProxy(object):
         else:
             return response['result']
 
+    def __batch_request(self, calls):
+        ###
+        # Used by JSONMultiCall.  Responses can come back in any order, so
+        # they're matched to calls by their IDs.
+        ###
+        d = [{'jsonrpc': '2.0', 'method': m, 'params': p, 'id': i}
+             for i, (m, p) in enumerate(calls)]
+        req = get_json_module().dumps(d)
+        responses = self.__transport.request(self.__host, self.__handler, req)
+        if isinstance(responses, dict):
+            ###
+            # The whole batch failed, i.e. it couldn't be parsed.
+            ###
+            raise JSONRPCException(responses['error'])
+        results = [None] * len(calls)
+        answered = set()
+        unmatched_error = None
+        for response in responses:
+            call_id = response.get('id')
+            if not isinstance(call_id, int) or \
+               not 0 <= call_id < len(calls):
+                ###
+                # Errors for calls the server couldn't read (a bad call,
+                # for example) have a null ID, so they can't be matched to
+                # a call.
+                ###
+                if response.get('error') and unmatched_error is None:
+                    unmatched_error = JSONRPCException(response['error'])
+                continue
+            answered.add(call_id)
+            if response['error']:
+                results[call_id] = JSONRPCException(response['error'])
+            else:
+                results[call_id] = response['result']
+        if unmatched_error is not None:
+            ###
+            # Calls that got no response of their own get the unmatched
+            # error, so it isn't lost.
+            ###
+            unanswered = [x for x in range(len(calls)) if x not in answered]
+            if not unanswered:
+                raise unmatched_error
+            for x in unanswered:
+                results[x] = unmatched_error
+        return results
+
     def __getattr__(self, name):
         # magic method dispatcher
         return _Method(self.__request, name)
@@ -570,3 +1056,51 @@ class JSONProxy(object):
 
     __str__ = __repr__
 
+class JSONMultiCall(object):
+
+    """JSONMultiCall sends several calls in a single JSON-RPC request.
+
+    It works like xmlrpclib.MultiCall::
+
+      multicall = JSONMultiCall(proxy)
+      multicall.list_zserv_names()
+      multicall.players(username, password, 'Great CTF')
+      names, players = multicall()
+
+    Calling the JSONMultiCall sends the calls as a JSON-RPC 2.0 batch
+    and returns a list of their results, in the order they were made.
+    If any call failed, the first failure is raised as a
+    :class:`~ZDStack.RPCServer.JSONRPCException`.
+
+    """
+
+    def __init__(self, proxy):
+        """Initializes a JSONMultiCall.
+
+        :param proxy: the proxy to send the calls with
+        :type proxy: :class:`~ZDStack.RPCServer.JSONProxy`
+
+        """
+        self.__proxy = proxy
+        self.__calls = list()
+
+    def __add_call(self, methodname, params):
+        self.__calls.append((methodname, params))
+
+    def __getattr__(self, name):
+        return _Method(self.__add_call, name)
+
+    def __call__(self):
+        if not self.__calls:
+            return []
+        results = self.__proxy._JSONProxy__batch_request(self.__calls)
+        for result in results:
+            if isinstance(result, JSONRPCException):
+                raise result
+        return results
+
+    def __repr__(self):
+        return "<JSONMultiCall at %x>" % (id(self))
+
+    __str__ = __repr__
+
@@ -42,6 +42,18 @@ class Server(object):
     .. attribute:: password
         A string representing the authenticating password
 
+    .. attribute:: rpc_threads
+        An int representing the number of threads serving RPC
+        requests; if 0, requests are served one at a time
+
+    .. attribute:: rpc_max_pending_requests
+        An int representing the maximum number of RPC requests waiting
+        for a thread; if 0, 4 times rpc_threads
+
+    .. attribute:: rpc_method_limit
+        An int representing the maximum number of concurrent calls to
+        each RPC method that has to wait on a zserv
+
     """
 
     def __init__(self):
@@ -89,6 +101,13 @@ class Server(object):
         pidfile = config.getpath('DEFAULT', 'zdstack_pid_file')
         username = config.get('DEFAULT', 'zdstack_username')
         password = config.get('DEFAULT', 'zdstack_password')
+        rpc_threads = config.getint('DEFAULT', 'zdstack_rpc_threads', 8)
+        rpc_max_pending_requests = config.get(
+            'DEFAULT', 'zdstack_rpc_max_pending_requests', ''
+        )
+        rpc_max_pending_requests = int(rpc_max_pending_requests or 0)
+        rpc_method_limit = config.getint('DEFAULT', 'zdstack_rpc_method_limit',
+                                         4)
         self.config = config
         self.hostname = hostname
         self.port = port
@@ -96,11 +115,23 @@ class Server(object):
         self.pidfile = pidfile
         self.username = username
         self.password = password
+        ###
+        # The RPC server is only created once, so changes to these options
+        # only take effect after a restart.
+        ###
+        if not reload:
+            self.rpc_threads = max(0, rpc_threads)
+            self.rpc_max_pending_requests = max(0, rpc_max_pending_requests)
+            self.rpc_method_limit = max(1, rpc_method_limit)
 
     def reload_config(self):
-        """Reloads the configuration."""
+        """Reloads the configuration.
+
+        :returns: whatever load_config returns when reloading
+
+        """
         # zdslog.debug('')
-        self.load_config(get_configparser(reload=True), reload=True)
+        return self.load_config(get_configparser(reload=True), reload=True)
 
     def startup(self):
         """Starts the server up."""
@@ -147,6 +178,8 @@ class Server(object):
         pid_fobj.flush()
         pid_fobj.close()
         self.start()
+        self.rpc_server.start_workers(self.rpc_threads,
+                                      self.rpc_max_pending_requests or None)
         zdslog.info("ZDStack listening on %s:%s" % addr)
         zdslog.info("ZDStack Startup Complete")
         while self.keep_serving:
@@ -165,6 +198,9 @@ class Server(object):
         self.stop()
         zdslog.debug("Setting keep_serving False")
         self.keep_serving = False
+        if getattr(self, 'rpc_server', None):
+            zdslog.debug("Stopping RPC worker threads")
+            self.rpc_server.stop_workers()
         zdslog.debug("Setting DIE_THREADS_DIE True")
         DIE_THREADS_DIE = True
         zdslog.debug("Joining all threads")
@@ -209,11 +245,18 @@ class Server(object):
     def register_functions(self):
         """Registers public XML-RPC functions."""
         # zdslog.debug('')
+        ###
+        # system.multicall lets XML-RPC clients make several calls in one
+        # request, JSON-RPC clients can send batches instead.
+        ###
+        self.rpc_server.register_multicall_functions()
         self.rpc_server.register_function(self.get_status)
         self.rpc_server.register_function(self.get_logfile,
                                           requires_authentication=True)
         self.rpc_server.register_function(self.reload_config,
-                                          requires_authentication=True)
+                                          requires_authentication=True,
+                                          max_concurrency=1,
+                                          concurrency_group='management')
 
     def get_status(self):
         """Gets the current status of the server.
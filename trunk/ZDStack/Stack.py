@@ -4,6 +4,7 @@ import os
 import time
 import Queue
 import select
+import socket
 import logging
 
 from datetime import datetime, timedelta
@@ -17,16 +18,25 @@ from ZDStack import DIE_THREADS_DIE, MAX_TIMEOUT, TICK, PlayerNotFoundError, \
                     load_configparser, check_server_config_section, \
                     get_zdslog, get_zdaemon_banlist_data
 from ZDStack.Utils import get_event_from_line, requires_instance_lock, \
-                          parse_ban_line
+                          parse_ban_line, parallel_map
 from ZDStack.ZServ import ZServ
 from ZDStack.Server import Server
-from ZDStack.ZDSTask import Task
+from ZDStack.Plugins import DispatchTable
+from ZDStack.ZDSMetrics import set_current_metrics
+from ZDStack.ZDSMetricsServer import MetricsServer
+from ZDStack.ZDSPluginExecutor import PluginExecutor
+from ZDStack.ZDSTask import LightTask
+from ZDStack.ZDSArchive import archive_rounds
+from ZDStack.ZDSDatabase import new_session
+from ZDStack.ZDSLifecycle import LifecycleOperation
 from ZDStack.LogEvent import LogEvent
 from ZDStack.ZDSRegexps import get_server_regexps
 from ZDStack.ZDSAccessList import WhiteList, BanList, ZDaemonBanList
 from ZDStack.ZDSConfigParser import ZDSConfigParser as CP
 from ZDStack.ZDSConfigParser import RawZDSConfigParser as RCP
 from ZDStack.ZDSEventHandler import ZServEventHandler
+from ZDStack.ZDSZServConfig import LIVE_OPTIONS, get_effective_config, \
+                                   get_config_hash, get_changed_options
 
 zdslog = get_zdslog()
 
@@ -35,7 +45,9 @@ class Stack(Server):
     """Stack is the main ZDStack class.
     
     .. attribute:: spawn_lock
-        A Lock that must be acquired before a zserv can spawn.
+        A Lock that must be acquired before a zserv process is
+        forked.  Only the fork itself needs it, everything else in
+        :meth:`~ZDStack.ZServ.ZServ.start` happens outside of it.
 
     .. attribute:: szn_lock
         A Lock that must be acquired before modifying
@@ -79,6 +91,21 @@ class Stack(Server):
         A :class:`~ZDStack.ZDSEventHandler.ZServEventHandler` that
         handles :class:`~ZDStack.ZServ.ZServ` events.
 
+    .. attribute:: plugin_dispatch_tables
+        A dict mapping ZServ names to
+        :class:`~ZDStack.Plugins.DispatchTable` instances, which map
+        events to the plugins subscribed to them.
+
+    .. attribute:: plugin_executors
+        A dict mapping ZServ names to
+        :class:`~ZDStack.ZDSPluginExecutor.PluginExecutor` instances,
+        which run that ZServ's plugins after its events are handled.
+
+    .. attribute:: metrics_server
+        A :class:`~ZDStack.ZDSMetricsServer.MetricsServer` that serves
+        metrics over HTTP, or None if zdstack_metrics_port isn't
+        configured.
+
     .. attribute:: output_queue
         A Queue where output lines are placed to be processed.
 
@@ -95,6 +122,43 @@ class Stack(Server):
     .. attribute:: zdaemon_banlist_fetch_timer
         A Timer that fetches the ZDaemon master banlist ever 15 minutes.
 
+    .. attribute:: keep_checkpointing_leaderboards
+        A boolean that, when set to False, does not reset the
+        leaderboard_checkpoint_timer after checkpointing leaderboards.
+
+    .. attribute:: leaderboard_checkpoint_timer
+        A Timer that saves each ZServ's leaderboard to the database
+        every leaderboard_checkpoint_interval seconds.
+
+    .. attribute:: lifecycle_lock
+        A Lock that must be acquired before modifying
+        lifecycle_operations.
+
+    .. attribute:: lifecycle_operations
+        A list of the most recent
+        :class:`~ZDStack.ZDSLifecycle.LifecycleOperation` instances
+        (starting, stopping or restarting several ZServs), oldest
+        first.
+
+    .. attribute:: zserv_configs
+        A dict mapping ZServ names to their effective configs, as of
+        when they were last loaded.  See
+        :func:`~ZDStack.ZDSZServConfig.get_effective_config`.
+
+    .. attribute:: zserv_config_hashes
+        A dict mapping ZServ names to the hashes of their effective
+        configs, so unchanged ZServs are skipped when the
+        configuration is reloaded.
+
+    .. attribute:: keep_archiving_rounds
+        A boolean that, when set to False, does not reset the
+        archive_timer after archiving rounds.
+
+    .. attribute:: archive_timer
+        A Timer that archives old rounds every archive_interval seconds,
+        or every second while there's a backlog, if archive_horizon is
+        set.
+
     Stack does the following things:
 
       * Checks that all server log links and FIFOs exist every 30 min.
@@ -102,13 +166,41 @@ class Stack(Server):
         milliseconds
       * Polls all ZServs for output
       * Parses ZServ output lines into events
-      * Passes events to the EventHandler and the ZServ's plugins
+      * Passes events to the EventHandler, then the ZServ's plugins
       * Handles incoming RPC requests
 
     """
 
     methods_requiring_authentication = []
 
+    ###
+    # ZServ status snapshots are refreshed at least this often (in seconds).
+    ###
+    status_max_age = 5
+
+    ###
+    # Events in these categories change a ZServ's status (map changes,
+    # connections and disconnections).
+    ###
+    status_event_categories = ('command', 'connection')
+
+    ###
+    # How many lifecycle operations' progress is kept.
+    ###
+    max_lifecycle_operations = 10
+
+    ###
+    # Methods that take a zserv name as their first argument, and so can be
+    # called on several ZServs at once with fan_out().
+    ###
+    fan_out_methods = ('get_zserv_info', 'get_zserv_metrics',
+                       'get_zserv_config', 'send_to_zserv', 'addban',
+                       'add_ban', 'add_whitelist', 'addbot', 'addmap',
+                       'clearmaplist', 'delete_ban', 'delete_whitelist',
+                       'get', 'kick', 'remove_ban', 'remove_whitelist',
+                       'killban', 'map', 'maplist', 'players', 'removebots',
+                       'resetscores', 'say', 'set', 'toggle', 'unset', 'wads')
+
     def __init__(self):
         """Initializes a Stack instance."""
         self.spawn_lock = Lock()
@@ -120,6 +212,8 @@ class Stack(Server):
         self.keep_checking_loglinks = False
         self.keep_spawning_zservs = False
         self.keep_fetching_zdaemon_banlist = False
+        self.keep_checkpointing_leaderboards = False
+        self.keep_archiving_rounds = False
         self.keep_polling = False
         self.keep_parsing = False
         self.keep_handling_events = False
@@ -127,6 +221,18 @@ class Stack(Server):
         self.whitelist = WhiteList()
         self.banlist = BanList()
         self.zdaemon_banlist = ZDaemonBanList()
+        self.plugin_dispatch_tables = {}
+        self.plugin_executors = {}
+        self.keep_serving_metrics = False
+        self.metrics_server = None
+        self.metrics_thread = None
+        self.status_lock = Lock()
+        self.status_generation = 0
+        self.lifecycle_lock = Lock()
+        self.lifecycle_operations = list()
+        self._last_lifecycle_id = 0
+        self.zserv_configs = {}
+        self.zserv_config_hashes = {}
         Server.__init__(self)
         self.load_zservs()
         self.event_handler = ZServEventHandler()
@@ -139,6 +245,8 @@ class Stack(Server):
         self.loglink_check_timer = None
         self.zserv_check_timer = None
         self.zdaemon_banlist_fetch_timer = None
+        self.leaderboard_checkpoint_timer = None
+        self.archive_timer = None
 
     def start(self):
         """Starts this Stack."""
@@ -146,11 +254,17 @@ class Stack(Server):
         self.keep_spawning_zservs = True
         self.keep_checking_loglinks = True
         self.keep_fetching_zdaemon_banlist = True
+        self.keep_checkpointing_leaderboards = True
+        self.keep_archiving_rounds = True
         self.keep_polling = True
         self.keep_parsing = True
         self.keep_handling_events = True
         if not self.loglink_check_timer:
             self.start_checking_loglinks()
+        ###
+        # Load the leaderboards before any events are handled.
+        ###
+        self.load_leaderboards()
         self.polling_thread = ZDSThreadPool.get_thread(
             self.poll_zservs,
             "ZDStack Polling Thread",
@@ -173,6 +287,12 @@ class Stack(Server):
             self.spawn_zservs()
         if not self.zdaemon_banlist_fetch_timer:
             self.fetch_zdaemon_banlist()
+        if not self.leaderboard_checkpoint_timer:
+            self.start_checkpointing_leaderboards()
+        if self.archive_horizon and not self.archive_timer:
+            self.start_archiving_rounds()
+        if self.metrics_port and not self.metrics_server:
+            self.start_serving_metrics()
         Server.start(self)
 
     def stop(self):
@@ -188,6 +308,10 @@ class Stack(Server):
         self.keep_fetching_zdaemon_banlist = False
         if self.zdaemon_banlist_fetch_timer:
             self.zdaemon_banlist_fetch_timer.cancel()
+        self.keep_archiving_rounds = False
+        if self.archive_timer:
+            self.archive_timer.cancel()
+            self.archive_timer = None
         zdslog.debug("Stopping all ZServs")
         self.stop_all_zservs()
         zdslog.debug("Stopping polling thread")
@@ -201,8 +325,45 @@ class Stack(Server):
         zdslog.debug("Clearing event queue")
         self.keep_handling_events = False
         self.event_queue.join()
+        zdslog.debug("Clearing plugin queues")
+        for plugin_executor in self.plugin_executors.values():
+            plugin_executor.stop()
+        zdslog.debug("Checkpointing leaderboards")
+        self.keep_checkpointing_leaderboards = False
+        if self.leaderboard_checkpoint_timer:
+            self.leaderboard_checkpoint_timer.cancel()
+            self.leaderboard_checkpoint_timer = None
+        self.checkpoint_leaderboards()
+        if self.metrics_server:
+            self.stop_serving_metrics()
         Server.stop(self)
 
+    def start_serving_metrics(self):
+        """Starts serving metrics over HTTP."""
+        addr = (self.metrics_hostname, self.metrics_port)
+        try:
+            self.metrics_server = MetricsServer(addr, self)
+        except socket.error, e:
+            es = "Could not serve metrics on %s:%s: [%s]"
+            zdslog.error(es % (addr + (e,)))
+            return
+        self.keep_serving_metrics = True
+        self.metrics_thread = ZDSThreadPool.get_thread(
+            self.metrics_server.handle_request,
+            'ZDStack Metrics Thread',
+            lambda: self.keep_serving_metrics == True
+        )
+        zdslog.info("Serving metrics on %s:%s" % addr)
+
+    def stop_serving_metrics(self):
+        """Stops serving metrics over HTTP."""
+        self.keep_serving_metrics = False
+        if self.metrics_thread:
+            ZDSThreadPool.join(self.metrics_thread)
+            self.metrics_thread = None
+        self.metrics_server.server_close()
+        self.metrics_server = None
+
     def start_checking_loglinks(self):
         """Starts checking every ZServ's log links every 30 minutes."""
         try:
@@ -219,15 +380,83 @@ class Stack(Server):
                 self.loglink_check_timer = t
                 self.loglink_check_timer.start()
 
+    def load_leaderboards(self):
+        """Loads every ZServ's leaderboard from its last checkpoint."""
+        for zserv in self.zservs.values():
+            with new_session() as session:
+                zserv.leaderboard.load_checkpoint(session)
+
+    def checkpoint_leaderboards(self):
+        """Saves every ZServ's leaderboard changes to the database."""
+        for zserv in self.zservs.values():
+            ###
+            # Each ZServ gets its own (short) transaction, so we don't hold
+            # the database lock for long.
+            ###
+            saved = list()
+            with new_session() as session:
+                saved = zserv.leaderboard.save_checkpoint(session)
+            ###
+            # new_session() logs and rolls back errors, including failed
+            # commits, so if the buckets weren't committed they have to be
+            # saved at the next checkpoint.
+            ###
+            if not session.committed:
+                zserv.leaderboard.mark_dirty(saved)
+
+    def start_checkpointing_leaderboards(self):
+        """Starts checkpointing leaderboards periodically."""
+        try:
+            self.checkpoint_leaderboards()
+        finally:
+            if self.keep_checkpointing_leaderboards:
+                t = Timer(self.leaderboard_checkpoint_interval,
+                          self.start_checkpointing_leaderboards)
+                self.leaderboard_checkpoint_timer = t
+                self.leaderboard_checkpoint_timer.start()
+
+    def start_archiving_rounds(self):
+        """Starts archiving old rounds periodically."""
+        delay = self.archive_interval
+        try:
+            try:
+                archived = archive_rounds(self.archive_folder,
+                                          self.archive_horizon,
+                                          self.archive_batch_size)
+            except Exception, e:
+                zdslog.error("Error archiving rounds: [%s]" % (e))
+            else:
+                if archived >= self.archive_batch_size:
+                    ###
+                    # There are probably more rounds to archive, so keep
+                    # going, but pause so other threads get a turn with
+                    # the database lock.
+                    ###
+                    delay = 1
+        finally:
+            if self.keep_archiving_rounds:
+                t = Timer(delay, self.start_archiving_rounds)
+                self.archive_timer = t
+                self.archive_timer.start()
+
     def spawn_zservs(self):
         """Spawns zservs, respawning if they've crashed."""
         now = datetime.now()
+        now_time = time.time()
         with self.szn_lock:
             try:
                 for zserv in self.zservs.values():
                     try:
+                        is_running = zserv.is_running()
+                        ###
+                        # This catches crashes, and anything else that
+                        # changed the ZServ's status between events.
+                        ###
+                        if is_running != zserv.status['is_running'] or \
+                           now_time - zserv.status_time >= self.status_max_age:
+                            zserv.refresh_status(is_running)
                         if zserv.name in self.stopped_zserv_names or \
-                           zserv.is_running():
+                           is_running:
                             ###
                             # The zserv is supposed to be stopped, or the zserv
                             # is already running, in either case we skip it.
@@ -327,8 +556,12 @@ class Stack(Server):
                     ###
                     # I guess 1024 bytes should be a big enough chunk.
                     ###
+                    read_start = time.time()
                     data = os.read(fd, 1024)
                     if data:
+                        read_time = time.time()
+                        zserv.metrics.add_timing('fifo_read',
+                                                 read_time - read_start)
                         zdslog.debug('Got data from %r: [%r]' % (
                             zserv.name, data
                         ))
@@ -339,9 +572,10 @@ class Stack(Server):
                             zserv._fragment = None
                         if not data.endswith('\n'):
                             lines, zserv._fragment = lines[:-1], lines[-1]
-                        output = (zserv, datetime.now(), lines)
+                        zserv.metrics.increment('lines', len(lines))
+                        output = (zserv, datetime.now(), lines, read_time)
                         zdslog.debug('Putting parse output task in queue')
-                        self.output_queue.put_nowait(Task(
+                        self.output_queue.put_nowait(LightTask.get(
                             self.parse_zserv_output,
                             args=output,
                             name='Parsing'
@@ -368,7 +602,7 @@ class Stack(Server):
                         ###
                         raise
 
-    def parse_zserv_output(self, zserv, dt, lines):
+    def parse_zserv_output(self, zserv, dt, lines, read_time=None):
         """Parses ZServ output into events, places them in the event queue.
         
         :param zserv: the output's originating
@@ -378,8 +612,14 @@ class Stack(Server):
         :type dt: datetime
         :param lines: the output lines
         :type lines: list of strings
+        :param read_time: optional, the time (from time.time()) when
+                          the lines were read
+        :type read_time: float
         
         """
+        if read_time:
+            zserv.metrics.add_timing('output_queue_wait',
+                                     time.time() - read_time)
         # zdslog.debug("Events for [%s]: %s" % (zserv.name, events))
         zdslog.debug('Parsing lines for [%s]:\n\t%s' % (
             zserv, '\n\t'.join(lines).rstrip()
@@ -390,6 +630,7 @@ class Stack(Server):
             ###
             return
         for line in lines:
+            parse_start = time.time()
             try:
                 event = get_event_from_line(line, self.regexps, dt)
             except Exception, e:
@@ -397,7 +638,9 @@ class Stack(Server):
                 zdslog.error(es % (line, zserv.name, e))
                 continue
             if event is None:
-                event = LogEvent(dt, 'junk', {}, 'junk', line)
+                event = LogEvent(dt, 'junk', (), 'junk', line)
+            parsed_time = time.time()
+            zserv.metrics.add_timing('parse', parsed_time - parse_start)
             try:
                 if event.type == 'junk':
                     ###
@@ -433,6 +676,7 @@ class Stack(Server):
                             ))
                             zserv.messenger.response_started.set()
                         zserv.messenger.response_events.append(event)
+                        zserv.metrics.add_event(event.category)
                         continue
                     if not zserv.messenger.has_received_response_data:
                         zdslog.debug("Response hasn't started yet")
@@ -450,9 +694,9 @@ class Stack(Server):
                 # a separate queue for them; whatever called send_to_zserv()
                 # will process the events separately from this control flow.
                 ###
-                self.event_queue.put_nowait(Task(
+                self.event_queue.put_nowait(LightTask.get(
                     self.handle_events,
-                    args=[event, zserv],
+                    args=[event, zserv, parsed_time],
                     name='%s Event Handling' % (event.type.capitalize())
                 ))
             except Exception, e:
@@ -461,7 +705,7 @@ class Stack(Server):
                 ))
                 continue
 
-    def handle_events(self, event, zserv):
+    def handle_events(self, event, zserv, queued_time=None):
         """Handles events.
 
         :param event: the event to handle
@@ -469,8 +713,14 @@ class Stack(Server):
         :param zserv: the :class:`~ZDStack.ZServ.ZServ` instance that
                       generated the event.
         :type zserv: :class:`~ZDStack.ZServ.ZServ`
+        :param queued_time: optional, the time (from time.time()) when
+                            the event was placed in the event queue
+        :type queued_time: float
 
         """
+        if queued_time:
+            zserv.metrics.add_timing('event_queue_wait',
+                                     time.time() - queued_time)
         ds = "Handling %s event (Line: [%s])"
         zdslog.debug(ds % (event.type, event.line))
         with zserv.event_lock:
@@ -484,25 +734,78 @@ class Stack(Server):
                 zdslog.debug('Waiting for command responses to be processed')
                 zserv.messenger.response_processed.wait()
                 zdslog.debug('Command responses finished processing')
-            self.event_handler.get_handler(event.category)(event, zserv)
+            ###
+            # Database code doesn't know which ZServ it's working for, so we
+            # tell it where to put its timings.
+            ###
+            set_current_metrics(zserv.metrics)
+            handler_start = time.time()
+            try:
+                self.event_handler.get_handler(event.category)(event, zserv)
+            finally:
+                zserv.metrics.add_timing('handler',
+                                         time.time() - handler_start)
+                set_current_metrics(None)
+                ###
+                # The junk handler turns chat lines into message events, so
+                # events are only counted once they've been handled.
+                ###
+                zserv.metrics.add_event(event.category)
+            if event.category in self.status_event_categories:
+                zserv.refresh_status()
             ###
             # Message events are modified by the default EventHandler so that
             # they have the correct type, category, and data.  Thus, plugins
             # can rely on receiving proper message events, as opposed to junk
             # events they have process (again) themselves.
+            #
+            # Plugins can take a while (sending commands to the zserv, for
+            # example), so rather than run them here while holding the event
+            # lock, we hand them off to the ZServ's plugin executor.
             ###
             if zserv.plugins_enabled:
-                for plugin in zserv.plugins:
-                    ds = "Processing %s with %s"
-                    zdslog.debug(ds % (event, plugin.__name__))
-                    try:
-                        plugin(event, zserv)
-                    except Exception, e:
-                        es = "Exception in plugin %s: [%s]"
-                        zdslog.error(es % (plugin.__name__, e))
-                        continue
+                dispatch_table = self.get_plugin_dispatch_table(zserv)
+                plugins = dispatch_table.get_plugins(event)
+                if plugins:
+                    self.get_plugin_executor(zserv).submit(event, zserv,
+                                                           plugins)
         zdslog.debug("Finished handling %s event" % (event.type))
 
+    def get_plugin_dispatch_table(self, zserv):
+        """Gets a ZServ's plugin dispatch table.
+
+        :param zserv: the :class:`~ZDStack.ZServ.ZServ` whose dispatch
+                      table to get
+        :type zserv: :class:`~ZDStack.ZServ.ZServ`
+        :rtype: :class:`~ZDStack.Plugins.DispatchTable`
+
+        If the ZServ's plugins have changed since its dispatch table was
+        built, a new one is built.
+
+        """
+        dispatch_table = self.plugin_dispatch_tables.get(zserv.name)
+        if dispatch_table is None or \
+           dispatch_table.plugins is not zserv.plugins:
+            dispatch_table = DispatchTable(zserv.plugins)
+            self.plugin_dispatch_tables[zserv.name] = dispatch_table
+        return dispatch_table
+
+    def get_plugin_executor(self, zserv):
+        """Gets a ZServ's plugin executor, starting it if necessary.
+
+        :param zserv: the :class:`~ZDStack.ZServ.ZServ` whose plugin
+                      executor to get
+        :type zserv: :class:`~ZDStack.ZServ.ZServ`
+        :rtype: :class:`~ZDStack.ZDSPluginExecutor.PluginExecutor`
+
+        """
+        plugin_executor = self.plugin_executors.get(zserv.name)
+        if plugin_executor is None or not plugin_executor.keep_running:
+            plugin_executor = PluginExecutor(zserv.name)
+            plugin_executor.start()
+            self.plugin_executors[zserv.name] = plugin_executor
+        return plugin_executor
+
     def get_running_zservs(self):
         """Returns a list of ZServs whose internal zserv is running."""
         return [x for x in self.zservs.values() if x.is_running()]
@@ -527,15 +830,66 @@ class Stack(Server):
                 raise Exception(es % (zserv.name))
 
     def load_zservs(self):
-        """Instantiates all configured ZServs."""
+        """Instantiates new ZServs and reloads changed ZServs' configs.
+
+        :rtype: dict
+        :returns: {'added': <list: ZServ names>,
+                   'removed': <list: ZServ names>,
+                   'unchanged': <list: ZServ names>,
+                   'applied': {<string: ZServ name>: <list: options>},
+                   'restart_required': {<string: ZServ name>:
+                                        <list: options>}}
+
+        A ZServ's config is only reloaded if the hash of its effective
+        config (see
+        :func:`~ZDStack.ZDSZServConfig.get_effective_config`) has
+        changed.  Changed options that only ZDStack uses, and all
+        changed options of ZServs that aren't running, are listed in
+        'applied'.  Other changed options of running ZServs only take
+        effect when they're restarted, so they're listed in
+        'restart_required'.
+
+        ZServs whose sections have been removed are listed in
+        'removed', whether or not they're running.  They stay loaded
+        (and running ZServs keep running) until ZDStack is restarted.
+
+        """
         zdslog.debug('Loading ZServs: %s' % (str(self.config.sections())))
+        changes = {'added': [], 'removed': [], 'unchanged': [],
+                   'applied': {}, 'restart_required': {}}
         for zserv_name in self.config.sections():
-            if zserv_name in self.zservs:
-                zdslog.info("Reloading Config for [%s]" % (zserv_name))
-                self.zservs[zserv_name].load_config(reload=True)
-            else:
+            effective_config = get_effective_config(self.config, zserv_name)
+            config_hash = get_config_hash(effective_config)
+            if zserv_name not in self.zservs:
                 zdslog.debug("Adding zserv [%s]" % (zserv_name))
                 self.zservs[zserv_name] = ZServ(zserv_name, self)
+                changes['added'].append(zserv_name)
+            elif config_hash == self.zserv_config_hashes.get(zserv_name):
+                changes['unchanged'].append(zserv_name)
+                continue
+            else:
+                zdslog.info("Reloading Config for [%s]" % (zserv_name))
+                zserv = self.zservs[zserv_name]
+                zserv.load_config(reload=True)
+                options = get_changed_options(
+                    self.zserv_configs.get(zserv_name, {}), effective_config
+                )
+                if zserv.is_running():
+                    applied = [x for x in options if x in LIVE_OPTIONS]
+                    restart_required = [x for x in options
+                                          if x not in LIVE_OPTIONS]
+                else:
+                    applied = options
+                    restart_required = []
+                if applied:
+                    changes['applied'][zserv_name] = applied
+                if restart_required:
+                    changes['restart_required'][zserv_name] = restart_required
+            self.zserv_configs[zserv_name] = effective_config
+            self.zserv_config_hashes[zserv_name] = config_hash
+        changes['removed'] = sorted([x for x in self.zservs
+                                       if x not in self.config.sections()])
+        return changes
 
     def load_config(self, config, reload=False):
         """Loads the configuration.
@@ -544,6 +898,9 @@ class Stack(Server):
         :type config: :class:`~ZDStack.ZDSConfigParser.ZDSConfigParser`
         :param reload: whether or not the config is being reloaded
         :type reload: boolean
+        :rtype: dict
+        :returns: if reloading, the changes to the ZServs' configs, see
+                  :meth:`load_zservs`
 
         """
         zdslog.debug('')
@@ -553,6 +910,43 @@ class Stack(Server):
         self.check_all_zserv_configs(config)
         Server.load_config(self, config, reload)
         self.raw_config = raw_config
+        metrics_port = config.get('DEFAULT', 'zdstack_metrics_port', '')
+        self.metrics_port = metrics_port and int(metrics_port) or None
+        self.metrics_hostname = config.get('DEFAULT',
+                                           'zdstack_metrics_hostname',
+                                           self.hostname)
+        self.leaderboard_checkpoint_interval = max(1, config.getint(
+            'DEFAULT', 'zdstack_leaderboard_checkpoint_interval', 60
+        ))
+        self.lifecycle_concurrency = max(1, config.getint(
+            'DEFAULT', 'zdstack_lifecycle_concurrency', 4
+        ))
+        self.lifecycle_stagger = max(0, config.getfloat(
+            'DEFAULT', 'zdstack_lifecycle_stagger', 0.5
+        ))
+        self.archive_horizon = max(0, config.getint(
+            'DEFAULT', 'zdstack_archive_horizon', 0
+        ))
+        self.archive_batch_size = max(1, config.getint(
+            'DEFAULT', 'zdstack_archive_batch_size', 20
+        ))
+        self.archive_interval = max(1, config.getint(
+            'DEFAULT', 'zdstack_archive_interval', 300
+        ))
+        self.archive_folder = None
+        if self.archive_horizon:
+            if not config.get('DEFAULT', 'zdstack_archive_folder', ''):
+                es = "zdstack_archive_folder is required when "
+                es += "zdstack_archive_horizon is set"
+                raise ValueError(es)
+            self.archive_folder = config.getpath('DEFAULT',
+                                                 'zdstack_archive_folder')
+            if not os.path.isdir(self.archive_folder):
+                try:
+                    os.makedirs(self.archive_folder)
+                except Exception, e:
+                    es = "Could not make archive folder %s: %s"
+                    raise Exception(es % (self.archive_folder, e))
         ###
         # accesslist_file = self.config.getpath('DEFAULT',
         #                                       'zdstack_global_accesslist_file')
@@ -568,7 +962,7 @@ class Stack(Server):
         #     self.access_list = new_access_list
         ###
         if reload:
-            self.load_zservs()
+            return self.load_zservs()
 
     def start_zserv(self, zserv_name):
         """Starts a ZServ.
@@ -583,8 +977,13 @@ class Stack(Server):
             raise ZServNotFoundError(zserv_name)
         if self.zservs[zserv_name].is_running():
             raise Exception("ZServ [%s] is already running" % (zserv_name))
+        ###
+        # The ZServ stays in stopped_zserv_names until it's started, so
+        # spawn_zservs() won't start it too.  szn_lock isn't held while
+        # starting it, so other ZServs can be started at the same time.
+        ###
+        self.zservs[zserv_name].start()
         with self.szn_lock:
-            self.zservs[zserv_name].start()
             try:
                 self.stopped_zserv_names.remove(zserv_name)
             except KeyError:
@@ -607,9 +1006,14 @@ class Stack(Server):
             raise ZServNotFoundError(zserv_name)
         if not self.zservs[zserv_name].is_running():
             raise Exception("ZServ [%s] is not running" % (zserv_name))
+        ###
+        # Add the ZServ to stopped_zserv_names first, so spawn_zservs()
+        # doesn't restart it.  szn_lock isn't held while stopping it, so
+        # other ZServs can be stopped at the same time.
+        ###
         with self.szn_lock:
-            self.zservs[zserv_name].stop()
             self.stopped_zserv_names.add(zserv_name)
+        self.zservs[zserv_name].stop()
         zdslog.debug("Done stopping %s" % (zserv_name))
 
     def restart_zserv(self, zserv_name):
@@ -626,18 +1030,76 @@ class Stack(Server):
         self.start_zserv(zserv_name)
         zdslog.debug("Done restarting %s" % (zserv_name))
 
+    def _run_lifecycle_operation(self, action, func, zservs, names=None,
+                                       stagger=None):
+        """Acts on several ZServs in parallel.
+
+        :param action: what's being done, i.e. 'start'
+        :type action: string
+        :param func: the function to call with each ZServ's name
+        :type func: function
+        :param zservs: the ZServs to act on
+        :type zservs: list of :class:`~ZDStack.ZServ.ZServ` instances
+        :param names: an optional list of zserv_names which are to be
+                      acted on - used as a limit
+        :type names: list of strings
+        :param stagger: optional, the least number of seconds between
+                        acting on one ZServ and acting on the next;
+                        defaults to lifecycle_stagger
+        :type stagger: float
+        :rtype: dict
+        :returns: the operation's progress, see
+                  :meth:`~ZDStack.ZDSLifecycle.LifecycleOperation.get_progress`
+
+        At most lifecycle_concurrency ZServs are acted on at once.
+
+        """
+        if stagger is None:
+            stagger = self.lifecycle_stagger
+        zserv_names = sorted([x.name for x in zservs
+                                     if not names or x.name in names])
+        with self.lifecycle_lock:
+            self._last_lifecycle_id += 1
+            operation = LifecycleOperation(self._last_lifecycle_id, action,
+                                           zserv_names,
+                                           self.lifecycle_concurrency,
+                                           stagger)
+            self.lifecycle_operations.append(operation)
+            del self.lifecycle_operations[:-self.max_lifecycle_operations]
+        zdslog.info("Starting %s %d of %d ZServs" % (action, operation.id,
+                                                     len(zserv_names)))
+        operation.run(func)
+        progress = operation.get_progress()
+        zdslog.info("Finished %s %d in %.2f seconds, %d failed" % (
+            action, operation.id, progress['seconds'],
+            progress['counts']['failed']
+        ))
+        return progress
+
     def start_all_zservs(self, names=None):
         """Starts all ZServs.
 
         :param names: an optional list of zserv_names which are to
                       be started - used as a limit
         :type names: list of strings
+        :rtype: dict
+        :returns: the operation's progress, see
+                  :meth:`~ZDStack.ZDSLifecycle.LifecycleOperation.get_progress`
+
+        ZServs are started in parallel, lifecycle_stagger seconds
+        apart.
 
         """
         # zdslog.debug('')
-        for zserv in self.get_stopped_zservs():
-            if not names or zserv.name in names:
-                self.start_zserv(zserv.name)
+        return self._run_lifecycle_operation('start', self.start_zserv,
+                                             self.get_stopped_zservs(), names)
+
+    def _stop_zserv_if_running(self, zserv_name):
+        try:
+            self.stop_zserv(zserv_name)
+        except Exception, e:
+            if not str(e).endswith('is not running'):
+                raise
 
     def stop_all_zservs(self, names=None):
         """Stops all ZServs.
@@ -645,19 +1107,19 @@ class Stack(Server):
         :param names: an optional list of zserv_names which are to
                       be stopped - used as a limit
         :type names: list of strings
+        :rtype: dict
+        :returns: the operation's progress, see
+                  :meth:`~ZDStack.ZDSLifecycle.LifecycleOperation.get_progress`
+
+        ZServs are stopped in parallel.  An error stopping one ZServ
+        doesn't prevent the others from being stopped.
 
         """
         # zdslog.debug('')
-        for zserv in self.get_running_zservs():
-            if not names or zserv.name in names:
-                try:
-                    self.stop_zserv(zserv.name)
-                except Exception, e:
-                    if not str(e).endswith('is not running'):
-                        ###
-                        # We still want to stop the other servers.
-                        ###
-                        continue
+        return self._run_lifecycle_operation('stop',
+                                             self._stop_zserv_if_running,
+                                             self.get_running_zservs(), names,
+                                             stagger=0)
 
     def restart_all_zservs(self, names=None):
         """Restarts all ZServs.
@@ -665,12 +1127,67 @@ class Stack(Server):
         :param names: an optional list of zserv_names which are to
                       be stopped - used as a limit
         :type names: list of strings
+        :rtype: dict
+        :returns: the operation's progress, see
+                  :meth:`~ZDStack.ZDSLifecycle.LifecycleOperation.get_progress`
+
+        ZServs are restarted in parallel, lifecycle_stagger seconds
+        apart, so at most lifecycle_concurrency are down at once.
 
         """
         # zdslog.debug('')
-        for zserv in self.get_running_zservs():
-            if not names or zserv.name in names:
-                self.restart_zserv(zserv.name)
+        return self._run_lifecycle_operation('restart', self.restart_zserv,
+                                             self.get_running_zservs(), names)
+
+    def get_lifecycle_progress(self, operation_id=None):
+        """Returns the progress of a start, stop or restart of ZServs.
+
+        :param operation_id: optional, the ID of the operation; defaults
+                             to the most recent operation
+        :type operation_id: int
+        :rtype: dict
+        :returns: the operation's progress, or an empty dict if no
+                  operations have been run.  See
+                  :meth:`~ZDStack.ZDSLifecycle.LifecycleOperation.get_progress`
+
+        start_all_zservs(), stop_all_zservs() and restart_all_zservs()
+        don't return until they're finished, so this can be called
+        (from another connection) to watch them.  Only the most recent
+        operations are kept.
+
+        """
+        with self.lifecycle_lock:
+            operations = list(self.lifecycle_operations)
+        if not operations:
+            return dict()
+        if operation_id is None:
+            return operations[-1].get_progress()
+        for operation in operations:
+            if operation.id == operation_id:
+                return operation.get_progress()
+        raise ValueError("Lifecycle operation [%s] not found" % (operation_id))
+
+    def reload_plugins(self, names=None):
+        """Reloads ZServs' plugins.
+
+        :param names: an optional list of zserv_names whose plugins are
+                      to be reloaded - used as a limit
+        :type names: list of strings
+        :rtype: dict
+        :returns: {<string: ZServ name>: <list: plugin names>}
+
+        Only plugin files that have changed since they were last loaded
+        are loaded again.  ZServs don't have to be restarted, new events
+        are handled by the reloaded plugins.
+
+        """
+        plugins = dict()
+        for zserv in self.zservs.values():
+            if names and zserv.name not in names:
+                continue
+            zserv.load_plugins()
+            plugins[zserv.name] = [x.__name__ for x in zserv.plugins]
+        return plugins
 
     def get_zserv(self, zserv_name):
         """Returns a ZServ instance.
@@ -698,59 +1215,20 @@ class Stack(Server):
         else:
             return self.zservs.keys()
 
-    def _get_zserv_info(self, zserv):
-        """Returns a dict of zserv info.
-
-        :param zserv: the :class:`~ZDStack.ZServ.ZServ` to get info for
-        :type zserv: :class:`~ZDStack.ZServ.ZServ
-        :rtype: dict
-
-        """
-        players = len([x for x in zserv.players if not x.disconnected])
-        if hasattr(zserv, 'ip'):
-            ip_address = zserv.ip
-        else:
-            ip_address = self.hostname
-        if hasattr(zserv, 'max_players'):
-            max_players = zserv.max_players
-        else:
-            max_players = 16
-        return {'name': zserv.name,
-                'hostname': zserv.hostname,
-                'mode': zserv.game_mode,
-                'wads': zserv.wads,
-                'optional_wads': zserv.optional_wads,
-                'ip': ip_address,
-                'port': zserv.port,
-                'players': players,
-                'max_players': max_players,
-                'map_name': zserv.map_name,
-                'map_number': zserv.map_number,
-                'round_id': zserv.round_id,
-                'is_running': zserv.is_running()}
-
     def get_zserv_info(self, zserv_name):
         """Returns a dict of zserv info.
 
         :param zserv_name: the name of the ZServ to get info for
         :type zserv_name: string
         :rtype: dict
-        :returns: {'name': <string: internal name of ZServ>,
-                   'hostname': <string: hostname of ZServ>,
-                   'mode': <string: Game mode of ZServ>,
-                   'wads': <strings: list of ZServ's WADs>,
-                   'optional_wads': <strings: list of ZServ's optional WADs>,
-                   'ip': <string: the ZServ's IP address>,
-                   'port': <int: ZServ's port>,
-                   'players': <int: number of connected players>,
-                   'max_players': <int: maximum number of connected players>,
-                   'map_name': <string: name of the current map>,
-                   'map_number': <int: number of the current map>,
-                   'round_id': <int: ID of the current round>,
-                   'is_running': <boolean: whether ZServ is currently running>}
+        :returns: the ZServ's latest status snapshot, see
+                  :meth:`~ZDStack.ZServ.ZServ.refresh_status`
+
+        This never acquires a lock, so it can't be held up by event
+        handling.
 
         """
-        return self._get_zserv_info(self.get_zserv(zserv_name))
+        return dict(self.get_zserv(zserv_name).status)
 
     def get_all_zserv_info(self, names=None):
         """Returns a list of zserv info dicts.
@@ -768,6 +1246,166 @@ class Stack(Server):
             x = [y for y in self.zservs]
         return [self.get_zserv_info(y) for y in x]
 
+    def get_all_zserv_info_if_changed(self, etag=None, names=None):
+        """Returns a list of zserv info dicts, if any have changed.
+
+        :param etag: optional, the ETag returned by the last call
+        :type etag: string
+        :param names: an optional list of zserv_names for which to
+                      return information - used as a limit.
+        :type names: list of strings
+        :rtype: dict
+        :returns: {'etag': <string: ETag of the current info>,
+                   'changed': <boolean: whether the info has changed>,
+                   'info': <list: zserv info dicts, empty if the info
+                                  hasn't changed>}
+
+        See get_zserv_info() for more information.  The ETag changes
+        whenever any ZServ's status changes, so pollers only have to
+        process the info when 'changed' is True.
+
+        """
+        ###
+        # Get the generation first, so if a ZServ's status changes while
+        # we're getting the info, the next call will get it again.
+        ###
+        generation = self.status_generation
+        current_etag = '%d-%d-%x' % (
+            time.mktime(self.start_time.timetuple()),
+            generation,
+            hash(tuple(sorted(names or [])))
+        )
+        if etag == current_etag:
+            return {'etag': current_etag, 'changed': False, 'info': []}
+        return {'etag': current_etag,
+                'changed': True,
+                'info': self.get_all_zserv_info(names)}
+
+    def get_zserv_metrics(self, zserv_name):
+        """Returns a dict of zserv timings and counters.
+
+        :param zserv_name: the name of the ZServ to get metrics for
+        :type zserv_name: string
+        :rtype: dict
+
+        See :meth:`~ZDStack.ZDSMetrics.Metrics.to_dict` for the format
+        of the returned dict.
+
+        """
+        return self.get_zserv(zserv_name).metrics.to_dict()
+
+    def get_all_zserv_metrics(self, names=None):
+        """Returns a list of zserv metrics dicts.
+
+        :param names: an optional list of zserv_names for which to
+                      return metrics - used as a limit.
+        :type names: list of strings
+
+        See get_zserv_metrics() for more information.
+
+        """
+        if names:
+            x = [y for y in self.zservs if y in names]
+        else:
+            x = [y for y in self.zservs]
+        return [self.get_zserv_metrics(y) for y in x]
+
+    def get_leaderboard(self, zserv_name, stat='frags', window='day',
+                              limit=10):
+        """Returns a zserv's top players.
+
+        :param zserv_name: the name of the ZServ
+        :type zserv_name: string
+        :param stat: optional, the stat to rank players by: 'frags',
+                     'deaths', 'suicides', 'flag_touches',
+                     'flag_captures' or 'flag_returns'; defaults to
+                     'frags'
+        :type stat: string
+        :param window: optional, the period to total over: 'hour',
+                       'day' or 'week'; defaults to 'day'
+        :type window: string
+        :param limit: optional, the number of players to return;
+                      defaults to 10
+        :type limit: int
+        :rtype: list
+        :returns: [[<string: player name>, <int: total>], ...], highest
+                  total first
+
+        Totals are kept as events are handled, so this doesn't touch
+        the database.  Windows roll forward 5 minutes at a time.
+
+        """
+        zserv = self.get_zserv(zserv_name)
+        return zserv.leaderboard.top(stat, window, int(limit))
+
+    def get_all_leaderboards(self, stat='frags', window='day', limit=10,
+                                   names=None):
+        """Returns every zserv's top players.
+
+        :param stat: optional, the stat to rank players by; defaults to
+                     'frags'
+        :type stat: string
+        :param window: optional, the period to total over; defaults to
+                       'day'
+        :type window: string
+        :param limit: optional, the number of players to return for
+                      each zserv; defaults to 10
+        :type limit: int
+        :param names: an optional list of zserv_names for which to
+                      return leaderboards - used as a limit.
+        :type names: list of strings
+        :rtype: dict
+        :returns: {<string: zserv_name>: <list: top players>}
+
+        See get_leaderboard() for more information.
+
+        """
+        if names:
+            x = [y for y in self.zservs if y in names]
+        else:
+            x = [y for y in self.zservs]
+        return dict([(y, self.get_leaderboard(y, stat, window, limit))
+                     for y in x])
+
+    def fan_out(self, method_name, names=None, args=None):
+        """Calls a method on several ZServs at once.
+
+        :param method_name: the name of the method to call, must be in
+                            fan_out_methods
+        :type method_name: string
+        :param names: an optional list of zserv_names on which to call
+                      the method - used as a limit.
+        :type names: list of strings
+        :param args: optional, arguments to pass to the method after
+                     the zserv's name
+        :type args: list
+        :rtype: dict
+        :returns: {<string: zserv_name>: {'result': <the method's result>,
+                                          'error': <string: error or None>}}
+
+        The calls are made in parallel, so a dashboard covering many
+        zservs can get every zserv's players (for example) in a single
+        request, and only wait as long as the slowest zserv.
+
+        """
+        if method_name not in self.fan_out_methods:
+            raise ValueError("Method [%s] can't be fanned out" % (method_name))
+        method = getattr(self, method_name)
+        args = args or []
+        if names:
+            x = [y for y in self.zservs if y in names]
+        else:
+            x = [y for y in self.zservs]
+        results = parallel_map(lambda y: method(y, *args), x)
+        out = dict()
+        for zserv_name, (result, error) in zip(x, results):
+            if error is not None:
+                es = "%s: %s" % (error.__class__.__name__, error)
+                out[zserv_name] = {'result': None, 'error': es}
+            else:
+                out[zserv_name] = {'result': result, 'error': None}
+        return out
+
     def _items_to_section(self, name, items):
         """Converts a list of items into a ConfigParser section.
 
@@ -833,6 +1471,10 @@ class Stack(Server):
         for section in self.raw_config.sections():
             self.raw_config.set(section, 'name', section)
         self.get_zserv(zserv_name).load_config(reload=True)
+        effective_config = get_effective_config(self.config, zserv_name)
+        config_hash = get_config_hash(effective_config)
+        self.zserv_configs[zserv_name] = effective_config
+        self.zserv_config_hashes[zserv_name] = config_hash
 
     def send_to_zserv(self, zserv_name, message):
         """Sends a command to a running zserv process.
@@ -1164,96 +1806,58 @@ class Stack(Server):
         # self.rpc_server.register_function(self.list_player_names)
         ###
         ###
-        # General ZDStack management functions
+        # General ZDStack and zserv process management functions.  These
+        # change the same state, so only one of them runs at a time.
         ###
-        self.rpc_server.register_function(self.start,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.stop,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.restart,
-                                          requires_authentication=True)
-        ###
-        # zserv process management functions
-        ###
-        self.rpc_server.register_function(self.start_zserv,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.stop_zserv,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.restart_zserv,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.start_all_zservs,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.stop_all_zservs,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.restart_all_zservs,
-                                          requires_authentication=True)
+        for f in (self.start, self.stop, self.restart, self.start_zserv,
+                  self.stop_zserv, self.restart_zserv, self.start_all_zservs,
+                  self.stop_all_zservs, self.restart_all_zservs,
+                  self.set_zserv_config, self.reload_plugins):
+            self.rpc_server.register_function(
+                f,
+                requires_authentication=True,
+                max_concurrency=1,
+                concurrency_group='management'
+            )
         ###
         # Information functions
         ###
         self.rpc_server.register_function(self.list_zserv_names)
         self.rpc_server.register_function(self.get_zserv_info)
         self.rpc_server.register_function(self.get_all_zserv_info)
+        self.rpc_server.register_function(self.get_all_zserv_info_if_changed)
+        self.rpc_server.register_function(self.get_leaderboard)
+        self.rpc_server.register_function(self.get_all_leaderboards)
+        self.rpc_server.register_function(self.get_zserv_metrics,
+                                          requires_authentication=True)
+        self.rpc_server.register_function(self.get_all_zserv_metrics,
+                                          requires_authentication=True)
         self.rpc_server.register_function(self.get_zserv_config,
                                           requires_authentication=True)
-        self.rpc_server.register_function(self.set_zserv_config,
+        self.rpc_server.register_function(self.get_lifecycle_progress,
                                           requires_authentication=True)
+        self.rpc_server.register_function(
+            self.fan_out,
+            requires_authentication=True,
+            max_concurrency=self.rpc_method_limit
+        )
         ###
-        # Command functions
+        # Command functions.  Most of these wait on a zserv's Messenger,
+        # which only sends one command at a time, so limit how many calls to
+        # each can be waiting at once.
         ###
-        self.rpc_server.register_function(self.send_to_zserv,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.add_ban,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.add_whitelist,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.addban,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.add_global_ban,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.remove_global_ban,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.add_global_whitelist,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.remove_global_whitelist,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.addbot,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.addmap,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.clearmaplist,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.delete_ban,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.delete_whitelist,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.get,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.kick,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.remove_ban,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.remove_whitelist,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.killban,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.map,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.maplist,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.players,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.removebots,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.resetscores,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.say,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.set,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.toggle,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.unset,
-                                          requires_authentication=True)
-        self.rpc_server.register_function(self.wads,
-                                          requires_authentication=True)
+        for f in (self.send_to_zserv, self.add_ban, self.add_whitelist,
+                  self.addban, self.add_global_ban, self.remove_global_ban,
+                  self.add_global_whitelist, self.remove_global_whitelist,
+                  self.addbot, self.addmap, self.clearmaplist,
+                  self.delete_ban, self.delete_whitelist, self.get, self.kick,
+                  self.remove_ban, self.remove_whitelist, self.killban,
+                  self.map, self.maplist, self.players, self.removebots,
+                  self.resetscores, self.say, self.set, self.toggle,
+                  self.unset, self.wads):
+            self.rpc_server.register_function(
+                f,
+                requires_authentication=True,
+                max_concurrency=self.rpc_method_limit
+            )
 
@@ -9,6 +9,14 @@ import logging
 zdslog = logging.getLogger('ZDStack')
 
 from datetime import datetime, timedelta
+from threading import Lock
+
+###
+# Openers and closers of clan/team tags in player names.
+###
+TAG_DELIMITERS = {'[': ']', '<': '>', '(': ')', '*': '*', '_': '_', '-': '-',
+                  ']': '[', '>': '<', ')': '(', ':': ':', '=': '=', '.': '.',
+                  '^': '^'}
 
 def create_file(filepath):
     """Creates a file with proper permissions.
@@ -71,6 +79,69 @@ def resolve_path(f):
     """
     return os.path.abspath(os.path.expanduser(f))
 
+def lru_cache(max_size=1024):
+    """A function decorator that caches a function's results.
+
+    :param max_size: optional, the most results to cache; defaults to
+                     1024
+    :type max_size: int
+
+    When the cache is full, the least recently used result is dropped.
+    Only use this on functions whose positional arguments are hashable,
+    that take no keyword arguments, and that return immutable values.
+
+    """
+    def decorator(f):
+        lock = Lock()
+        cache = dict()
+        ###
+        # Results are kept in a circular, doubly-linked list of
+        # [previous, next, key, result] lists, least recently used first.
+        # 'root' is its sentinel.
+        ###
+        root = list()
+        root.extend([root, root, None, None])
+        def move_to_end(link):
+            link[0][1] = link[1]
+            link[1][0] = link[0]
+            last = root[0]
+            last[1] = root[0] = link
+            link[0] = last
+            link[1] = root
+        def wrapper(*args):
+            with lock:
+                link = cache.get(args)
+                if link is not None:
+                    move_to_end(link)
+                    return link[3]
+            result = f(*args)
+            with lock:
+                if args in cache:
+                    ###
+                    # Another thread cached this while we were calling f.
+                    ###
+                    return result
+                if len(cache) >= max_size:
+                    oldest = root[1]
+                    root[1] = oldest[1]
+                    oldest[1][0] = root
+                    del cache[oldest[2]]
+                last = root[0]
+                link = [last, root, args, result]
+                last[1] = root[0] = cache[args] = link
+            return result
+        def cache_clear():
+            with lock:
+                cache.clear()
+                root[:] = [root, root, None, None]
+        wrapper.__name__ = f.__name__
+        wrapper.__dict__ = f.__dict__
+        wrapper.__doc__ = f.__doc__
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+@lru_cache(max_size=4096)
 def homogenize(s):
     """Homogenizes a string.
 
@@ -83,6 +154,7 @@ def homogenize(s):
     """
     return s.replace(' ', '').lower().replace('\n', '').replace('\t', '')
 
+@lru_cache(max_size=1024)
 def parse_player_name(name):
     """Parses a player's name into a tag and a base player name.
 
@@ -99,9 +171,7 @@ def parse_player_name(name):
     ###
     from ZDStack.Token import Token
 
-    delimiters = {'[': ']', '<': '>', '(': ')', '*': '*', '_': '_',
-                  '-': '-', ']': '[', '>': '<', ')': '(', ':': ':',
-                  '=': '=', '.': '.', '^': '^'}
+    delimiters = TAG_DELIMITERS
     seen = []
     waiting = []
     tokens = []
@@ -109,7 +179,7 @@ def parse_player_name(name):
     other_stuff = ''
     in_token = False
     for c in name:
-        if c in delimiters.keys(): # found a delimiter
+        if c in delimiters: # found a delimiter
             if waiting and waiting[-1] == c: # found the end of a token
                 tokens.append(Token(s, seen[-1], c))
                 s = ''
@@ -294,6 +364,55 @@ def requires_instance_lock():
         return wrapper
     return decorator
 
+def parallel_map(func, items, max_threads=16):
+    """Calls a function on each item in a sequence, in parallel.
+
+    :param func: the function to call
+    :type func: function
+    :param items: the items to call func on, one at a time
+    :type items: sequence
+    :param max_threads: optional, the maximum number of calls to run at
+                        once, defaults to 16
+    :type max_threads: int
+    :rtype: list of 2-tuples
+    :returns: a (result, exception) tuple for each item, in the same
+              order as items.  exception is None if the call didn't
+              raise one.
+
+    This is for calls that spend most of their time waiting, like
+    sending commands to zservs.  The threads only live as long as the
+    call to parallel_map.
+
+    """
+    import Queue
+    from threading import Thread
+    items = list(items)
+    results = [None] * len(items)
+    pending = Queue.Queue()
+    for x in enumerate(items):
+        pending.put_nowait(x)
+    def worker():
+        while 1:
+            try:
+                index, item = pending.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[index] = (func(item), None)
+            except Exception, e:
+                results[index] = (None, e)
+    if len(items) < 2:
+        worker()
+        return results
+    threads = [Thread(target=worker, name='Parallel Map Thread')
+               for x in range(min(max_threads, len(items)))]
+    for t in threads:
+        t.setDaemon(True)
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
 def parse_ban_line(line):
     """Converts a properly formatted string into a \
 :class:`~ZDStack.ZDSAccessList.Ban`
@@ -0,0 +1,200 @@
+from __future__ import with_statement
+
+import os
+import gzip
+import datetime
+
+from sqlalchemy import select
+
+from ZDStack import get_zdslog, get_json_module
+from ZDStack.ZDSTables import rounds_table, rounds_and_aliases, frags_table, \
+                              flag_touches_table, flag_returns_table, \
+                              rcon_accesses_table, rcon_actions_table, \
+                              rcon_denials_table, round_alias_stats_table, \
+                              archived_rounds_table
+from ZDStack.ZDSDatabase import new_session
+from ZDStack.ZDSSummaries import summarize_round
+
+zdslog = get_zdslog()
+
+###
+# The tables whose rows are moved to archive files, each has a round_id
+# column.  Rows are deleted in this order.
+###
+ARCHIVED_TABLES = (frags_table, flag_touches_table, flag_returns_table,
+                   rcon_accesses_table, rcon_actions_table,
+                   rcon_denials_table, rounds_and_aliases)
+
+def _encode(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError("%r is not JSON serializable" % (value,))
+
+def get_archive_file(start_time):
+    """Gets the name of the file a round is archived in.
+
+    :param start_time: when the round started
+    :type start_time: datetime
+    :rtype: string
+
+    Rounds are archived by the month they started in.
+
+    """
+    return 'rounds-%04d-%02d.json.gz' % (start_time.year, start_time.month)
+
+def export_rounds(round_ids, session):
+    """Exports rounds and their events.
+
+    :param round_ids: the database IDs of the rounds to export
+    :type round_ids: list of ints
+    :param session: a database session
+    :type session: SQLAlchemy Session
+    :rtype: list
+    :returns: a list of {<string: table name>: <list: rows>} dicts, one
+              per round, plus a 'round' key holding the round's row.
+              Rows are {<string: column name>: <value>} dicts.
+
+    """
+    records = dict()
+    q = select([rounds_table], rounds_table.c.id.in_(round_ids))
+    for row in session.execute(q):
+        record = dict([(x.name, []) for x in ARCHIVED_TABLES])
+        record['round'] = dict(row.items())
+        records[row['id']] = record
+    for table in ARCHIVED_TABLES:
+        q = select([table], table.c.round_id.in_(round_ids))
+        for row in session.execute(q):
+            records[row['round_id']][table.name].append(dict(row.items()))
+    return [records[x] for x in round_ids if x in records]
+
+def write_archive(folder, records):
+    """Appends exported rounds to their archive files.
+
+    :param folder: the folder holding the archive files
+    :type folder: string
+    :param records: exported rounds, as returned by
+                    :func:`export_rounds`
+    :type records: list of dicts
+    :rtype: dict
+    :returns: {<int: round ID>: <string: archive file name>}
+
+    Archive files are gzipped, with one JSON object per line.  Each
+    write is a separate gzip member and is synced to disk before this
+    returns, so a round's events are never deleted before they've been
+    archived.  If deleting them fails though, the round is archived
+    again later, so readers should use the last line for a given round.
+
+    """
+    json = get_json_module()
+    archive_files = dict()
+    lines = dict()
+    for record in records:
+        archive_file = get_archive_file(record['round']['start_time'])
+        archive_files[record['round']['id']] = archive_file
+        lines.setdefault(archive_file, []).append(
+            json.dumps(record, default=_encode)
+        )
+    for archive_file, file_lines in lines.items():
+        fobj = open(os.path.join(folder, archive_file), 'ab')
+        try:
+            gz = gzip.GzipFile(archive_file, 'ab', 9, fobj)
+            gz.write('\n'.join(file_lines) + '\n')
+            gz.close()
+            fobj.flush()
+            os.fsync(fobj.fileno())
+        finally:
+            fobj.close()
+    return archive_files
+
+def read_archive(path):
+    """Reads an archive file.
+
+    :param path: the full path of the archive file
+    :type path: string
+    :rtype: generator
+    :returns: exported rounds, as returned by :func:`export_rounds`,
+              except datetimes are ISO 8601 strings
+
+    """
+    json = get_json_module()
+    gz = gzip.open(path, 'rb')
+    try:
+        for line in gz:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        gz.close()
+
+def delete_archived_rounds(archive_files, session):
+    """Deletes archived rounds' events.
+
+    :param archive_files: the archived rounds, as returned by
+                          :func:`write_archive`
+    :type archive_files: dict
+    :param session: a database session
+    :type session: SQLAlchemy Session
+
+    Rounds that haven't been summarized are summarized first, so their
+    aggregates are kept.  The rounds themselves are kept too, and are
+    recorded in the archived_rounds table.
+
+    """
+    round_ids = archive_files.keys()
+    q = session.query(round_alias_stats_table.c.round_id).distinct()
+    q = q.filter(round_alias_stats_table.c.round_id.in_(round_ids))
+    summarized = set([x[0] for x in q])
+    for round_id in [x for x in round_ids if x not in summarized]:
+        summarize_round(round_id, session)
+    for table in ARCHIVED_TABLES:
+        session.execute(table.delete(table.c.round_id.in_(round_ids)))
+    now = datetime.datetime.now()
+    session.execute(archived_rounds_table.insert(), [
+        {'round_id': x, 'archive_file': y, 'archived_time': now}
+        for x, y in archive_files.items()
+    ])
+
+def archive_rounds(folder, horizon, batch_size=20):
+    """Archives a batch of old rounds.
+
+    :param folder: the folder holding the archive files
+    :type folder: string
+    :param horizon: how old (in days) a round must be to be archived
+    :type horizon: int
+    :param batch_size: optional, the most rounds to archive; defaults to
+                       20
+    :type batch_size: int
+    :rtype: int
+    :returns: the number of rounds archived
+
+    The rounds are exported in one transaction, and deleted in
+    another, so the database lock isn't held while the archive files
+    are written.  Only rounds that ended more than 'horizon' days ago
+    are archived, so nothing else modifies them in between.
+
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=horizon)
+    archived = select([archived_rounds_table.c.round_id])
+    records = list()
+    with new_session() as session:
+        q = session.query(rounds_table.c.id)
+        q = q.filter(rounds_table.c.end_time != None)
+        q = q.filter(rounds_table.c.end_time < cutoff)
+        q = q.filter(~rounds_table.c.id.in_(archived))
+        round_ids = [x[0] for x in
+                     q.order_by(rounds_table.c.id).limit(batch_size)]
+        if round_ids:
+            records = export_rounds(round_ids, session)
+    if not records:
+        return 0
+    archive_files = write_archive(folder, records)
+    ###
+    # new_session() logs and rolls back errors, so only count the rounds if
+    # their events were actually deleted.
+    ###
+    total = 0
+    with new_session() as session:
+        delete_archived_rounds(archive_files, session)
+    if session.committed:
+        total = len(archive_files)
+    zdslog.info("Archived %d rounds" % (total))
+    return total
@@ -1,5 +1,6 @@
 from __future__ import with_statement
 
+import time
 import datetime
 
 from contextlib import contextmanager
@@ -13,6 +14,7 @@ from sqlalchemy.orm.exc import NoResultFound
 from ZDStack import get_db_lock, get_session_class, get_zdslog
 from ZDStack.Utils import requires_lock
 from ZDStack.ZDSModels import *
+from ZDStack.ZDSMetrics import get_current_metrics
 
 zdslog = get_zdslog()
 
@@ -29,17 +31,24 @@ def _locked_session(get_global=False, remove=False):
             s = __GLOBAL_SESSION
         else:
             s = SessionClass()
+        s.committed = False
         try:
             try:
                 s.begin()
                 yield s
+                flush_start = time.time()
                 s.commit()
+                s.committed = True
+                metrics = get_current_metrics()
+                if metrics:
+                    metrics.add_timing('db_flush', time.time() - flush_start)
             except OperationalError, e:
                 zdslog.error("Got an operational error: %s" % (e))
                 ###
                 # Try again - MySQL could've just timed out.
                 ###
                 s.commit()
+                s.committed = True
         except Exception, e:
             zdslog.error("Error inside transaction: %s" % (e))
             import traceback
@@ -71,7 +80,9 @@ def new_session():
     :rtype: Session
 
     This is a contextmanager that opens a transaction, committing or
-    rolling back as necessary.
+    rolling back as necessary.  Errors are logged, not raised, so
+    afterwards the Session's 'committed' attribute is True only if the
+    transaction was committed.
 
     """
     return _locked_session(get_global=False, remove=True)
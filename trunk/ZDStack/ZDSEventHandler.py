@@ -10,7 +10,7 @@ from ZDStack.ZServ import TEAM_MODES, TEAMDM_MODES
 from ZDStack.ZDSModels import Weapon, Round, Alias, Frag, FlagTouch, \
                               FlagReturn, RCONAccess, RCONDenial, RCONAction, \
                               GameMode, TeamColor, Map
-from ZDStack.ZDSRegexps import get_possible_player_names
+from ZDStack.ZDSRegexps import get_possible_player_names, remove_timestamp
 from ZDStack.ZDSDatabase import requires_session
 
 from sqlalchemy import desc
@@ -655,6 +655,7 @@ class ZServEventHandler(BaseEventHandler):
                                          color in zserv.playing_colors
             else:
                 player.playing = True
+            zserv.plugin_state.update_player(player)
             round = zserv.get_round(session=session)
             if player.playing and not player in round.aliases:
                 round.aliases.append(player)
@@ -707,22 +708,20 @@ class ZServEventHandler(BaseEventHandler):
             # Nothing really to be done here.
             ###
             return
+        zserv.leaderboard.add_event(event)
         zdslog.debug("Acquiring %s" % (zserv.state_lock))
         with zserv.state_lock:
             zdslog.debug("Acquired %s" % (zserv.state_lock))
             if event.type in ('flag_cap', 'flag_loss'):
                 player = self._get_alias(event, 'player', zserv,
                                          session=session)
-                q = session.query(FlagTouch)
-                q = q.filter(and_(FlagTouch.player_id==player.id,
-                                  FlagTouch.round_id==zserv.round_id))
-                stat = q.order_by(FlagTouch.touch_time.desc()).first()
+                if not player:
+                    return
+                stat = zserv.open_flag_touches.pop(player, None)
                 if not stat:
                     es = "Couldn't find FlagTouch by %s in %d"
                     zdslog.error(es % (player.name, zserv.round_id))
                     return
-                player = self._get_alias(event, 'player', zserv,
-                                         session=session)
                 stat.loss_time = event.dt
                 try:
                     zserv.players_holding_flags.remove(player)
@@ -753,6 +752,20 @@ class ZServEventHandler(BaseEventHandler):
                     stat = FlagTouch()
                 stat = self._add_common_state(stat, event, zserv,
                                               session=session)
+                if not stat:
+                    return
+                if event.type != 'flag_return':
+                    ###
+                    # A player can only hold one flag at a time, so if they
+                    # somehow still have an open FlagTouch, close it.
+                    ###
+                    old_stat = zserv.open_flag_touches.get(stat.alias)
+                    if old_stat and not old_stat.loss_time:
+                        es = "%s touched a flag while holding one"
+                        zdslog.error(es % (stat.alias.name))
+                        old_stat.loss_time = event.dt
+                        session.merge(old_stat)
+                    zserv.open_flag_touches[stat.alias] = stat
                 zdslog.debug("Persisting[%s]" % (stat))
                 session.add(stat)
             else:
@@ -772,6 +785,7 @@ class ZServEventHandler(BaseEventHandler):
 
         """
         zdslog.debug("handle_frag_event(%s)" % (event))
+        zserv.leaderboard.add_event(event)
         zdslog.debug("Acquiring %s" % (zserv.state_lock))
         with zserv.state_lock:
             zdslog.debug("Acquired %s" % (zserv.state_lock))
@@ -814,6 +828,25 @@ class ZServEventHandler(BaseEventHandler):
         if not event.type == 'junk':
             return
         zdslog.debug('handle_junk_event(%s)' % (event))
+        ###
+        # Messages all start with '<', so anything else is just junk.
+        ###
+        line = remove_timestamp(event.line)
+        if not line.startswith('<'):
+            return None
+        ###
+        # Usually the sender is connected and in the players list's name
+        # trie, so they can be found without building a list of possible
+        # names.
+        ###
+        player = zserv.players.get_message_sender(line, session=session)
+        if player:
+            event.type = 'message'
+            event.category = 'message'
+            message = line[len(player.name) + 3:]
+            event.data = {'message': message, 'messenger': player}
+            self.get_handler('message')(event, zserv, session=session)
+            return
         output = get_possible_player_names(event.line)
         if not output:
             ###
@@ -0,0 +1,286 @@
+from __future__ import with_statement
+
+import time
+import heapq
+
+from operator import itemgetter
+from threading import Lock
+
+from ZDStack import get_zdslog
+from ZDStack.ZDSTables import leaderboard_buckets_table
+
+zdslog = get_zdslog()
+
+###
+# Counts are kept in buckets of BUCKET_SIZE seconds, so windows roll forward
+# BUCKET_SIZE seconds at a time.
+###
+BUCKET_SIZE = 300
+
+###
+# Window names and their lengths in seconds.
+###
+WINDOWS = {'hour': 3600, 'day': 86400, 'week': 604800}
+
+###
+# Buckets older than the longest window are dropped.
+###
+MAX_WINDOW = max(WINDOWS.values())
+
+STATS = ('frags', 'deaths', 'suicides', 'flag_touches', 'flag_captures',
+         'flag_returns')
+
+def _get_bucket(now=None):
+    now = now or time.time()
+    return int(now // BUCKET_SIZE) * BUCKET_SIZE
+
+def _get_oldest_bucket(window, current_bucket):
+    return current_bucket - WINDOWS[window] + BUCKET_SIZE
+
+def _add_counts(totals, counts, sign=1):
+    for stat, players in counts.items():
+        stat_totals = totals[stat]
+        for player, count in players.items():
+            total = stat_totals.get(player, 0) + (sign * count)
+            if total:
+                stat_totals[player] = total
+            else:
+                ###
+                # Keep the totals small, so top-N queries stay fast.
+                ###
+                stat_totals.pop(player, None)
+
+class Leaderboard(object):
+
+    """Leaderboard keeps a ZServ's rolling player totals.
+
+    .. attribute:: name
+        A string representing the name of the ZServ.
+
+    .. attribute:: lock
+        A Lock that must be acquired before modifying buckets, totals
+        or dirty_buckets.
+
+    .. attribute:: buckets
+        A dict mapping bucket start times (seconds since the epoch) to
+        {<string: stat>: {<string: player name>: <int: count>}} dicts.
+
+    .. attribute:: totals
+        A dict mapping window names to
+        {<string: stat>: {<string: player name>: <int: total>}} dicts,
+        holding the sum of the buckets in each window.
+
+    .. attribute:: dirty_buckets
+        A set of the start times of buckets changed since the last
+        checkpoint.
+
+    Counts are added to the current bucket and to every window's totals
+    as events are handled, and when the current bucket changes, the
+    buckets that have fallen out of a window are subtracted from its
+    totals.  So a top-N query never has to add anything up, it only
+    picks the largest of a window's totals.
+
+    """
+
+    def __init__(self, name):
+        """Initializes a Leaderboard.
+
+        :param name: the name of the ZServ
+        :type name: string
+
+        """
+        self.name = name
+        self.lock = Lock()
+        self.buckets = dict()
+        self.totals = dict()
+        for window in WINDOWS:
+            self.totals[window] = dict([(x, dict()) for x in STATS])
+        self.dirty_buckets = set()
+        self._current_bucket = _get_bucket()
+
+    def _advance(self, current_bucket):
+        if current_bucket <= self._current_bucket:
+            return
+        previous_bucket = self._current_bucket
+        self._current_bucket = current_bucket
+        for window in WINDOWS:
+            old_oldest = _get_oldest_bucket(window, previous_bucket)
+            new_oldest = _get_oldest_bucket(window, current_bucket)
+            for bucket_start, counts in self.buckets.items():
+                if old_oldest <= bucket_start < new_oldest:
+                    _add_counts(self.totals[window], counts, sign=-1)
+        oldest = current_bucket - MAX_WINDOW
+        for bucket_start in [x for x in self.buckets if x <= oldest]:
+            del self.buckets[bucket_start]
+            self.dirty_buckets.discard(bucket_start)
+
+    def _add(self, bucket_start, stat, player, count):
+        bucket = self.buckets.setdefault(bucket_start,
+                                         dict([(x, dict()) for x in STATS]))
+        bucket[stat][player] = bucket[stat].get(player, 0) + count
+        for window in WINDOWS:
+            if bucket_start >= _get_oldest_bucket(window,
+                                                  self._current_bucket):
+                totals = self.totals[window][stat]
+                totals[player] = totals.get(player, 0) + count
+
+    def add(self, stat, player, count=1, now=None):
+        """Adds to a player's count.
+
+        :param stat: the stat to add to, one of STATS
+        :type stat: string
+        :param player: the name of the player
+        :type player: string
+        :param count: optional, how much to add; defaults to 1
+        :type count: int
+        :param now: optional, when it happened; defaults to
+                    time.time()
+        :type now: float
+
+        """
+        bucket_start = _get_bucket(now)
+        with self.lock:
+            self._advance(bucket_start)
+            if bucket_start <= self._current_bucket - MAX_WINDOW:
+                return
+            self._add(bucket_start, stat, player, count)
+            self.dirty_buckets.add(bucket_start)
+
+    def add_event(self, event):
+        """Counts an event.
+
+        :param event: the event to count
+        :type event: :class:`~ZDStack.LogEvent.LogEvent`
+
+        Only frag, death and flag events are counted, others are
+        ignored.
+
+        """
+        if event.category in ('frag', 'death'):
+            fraggee = event.data['fraggee']
+            fragger = event.data.get('fragger', fraggee)
+            if fragger == fraggee:
+                self.add('suicides', fraggee)
+            else:
+                self.add('frags', fragger)
+            self.add('deaths', fraggee)
+        elif event.category == 'flag':
+            if event.type in ('flag_touch', 'flag_pick'):
+                self.add('flag_touches', event.data['player'])
+            elif event.type == 'flag_cap':
+                self.add('flag_captures', event.data['player'])
+            elif event.type == 'flag_return':
+                self.add('flag_returns', event.data['player'])
+
+    def top(self, stat, window, limit=10):
+        """Gets the players with the highest totals.
+
+        :param stat: the stat to rank players by, one of STATS
+        :type stat: string
+        :param window: the window to total over, one of WINDOWS
+        :type window: string
+        :param limit: optional, how many players to return; defaults to
+                      10
+        :type limit: int
+        :rtype: list
+        :returns: a list of [<string: player name>, <int: total>] lists,
+                  highest total first
+
+        """
+        if stat not in STATS:
+            raise ValueError("Unknown stat [%s]" % (stat))
+        if window not in WINDOWS:
+            raise ValueError("Unknown window [%s]" % (window))
+        with self.lock:
+            self._advance(_get_bucket())
+            top = heapq.nlargest(limit, self.totals[window][stat].items(),
+                                 key=itemgetter(1))
+        top.sort(key=lambda x: (-x[1], x[0]))
+        return [list(x) for x in top]
+
+    def mark_dirty(self, bucket_starts):
+        """Marks buckets to be saved at the next checkpoint.
+
+        :param bucket_starts: the start times of the buckets
+        :type bucket_starts: list of floats
+
+        Buckets that have since fallen out of every window are ignored.
+
+        """
+        with self.lock:
+            self.dirty_buckets.update([x for x in bucket_starts
+                                          if x in self.buckets])
+
+    def save_checkpoint(self, session):
+        """Saves the buckets changed since the last checkpoint.
+
+        :param session: a database session
+        :type session: SQLAlchemy Session
+        :rtype: list of floats
+        :returns: the start times of the buckets saved
+
+        If saving fails, the buckets are saved at the next checkpoint.
+        Saving happens inside the caller's transaction, so if the
+        transaction isn't committed, the caller must pass the returned
+        buckets to :meth:`mark_dirty`.
+
+        """
+        with self.lock:
+            dirty = dict()
+            for bucket_start in self.dirty_buckets:
+                counts = self.buckets[bucket_start]
+                dirty[bucket_start] = dict([
+                    (x, dict(y)) for x, y in counts.items()
+                ])
+            self.dirty_buckets.clear()
+            oldest = self._current_bucket - MAX_WINDOW
+        if not dirty:
+            return list()
+        try:
+            t = leaderboard_buckets_table
+            rows = list()
+            for bucket_start, counts in dirty.items():
+                session.execute(t.delete((t.c.zserv_name == self.name) &
+                                         (t.c.bucket_start == bucket_start)))
+                for stat, players in counts.items():
+                    rows.extend([{'zserv_name': self.name,
+                                  'bucket_start': bucket_start,
+                                  'stat': stat,
+                                  'player_name': player,
+                                  'count': count}
+                                 for player, count in players.items()])
+            if rows:
+                session.execute(t.insert(), rows)
+            session.execute(t.delete((t.c.zserv_name == self.name) &
+                                     (t.c.bucket_start <= oldest)))
+        except:
+            self.mark_dirty(dirty.keys())
+            raise
+        zdslog.debug("Checkpointed %d %s leaderboard buckets" % (len(dirty),
+                                                                 self.name))
+        return dirty.keys()
+
+    def load_checkpoint(self, session):
+        """Loads this Leaderboard's buckets from the last checkpoint.
+
+        :param session: a database session
+        :type session: SQLAlchemy Session
+
+        Any counts already in this Leaderboard are replaced.
+
+        """
+        t = leaderboard_buckets_table
+        with self.lock:
+            self.buckets = dict()
+            for window in WINDOWS:
+                self.totals[window] = dict([(x, dict()) for x in STATS])
+            self.dirty_buckets = set()
+            self._current_bucket = _get_bucket()
+            oldest = self._current_bucket - MAX_WINDOW
+            q = session.query(t.c.bucket_start, t.c.stat, t.c.player_name,
+                              t.c.count)
+            q = q.filter((t.c.zserv_name == self.name) &
+                         (t.c.bucket_start > oldest))
+            for bucket_start, stat, player, count in q:
+                if stat in STATS:
+                    self._add(bucket_start, stat, player, count)
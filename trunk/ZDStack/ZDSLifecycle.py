@@ -0,0 +1,157 @@
+from __future__ import with_statement
+
+import time
+
+from threading import Lock
+
+from ZDStack import get_zdslog
+from ZDStack.Utils import parallel_map
+
+zdslog = get_zdslog()
+
+class LifecycleOperation(object):
+
+    """LifecycleOperation starts, stops or restarts several ZServs.
+
+    .. attribute:: id
+        An int identifying this operation.
+
+    .. attribute:: action
+        A string representing what's being done, i.e. 'start'.
+
+    .. attribute:: concurrency
+        The most ZServs acted on at once.
+
+    .. attribute:: stagger
+        The least number of seconds between acting on one ZServ and
+        acting on the next.
+
+    .. attribute:: lock
+        A Lock that must be acquired before modifying servers or
+        next_start_time.
+
+    .. attribute:: servers
+        A dict mapping ZServ names to {'state': <string>,
+        'start_time': <float>, 'end_time': <float>,
+        'seconds': <float>, 'error': <string>} dicts.  States are
+        'pending', 'running', 'done' and 'failed'.
+
+    .. attribute:: start_time
+        When this operation started (from time.time()), or None.
+
+    .. attribute:: end_time
+        When this operation finished (from time.time()), or None.
+
+    """
+
+    def __init__(self, operation_id, action, names, concurrency=4,
+                       stagger=0):
+        """Initializes a LifecycleOperation.
+
+        :param operation_id: an int identifying the operation
+        :type operation_id: int
+        :param action: what's being done, i.e. 'start'
+        :type action: string
+        :param names: the names of the ZServs to act on
+        :type names: list of strings
+        :param concurrency: optional, the most ZServs to act on at
+                            once; defaults to 4
+        :type concurrency: int
+        :param stagger: optional, the least number of seconds between
+                        acting on one ZServ and acting on the next;
+                        defaults to 0
+        :type stagger: float
+
+        """
+        self.id = operation_id
+        self.action = action
+        self.names = list(names)
+        self.concurrency = max(1, concurrency)
+        self.stagger = max(0, stagger)
+        self.lock = Lock()
+        self.servers = dict()
+        for name in self.names:
+            self.servers[name] = {'state': 'pending', 'start_time': None,
+                                  'end_time': None, 'seconds': None,
+                                  'error': None}
+        self.next_start_time = None
+        self.start_time = None
+        self.end_time = None
+
+    def _wait_for_turn(self):
+        """Waits until it's time to act on the next ZServ."""
+        with self.lock:
+            now = time.time()
+            start_time = max(now, self.next_start_time or now)
+            self.next_start_time = start_time + self.stagger
+        if start_time > now:
+            time.sleep(start_time - now)
+
+    def _perform(self, func, name):
+        self._wait_for_turn()
+        d = self.servers[name]
+        with self.lock:
+            d['state'] = 'running'
+            d['start_time'] = time.time()
+        zdslog.debug("%s %s: %s" % (self.action.capitalize(), self.id, name))
+        error = None
+        try:
+            func(name)
+        except Exception, e:
+            error = "%s: %s" % (e.__class__.__name__, e)
+            zdslog.error("Error during %s of %s: [%s]" % (self.action, name,
+                                                         error))
+        with self.lock:
+            d['end_time'] = time.time()
+            d['seconds'] = d['end_time'] - d['start_time']
+            if error:
+                d['state'] = 'failed'
+                d['error'] = error
+            else:
+                d['state'] = 'done'
+
+    def run(self, func):
+        """Runs this operation, returning when every ZServ is done.
+
+        :param func: the function to call with each ZServ's name
+        :type func: function
+
+        Errors are recorded in each ZServ's progress, they're not
+        raised.
+
+        """
+        self.start_time = time.time()
+        try:
+            parallel_map(lambda x: self._perform(func, x), self.names,
+                         max_threads=self.concurrency)
+        finally:
+            self.end_time = time.time()
+
+    def get_progress(self):
+        """Gets this operation's progress.
+
+        :rtype: dict
+        :returns: {'id': <int>, 'action': <string>,
+                   'concurrency': <int>, 'stagger': <float>,
+                   'start_time': <float>, 'end_time': <float>,
+                   'seconds': <float>, 'is_complete': <boolean>,
+                   'counts': {<string: state>: <int>},
+                   'servers': see the servers attribute}
+
+        """
+        with self.lock:
+            servers = dict([(x, dict(y)) for x, y in self.servers.items()])
+        counts = dict([(x, 0) for x in ('pending', 'running', 'done',
+                                        'failed')])
+        for d in servers.values():
+            counts[d['state']] += 1
+        end_time = self.end_time
+        if self.start_time:
+            seconds = (end_time or time.time()) - self.start_time
+        else:
+            seconds = 0.0
+        return {'id': self.id, 'action': self.action,
+                'concurrency': self.concurrency, 'stagger': self.stagger,
+                'start_time': self.start_time, 'end_time': end_time,
+                'seconds': seconds, 'is_complete': end_time is not None,
+                'counts': counts, 'servers': servers}
@@ -0,0 +1,335 @@
+from __future__ import with_statement
+
+import time
+
+from bisect import bisect_left
+from threading import Lock, local
+from collections import deque
+
+###
+# Histogram bucket upper bounds, in seconds.  These go from 10 microseconds
+# to 50 seconds in 1/2.5/5 steps, which is plenty of resolution for the
+# percentiles we report, and makes recording a time a single bisect.
+###
+BUCKETS = tuple([m * (10 ** e) for e in range(-5, 2) for m in (1, 2.5, 5)])
+
+###
+# Rates are calculated over the last RATE_WINDOW seconds.
+###
+RATE_WINDOW = 60
+
+__CURRENT = local()
+
+def set_current_metrics(metrics):
+    """Sets the metrics that the current thread's timings are added to.
+
+    :param metrics: the metrics, or None
+    :type metrics: :class:`~ZDStack.ZDSMetrics.Metrics`
+
+    This lets code that doesn't know which ZServ it's working for (the
+    database code, for example) still record timings for it.
+
+    """
+    __CURRENT.metrics = metrics
+
+def get_current_metrics():
+    """Gets the metrics that the current thread's timings are added to.
+
+    :rtype: :class:`~ZDStack.ZDSMetrics.Metrics` or None
+
+    """
+    return getattr(__CURRENT, 'metrics', None)
+
+class Histogram(object):
+
+    """Histogram tracks the distribution of a stage's timings.
+
+    .. attribute:: counts
+        A list of the number of timings in each bucket, the last bucket
+        holds timings larger than the largest bucket bound.
+
+    .. attribute:: count
+        The total number of timings.
+
+    .. attribute:: total
+        The sum of all timings, in seconds.
+
+    .. attribute:: max
+        The largest timing, in seconds.
+
+    """
+
+    def __init__(self):
+        """Initializes a Histogram."""
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Adds a timing.
+
+        :param seconds: the timing to add
+        :type seconds: float
+
+        """
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def get_percentile(self, percentile):
+        """Gets an estimate of a percentile.
+
+        :param percentile: the percentile to get, i.e. 95
+        :type percentile: int
+        :rtype: float
+        :returns: the upper bound of the bucket containing the
+                  percentile, in seconds, or 0.0 if there are no
+                  timings
+
+        """
+        if not self.count:
+            return 0.0
+        threshold = self.count * percentile / 100.0
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= threshold:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        """Returns a dict representation of this Histogram.
+
+        :rtype: dict
+        :returns: {'count': <int: number of timings>,
+                   'mean': <float: mean timing in seconds>,
+                   'max': <float: largest timing in seconds>,
+                   'p50': <float: 50th percentile in seconds>,
+                   'p95': <float: 95th percentile in seconds>,
+                   'p99': <float: 99th percentile in seconds>}
+
+        """
+        return {'count': self.count,
+                'mean': self.count and self.total / self.count or 0.0,
+                'max': self.max,
+                'p50': self.get_percentile(50),
+                'p95': self.get_percentile(95),
+                'p99': self.get_percentile(99)}
+
+class RateCounter(object):
+
+    """RateCounter counts things, and how fast they're happening.
+
+    .. attribute:: total
+        The total count.
+
+    .. attribute:: start_time
+        The time (from time.time()) this RateCounter was created.
+
+    .. attribute:: seconds
+        A deque of [second, count] lists covering the last RATE_WINDOW
+        seconds.
+
+    """
+
+    def __init__(self):
+        """Initializes a RateCounter."""
+        self.total = 0
+        self.start_time = time.time()
+        self.seconds = deque()
+
+    def add(self, n=1, now=None):
+        """Adds to the count.
+
+        :param n: optional, how much to add; defaults to 1
+        :type n: int
+        :param now: optional, the current time; defaults to
+                    time.time()
+        :type now: float
+
+        """
+        second = int(now or time.time())
+        self.total += n
+        if self.seconds and self.seconds[-1][0] == second:
+            self.seconds[-1][1] += n
+        else:
+            self.seconds.append([second, n])
+            while self.seconds[0][0] <= second - RATE_WINDOW:
+                self.seconds.popleft()
+
+    def get_rate(self, now=None):
+        """Gets the rate over the last RATE_WINDOW seconds.
+
+        :param now: optional, the current time; defaults to
+                    time.time()
+        :type now: float
+        :rtype: float
+        :returns: the average count per second
+
+        """
+        now = now or time.time()
+        second = int(now)
+        count = sum([c for s, c in self.seconds if s > second - RATE_WINDOW])
+        window = min(RATE_WINDOW, max(1, now - self.start_time))
+        return float(count) / window
+
+class Metrics(object):
+
+    """Metrics holds the timings and counters for a ZServ.
+
+    .. attribute:: name
+        A string representing the name of the ZServ.
+
+    .. attribute:: lock
+        A Lock that must be acquired before modifying histograms or
+        counters.
+
+    .. attribute:: histograms
+        A dict mapping stage names to
+        :class:`~ZDStack.ZDSMetrics.Histogram` instances.
+
+    .. attribute:: counters
+        A dict mapping counter names to
+        :class:`~ZDStack.ZDSMetrics.RateCounter` instances.
+
+    .. attribute:: start_time
+        The time (from time.time()) these Metrics were started or last
+        reset.
+
+    The stages timed are:
+
+      * fifo_read: reading a chunk of output from the zserv's FIFO
+      * output_queue_wait: time between reading and parsing output
+      * parse: parsing a line of output into an event
+      * event_queue_wait: time between parsing and handling an event
+      * handler: handling an event, including saving stats
+      * db_flush: committing a database transaction
+      * plugin_queue_wait: time between handling an event and running
+        its plugins
+      * plugin:<name>: running a plugin
+      * messenger_round_trip: sending a command to the zserv and
+        receiving its response
+
+    The counters are 'lines', 'events', 'events:<category>',
+    'restarts', 'ban_checks' and 'ban_kicks'.
+
+    """
+
+    def __init__(self, name):
+        """Initializes a Metrics instance.
+
+        :param name: the name of the ZServ
+        :type name: string
+
+        """
+        self.name = name
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """Clears all timings and counters."""
+        with self.lock:
+            self.histograms = dict()
+            self.counters = dict()
+            self.start_time = time.time()
+
+    def add_timing(self, stage, seconds):
+        """Adds a timing.
+
+        :param stage: the name of the stage that was timed
+        :type stage: string
+        :param seconds: how long the stage took
+        :type seconds: float
+
+        """
+        with self.lock:
+            try:
+                histogram = self.histograms[stage]
+            except KeyError:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.add(seconds)
+
+    def increment(self, counter, n=1):
+        """Increments a counter.
+
+        :param counter: the name of the counter to increment
+        :type counter: string
+        :param n: optional, how much to increment it by; defaults to 1
+        :type n: int
+
+        """
+        with self.lock:
+            try:
+                rate_counter = self.counters[counter]
+            except KeyError:
+                rate_counter = self.counters[counter] = RateCounter()
+            rate_counter.add(n)
+
+    def add_event(self, category):
+        """Counts an event.
+
+        :param category: the category of the event
+        :type category: string
+
+        """
+        self.increment('events')
+        self.increment('events:' + category)
+
+    def get_histograms(self):
+        """Gets a copy of the histogram data.
+
+        :rtype: dict
+        :returns: {<string: stage>: (<list: bucket counts>,
+                                     <int: count>,
+                                     <float: total seconds>)}
+
+        """
+        with self.lock:
+            return dict([
+                (x, (list(y.counts), y.count, y.total))
+                for x, y in self.histograms.items()
+            ])
+
+    def get_counter_totals(self):
+        """Gets the total of each counter.
+
+        :rtype: dict
+        :returns: {<string: counter>: <int: total>}
+
+        """
+        with self.lock:
+            return dict([(x, y.total) for x, y in self.counters.items()])
+
+    def to_dict(self):
+        """Returns a dict representation of these Metrics.
+
+        :rtype: dict
+        :returns: {'name': <string: name of the ZServ>,
+                   'uptime': <float: seconds since start/reset>,
+                   'stages': {<string: stage>: <dict: histogram>},
+                   'counters': {<string: counter>:
+                                    {'total': <int: total count>,
+                                     'per_second': <float: rate>}},
+                   'junk_ratio': <float: ratio of junk events to events>}
+
+        """
+        now = time.time()
+        with self.lock:
+            stages = dict([
+                (x, y.to_dict()) for x, y in self.histograms.items()
+            ])
+            counters = dict([
+                (x, {'total': y.total, 'per_second': y.get_rate(now)})
+                for x, y in self.counters.items()
+            ])
+        events = counters.get('events', {}).get('total', 0)
+        junk = counters.get('events:junk', {}).get('total', 0)
+        return {'name': self.name,
+                'uptime': now - self.start_time,
+                'stages': stages,
+                'counters': counters,
+                'junk_ratio': events and float(junk) / events or 0.0}
+
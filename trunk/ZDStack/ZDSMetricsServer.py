@@ -0,0 +1,300 @@
+import time
+
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from ZDStack import get_zdslog
+from ZDStack.ZDSMetrics import BUCKETS
+
+zdslog = get_zdslog()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(s):
+    """Escapes a label value.
+
+    :param s: the label value to escape
+    :type s: string
+    :rtype: string
+
+    """
+    s = str(s).replace('\\', '\\\\').replace('"', '\\"')
+    return s.replace('\n', '\\n')
+
+def _format_labels(labels):
+    """Formats labels.
+
+    :param labels: label names and values
+    :type labels: a list of 2-tuples ('name', 'value')
+    :rtype: string
+
+    """
+    if not labels:
+        return ''
+    labels = ['%s="%s"' % (x, _escape(y)) for x, y in labels]
+    return '{%s}' % (','.join(labels))
+
+class MetricsWriter(object):
+
+    """MetricsWriter builds a page in the Prometheus text format.
+
+    .. attribute:: lines
+        A list of the lines written so far.
+
+    """
+
+    def __init__(self):
+        """Initializes a MetricsWriter."""
+        self.lines = list()
+        self._declared = set()
+
+    def declare(self, name, metric_type, help_text):
+        """Writes the HELP and TYPE lines for a metric, once.
+
+        :param name: the name of the metric
+        :type name: string
+        :param metric_type: 'counter', 'gauge' or 'histogram'
+        :type metric_type: string
+        :param help_text: a description of the metric
+        :type help_text: string
+
+        """
+        if name in self._declared:
+            return
+        self._declared.add(name)
+        self.lines.append('# HELP %s %s' % (name, help_text))
+        self.lines.append('# TYPE %s %s' % (name, metric_type))
+
+    def sample(self, name, value, labels=None):
+        """Writes a sample.
+
+        :param name: the name of the metric
+        :type name: string
+        :param value: the sample's value
+        :type value: int or float
+        :param labels: optional, the sample's labels
+        :type labels: a list of 2-tuples ('name', 'value')
+
+        """
+        if isinstance(value, float):
+            value = repr(value)
+        self.lines.append('%s%s %s' % (name, _format_labels(labels), value))
+
+    def histogram(self, name, counts, count, total, labels):
+        """Writes a histogram's samples.
+
+        :param name: the name of the metric
+        :type name: string
+        :param counts: the number of observations in each of
+                       :data:`~ZDStack.ZDSMetrics.BUCKETS`, plus one
+                       more for observations larger than the largest
+                       bucket
+        :type counts: list of ints
+        :param count: the total number of observations
+        :type count: int
+        :param total: the sum of all observations
+        :type total: float
+        :param labels: the histogram's labels
+        :type labels: a list of 2-tuples ('name', 'value')
+
+        """
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            self.sample(name + '_bucket', cumulative,
+                        labels + [('le', repr(float(bound)))])
+        self.sample(name + '_bucket', count, labels + [('le', '+Inf')])
+        self.sample(name + '_sum', float(total), labels)
+        self.sample(name + '_count', count, labels)
+
+    def render(self):
+        """Returns the page.
+
+        :rtype: string
+
+        """
+        return '\n'.join(self.lines) + '\n'
+
+def _get_zserv_samples(stack, zserv, now):
+    """Gets a ZServ's samples.
+
+    :param stack: the Stack the ZServ belongs to
+    :type stack: :class:`~ZDStack.Stack.Stack`
+    :param zserv: the ZServ whose samples to get
+    :type zserv: :class:`~ZDStack.ZServ.ZServ`
+    :param now: the current time
+    :type now: float
+    :rtype: dict
+    :returns: {<string: metric name>: [(<value>, <list: extra labels>)]},
+              plus 'zdstack_zserv_stage_seconds', which maps to the
+              output of :meth:`~ZDStack.ZDSMetrics.Metrics.get_histograms`
+
+    """
+    counters = zserv.metrics.get_counter_totals()
+    status = zserv.status
+    is_running = status['is_running']
+    start_time = zserv.start_time
+    if is_running and start_time:
+        uptime = now - time.mktime(start_time.timetuple())
+    else:
+        uptime = 0.0
+    plugin_executor = stack.plugin_executors.get(zserv.name)
+    if plugin_executor:
+        plugin_queue_depth = plugin_executor.queue.qsize()
+    else:
+        plugin_queue_depth = 0
+    ban_checks = counters.get('ban_checks', 0)
+    events = [(total, [('category', counter[len('events:'):])])
+              for counter, total in sorted(counters.items())
+              if counter.startswith('events:')]
+    return {
+        'zdstack_zserv_up': [(int(is_running), [])],
+        'zdstack_zserv_uptime_seconds': [(uptime, [])],
+        'zdstack_zserv_restarts_total': [(counters.get('restarts', 0), [])],
+        'zdstack_zserv_recent_restarts': [(len(zserv.restarts), [])],
+        'zdstack_zserv_players': [(status['players'], [])],
+        'zdstack_zserv_plugin_queue_depth': [(plugin_queue_depth, [])],
+        'zdstack_zserv_lines_total': [(counters.get('lines', 0), [])],
+        'zdstack_zserv_events_total': events,
+        'zdstack_zserv_ban_checks_total': [(ban_checks, [])],
+        'zdstack_zserv_ban_kicks_total': [(counters.get('ban_kicks', 0), [])],
+        'zdstack_zserv_stage_seconds': zserv.metrics.get_histograms()
+    }
+
+###
+# (name, type, help) for each per-ZServ metric, in the order they're rendered.
+###
+ZSERV_METRICS = (
+    ('zdstack_zserv_up', 'gauge', 'Whether or not the zserv is running.'),
+    ('zdstack_zserv_uptime_seconds', 'gauge',
+     'Seconds since the zserv was started.'),
+    ('zdstack_zserv_restarts_total', 'counter',
+     'Number of times the zserv has been (re)started.'),
+    ('zdstack_zserv_recent_restarts', 'gauge',
+     'Number of recent zserv restarts (at most 2).'),
+    ('zdstack_zserv_players', 'gauge', 'Number of connected players.'),
+    ('zdstack_zserv_plugin_queue_depth', 'gauge',
+     'Number of plugin tasks waiting to be run.'),
+    ('zdstack_zserv_lines_total', 'counter',
+     'Number of lines of zserv output read.'),
+    ('zdstack_zserv_events_total', 'counter',
+     'Number of events parsed, by category.'),
+    ('zdstack_zserv_ban_checks_total', 'counter',
+     'Number of times a player was checked for bans.'),
+    ('zdstack_zserv_ban_kicks_total', 'counter',
+     'Number of banned players kicked.'),
+    ('zdstack_zserv_stage_seconds', 'histogram',
+     'Time spent in each stage of output and event processing.')
+)
+
+def render_metrics(stack):
+    """Renders a Stack's metrics in the Prometheus text format.
+
+    :param stack: the Stack whose metrics are to be rendered
+    :type stack: :class:`~ZDStack.Stack.Stack`
+    :rtype: string
+
+    This never acquires a ZServ's event lock (or any other lock held
+    while events are handled), so scrapes can't be held up by - or
+    hold up - event handling.
+
+    """
+    w = MetricsWriter()
+    now = time.time()
+    start_time = time.mktime(stack.start_time.timetuple())
+    w.declare('zdstack_uptime_seconds', 'gauge',
+              'Seconds since ZDStack started.')
+    w.sample('zdstack_uptime_seconds', now - start_time)
+    w.declare('zdstack_queue_depth', 'gauge',
+              'Number of tasks waiting in a ZDStack queue.')
+    w.sample('zdstack_queue_depth', stack.output_queue.qsize(),
+             [('queue', 'output')])
+    w.sample('zdstack_queue_depth', stack.event_queue.qsize(),
+             [('queue', 'event')])
+    ###
+    # All of a metric's samples have to be listed together, so get every
+    # ZServ's samples first, then write them out metric by metric.
+    ###
+    zservs = sorted(stack.zservs.values(), key=lambda z: z.name)
+    all_samples = [(z.name, _get_zserv_samples(stack, z, now)) for z in zservs]
+    for name, metric_type, help_text in ZSERV_METRICS:
+        w.declare(name, metric_type, help_text)
+        for zserv_name, samples in all_samples:
+            labels = [('zserv', zserv_name)]
+            if metric_type == 'histogram':
+                for stage, (counts, count, total) in \
+                                            sorted(samples[name].items()):
+                    w.histogram(name, counts, count, total,
+                                labels + [('stage', stage)])
+            else:
+                for value, extra_labels in samples[name]:
+                    w.sample(name, value, labels + extra_labels)
+    return w.render()
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+    """Serves a Stack's metrics.
+
+    Only GET and HEAD requests for '/' and '/metrics' are supported.
+
+    """
+
+    ###
+    # Don't let a slow client tie up the metrics thread.
+    ###
+    timeout = 5
+
+    def send_head(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return None
+        try:
+            content = render_metrics(self.server.stack)
+        except Exception, e:
+            zdslog.error("Error rendering metrics: [%s]" % (e))
+            self.send_error(500, str(e))
+            return None
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        return content
+
+    def do_HEAD(self):
+        self.send_head()
+
+    def do_GET(self):
+        content = self.send_head()
+        if content:
+            self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        zdslog.debug("Metrics request: %s" % (format % args))
+
+class MetricsServer(HTTPServer):
+
+    """MetricsServer serves a Stack's metrics over HTTP.
+
+    .. attribute:: stack
+        The :class:`~ZDStack.Stack.Stack` whose metrics are served.
+
+    """
+
+    allow_reuse_address = True
+
+    def __init__(self, addr, stack):
+        """Initializes a MetricsServer.
+
+        :param addr: the address and port to listen on
+        :type addr: tuple ('address', port)
+        :param stack: the Stack whose metrics are to be served
+        :type stack: :class:`~ZDStack.Stack.Stack`
+
+        """
+        HTTPServer.__init__(self, addr, MetricsRequestHandler)
+        self.stack = stack
+        ###
+        # handle_request() returns after this many seconds if there are no
+        # requests, so the metrics thread can check if it should quit.
+        ###
+        self.timeout = 1
+
@@ -0,0 +1,132 @@
+import time
+import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.engine.reflection import Inspector
+
+from ZDStack import get_zdslog
+from ZDStack.ZDSTables import rounds_table, schema_versions_table, \
+                              frags_round_id_timestamp_index, \
+                              frags_fragger_id_weapon_name_index, \
+                              flag_touches_player_id_round_id_index, \
+                              rounds_start_time_index
+
+zdslog = get_zdslog()
+
+def _create_indexes(*indexes):
+    """Returns a migration that creates indexes.
+
+    :param indexes: the indexes to create
+    :type indexes: SQLAlchemy Index instances
+    :rtype: function
+
+    Indexes that already exist are skipped, so the migration can be
+    re-run if it fails partway through on a database that can't roll
+    back DDL (MySQL, for example).
+
+    """
+    def upgrade(connection):
+        inspector = Inspector.from_engine(connection)
+        existing = dict()
+        for index in indexes:
+            table_name = index.table.name
+            if table_name not in existing:
+                existing[table_name] = set([x['name'] for x in
+                                            inspector.get_indexes(table_name)])
+            if index.name in existing[table_name]:
+                zdslog.info("Index %s already exists" % (index.name))
+                continue
+            zdslog.info("Creating index %s" % (index.name))
+            index.create(bind=connection)
+    return upgrade
+
+###
+# Migrations are (version, description, upgrade function) tuples, in order.
+# Never change or remove a migration that's been released, add a new one
+# instead; its version must be 1 greater than the last.  Upgrade functions
+# are passed a Connection, and run inside a transaction.
+###
+MIGRATIONS = (
+    (1, 'Add composite indexes to frags, flag_touches and rounds',
+     _create_indexes(frags_round_id_timestamp_index,
+                     frags_fragger_id_weapon_name_index,
+                     flag_touches_player_id_round_id_index,
+                     rounds_start_time_index)),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def is_new_database(engine):
+    """Checks whether or not the database has any ZDStack tables yet.
+
+    :param engine: the database engine
+    :type engine: SQLAlchemy Engine
+    :rtype: boolean
+
+    This must be checked before the tables are created.
+
+    """
+    return not engine.has_table(rounds_table.name)
+
+def get_schema_version(connection):
+    """Gets the version of the database's schema.
+
+    :param connection: a database connection
+    :type connection: SQLAlchemy Connection
+    :rtype: int
+    :returns: the version of the last migration applied, 0 if no
+              migrations have been applied
+
+    """
+    t = schema_versions_table
+    return connection.execute(select([func.max(t.c.version)])).scalar() or 0
+
+def migrate_database(engine, new_database=False):
+    """Applies pending migrations.
+
+    :param engine: the database engine
+    :type engine: SQLAlchemy Engine
+    :param new_database: optional, whether or not the database's tables
+                         were just created, in which case they already
+                         match the latest schema and migrations are only
+                         recorded as applied; defaults to False
+    :type new_database: boolean
+    :rtype: list
+    :returns: the versions of the migrations applied
+
+    Each migration is applied, and recorded in the schema_versions
+    table, in its own transaction.  If a migration fails, the error is
+    raised and later migrations aren't applied.
+
+    """
+    applied = list()
+    connection = engine.connect()
+    try:
+        current_version = get_schema_version(connection)
+        if current_version > LATEST_VERSION:
+            es = "Database schema version %d is newer than this ZDStack's (%d)"
+            raise Exception(es % (current_version, LATEST_VERSION))
+        for version, description, upgrade in MIGRATIONS:
+            if version <= current_version:
+                continue
+            trans = connection.begin()
+            try:
+                if not new_database:
+                    zdslog.info("Applying migration %d: %s" % (version,
+                                                               description))
+                    start = time.time()
+                    upgrade(connection)
+                    zdslog.info("Applied migration %d in %.2f seconds" % (
+                        version, time.time() - start
+                    ))
+                connection.execute(schema_versions_table.insert(),
+                                   version=version, description=description,
+                                   applied_time=datetime.datetime.now())
+                trans.commit()
+            except:
+                trans.rollback()
+                raise
+            applied.append(version)
+    finally:
+        connection.close()
+    return applied
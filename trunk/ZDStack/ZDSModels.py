@@ -3,18 +3,10 @@ from __future__ import with_statement
 from sqlalchemy.orm.exc import NoResultFound
 
 from ZDStack.Utils import parse_player_name
-from ZDStack import get_engine, get_metadata
 from ZDStack.ZDSTables import *
 
 # zdslog = get_zdslog()
 
-###
-# Get the DB engine.
-###
-# zdslog.debug("Initializing Database")
-__engine = get_engine()
-__metadata = get_metadata()
-
 class Alias(object):
 
     """Alias represents a player's alias.
@@ -848,5 +840,117 @@ class RCONAction(object):
     def __str__(self):
         return '<RCON Action %s - %s>' % (self.action, self.alias)
 
+class RoundAliasStats(object):
+
+    """Summarizes an alias' stats in a round.
+
+    .. attribute:: id
+        The database ID of this RoundAliasStats
+
+    .. attribute:: round_id
+        The database ID of this RoundAliasStats' Round
+
+    .. attribute:: alias_id
+        The database ID of this RoundAliasStats' Alias
+
+    .. attribute:: frags
+        An int representing the number of players the alias fragged
+
+    .. attribute:: deaths
+        An int representing the number of times the alias died,
+        including suicides
+
+    .. attribute:: suicides
+        An int representing the number of times the alias killed
+        itself
+
+    .. attribute:: flag_touches
+        An int representing the number of times the alias touched a
+        flag
+
+    .. attribute:: flag_picks
+        An int representing the number of flags the alias picked up
+
+    .. attribute:: flag_captures
+        An int representing the number of flags the alias captured
+
+    .. attribute:: flag_returns
+        An int representing the number of flags the alias returned
+
+    .. attribute:: flag_hold_time
+        A float representing the number of seconds the alias held a
+        flag
+
+    """
+
+    round_id = None
+    alias_id = None
+    frags = 0
+    deaths = 0
+    suicides = 0
+    flag_touches = 0
+    flag_picks = 0
+    flag_captures = 0
+    flag_returns = 0
+    flag_hold_time = 0.0
+
+    def __init__(self, **kwargs):
+        self.round_id = kwargs.get('round_id', None)
+        self.alias_id = kwargs.get('alias_id', None)
+        self.frags = kwargs.get('frags', 0)
+        self.deaths = kwargs.get('deaths', 0)
+        self.suicides = kwargs.get('suicides', 0)
+        self.flag_touches = kwargs.get('flag_touches', 0)
+        self.flag_picks = kwargs.get('flag_picks', 0)
+        self.flag_captures = kwargs.get('flag_captures', 0)
+        self.flag_returns = kwargs.get('flag_returns', 0)
+        self.flag_hold_time = kwargs.get('flag_hold_time', 0.0)
+
+    def __str__(self):
+        return '<RoundAliasStats %s - %s>' % (self.round_id, self.alias_id)
+
+class RoundAliasWeaponStats(object):
+
+    """Summarizes an alias' frags and deaths by a weapon in a round.
+
+    .. attribute:: id
+        The database ID of this RoundAliasWeaponStats
+
+    .. attribute:: round_id
+        The database ID of this RoundAliasWeaponStats' Round
+
+    .. attribute:: alias_id
+        The database ID of this RoundAliasWeaponStats' Alias
+
+    .. attribute:: weapon_name
+        The name of this RoundAliasWeaponStats' Weapon
+
+    .. attribute:: frags
+        An int representing the number of players the alias fragged
+        with the weapon
+
+    .. attribute:: deaths
+        An int representing the number of times the alias died by the
+        weapon
+
+    """
+
+    round_id = None
+    alias_id = None
+    weapon_name = None
+    frags = 0
+    deaths = 0
+
+    def __init__(self, **kwargs):
+        self.round_id = kwargs.get('round_id', None)
+        self.alias_id = kwargs.get('alias_id', None)
+        self.weapon_name = kwargs.get('weapon_name', None)
+        self.frags = kwargs.get('frags', 0)
+        self.deaths = kwargs.get('deaths', 0)
+
+    def __str__(self):
+        s = '<RoundAliasWeaponStats %s - %s - %s>'
+        return s % (self.round_id, self.alias_id, self.weapon_name)
+
 class RoundsAndAliases(object): pass
 
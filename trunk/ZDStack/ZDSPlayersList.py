@@ -13,6 +13,66 @@ from ZDStack.ZDSDatabase import global_session, requires_session
 
 zdslog = get_zdslog()
 
+class NameTrie(object):
+
+    """NameTrie finds which player sent a message in a single scan.
+
+    .. attribute:: root
+        A dict mapping characters to child nodes, which are dicts
+        themselves.  A node's None key holds the name that ends there.
+
+    Messages look like '<Ladna> hey', but names can contain '> ' too,
+    so a message's sender can't be found just by splitting it.  Walking
+    the message through a trie of the players' names finds every name
+    the message could start with in one pass, instead of testing a list
+    of candidates against the players list.
+
+    """
+
+    def __init__(self, names=None):
+        """Initializes a NameTrie.
+
+        :param names: optional, the names to add
+        :type names: list of strings
+
+        """
+        self.root = dict()
+        for name in names or []:
+            self.add(name)
+
+    def add(self, name):
+        """Adds a name.
+
+        :param name: the name to add
+        :type name: string
+
+        """
+        node = self.root
+        for c in name:
+            node = node.setdefault(c, dict())
+        node[None] = name
+
+    def get_sender(self, message):
+        """Gets the name of a message's sender.
+
+        :param message: the message, without its timestamp
+        :type message: string
+        :rtype: string
+        :returns: the shortest name that the message could have been
+                  sent by, or None
+
+        """
+        if not message.startswith('<'):
+            return None
+        node = self.root
+        for i in xrange(1, len(message)):
+            node = node.get(message[i])
+            if node is None:
+                return None
+            if None in node and message.startswith('> ', i + 1):
+                return node[None]
+        return None
+
 class PlayersList(object):
 
     """PlayersList is a threadsafe list of players.
@@ -24,6 +84,10 @@ class PlayersList(object):
         A Lock that must be acquired before the internal list of
         players can be modified
 
+    .. attribute:: name_trie
+        A :class:`~ZDStack.ZDSPlayersList.NameTrie` of the names of
+        connected players, rebuilt whenever the list is synced
+
     It is possible that many threads will try and modify the players
     list at the same time, with unpredictible results.  PlayersList
     synchronizes access to its internal list of players so that any
@@ -42,12 +106,14 @@ class PlayersList(object):
         self.zserv = zserv
         self.lock = Lock()
         self.__players = deque()
+        self.name_trie = NameTrie()
 
     @requires_instance_lock()
     def clear(self):
         """Clears the list of players."""
         zdslog.debug('')
         self.__players.clear()
+        self.name_trie = NameTrie()
 
     def __iter__(self):
         return self.__players.__iter__()
@@ -292,6 +358,9 @@ class PlayersList(object):
                             t = (player.name, player.color, team_color)
                             zdslog.debug(ds % t)
                         player.color = team_color
+        self.name_trie = NameTrie([x.name for x in self if not x.disconnected])
+        for player in self:
+            self.zserv.plugin_state.update_player(player)
         if check_bans:
             self.check_bans(session=session, acquire_lock=False)
         else:
@@ -320,6 +389,7 @@ class PlayersList(object):
                     raise Exception(es % (p))
                 else:
                     zdslog.debug('%s is not disconnected' % (p))
+                    self.zserv.metrics.increment('ban_checks')
                     reason = self.zserv.access_list.search_bans(p.ip)
                     if reason:
                         ds = '%s is banned for the following reason: %s'
@@ -329,6 +399,7 @@ class PlayersList(object):
                         else:
                             reason = 'Banned'
                         zdslog.debug('Kicking %s' % (p))
+                        self.zserv.metrics.increment('ban_kicks')
                         self.zserv.zkick(p.number, reason)
                         self.sync(session=session, acquire_lock=False,
                                   check_bans=False)
@@ -371,3 +442,24 @@ class PlayersList(object):
         zdslog.debug('Names: [%s]' % (names))
         zdslog.debug('PPN: [%s]' % (possible_player_names))
 
+    @requires_session
+    @requires_instance_lock()
+    def get_message_sender(self, message, session=None):
+        """Returns the player who sent a message.
+
+        :param message: the message, without its timestamp
+        :type message: string
+        :param session: an SQLAlchemy Session
+        :type session: an SQLAlchemy Session
+        :rtype: Player
+        :returns: the connected player who sent the message, or None
+
+        Unlike get_first_matching_player, this doesn't sync if no
+        player is found.
+
+        """
+        name = self.name_trie.get_sender(message)
+        if name is None:
+            return None
+        return self.get(session=session, name=name, sync=False,
+                        acquire_lock=False)
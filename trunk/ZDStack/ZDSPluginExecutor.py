@@ -0,0 +1,240 @@
+from __future__ import with_statement
+
+import time
+import Queue
+import traceback
+
+from threading import Event, Lock, Thread
+
+from ZDStack import ZDSThreadPool
+from ZDStack import MAX_TIMEOUT, get_zdslog
+from ZDStack.ZDSTask import LightTask
+from ZDStack.ZDSMetrics import set_current_metrics
+
+zdslog = get_zdslog()
+
+class PluginRunner(object):
+
+    """PluginRunner calls plugins in its own thread.
+
+    .. attribute:: executor
+        The :class:`~ZDStack.ZDSPluginExecutor.PluginExecutor` that
+        owns this PluginRunner.
+
+    .. attribute:: abandoned
+        A boolean that, when set to True, causes this PluginRunner's
+        thread to quit after its current call.
+
+    .. attribute:: ready
+        An Event that is set when a call is waiting to be made.
+
+    .. attribute:: done
+        An Event that is set when a call has been made.
+
+    Only one call is made at a time.  The same Events are reused for
+    every call.
+
+    """
+
+    def __init__(self, executor):
+        """Initializes a PluginRunner.
+
+        :param executor: the executor that owns this PluginRunner
+        :type executor: :class:`~ZDStack.ZDSPluginExecutor.PluginExecutor`
+
+        """
+        self.executor = executor
+        self.abandoned = False
+        self.ready = Event()
+        self.done = Event()
+        self._call = None
+        ###
+        # This thread isn't added to the thread pool, because an abandoned
+        # runner may be stuck in a plugin forever, and we don't want that to
+        # hang shutdown.
+        ###
+        self._thread = Thread(target=self._run,
+                              name='%s Plugin Runner' % (executor.name))
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def is_alive(self):
+        """Returns True if this PluginRunner's thread is running."""
+        return self._thread.isAlive()
+
+    def call(self, plugin, event, zserv, timeout=None):
+        """Calls a plugin, waiting for it to finish.
+
+        :param plugin: the plugin to call
+        :type plugin: function
+        :param event: the event to pass to the plugin
+        :type event: :class:`~ZDStack.LogEvent.LogEvent`
+        :param zserv: the ZServ to pass to the plugin
+        :type zserv: :class:`~ZDStack.ZServ.ZServ`
+        :param timeout: optional, the maximum number of seconds to wait
+                        for the plugin to finish; defaults to waiting
+                        forever
+        :type timeout: float
+        :rtype: boolean
+        :returns: whether or not the plugin finished in time
+
+        """
+        self.done.clear()
+        self._call = (plugin, event, zserv)
+        self.ready.set()
+        self.done.wait(timeout)
+        return self.done.isSet()
+
+    def _run(self):
+        while not self.abandoned:
+            self.ready.wait(MAX_TIMEOUT)
+            if not self.ready.isSet():
+                if not self.executor.keep_running:
+                    break
+                continue
+            self.ready.clear()
+            plugin, event, zserv = self._call
+            self._call = None
+            set_current_metrics(zserv.metrics)
+            try:
+                plugin(event, zserv)
+            except Exception, e:
+                es = "Exception in plugin %s: [%s]\n%s"
+                zdslog.error(es % (plugin.__name__, e, traceback.format_exc()))
+            set_current_metrics(None)
+            with self.executor.lock:
+                self.done.set()
+                if self.abandoned:
+                    self.executor.stuck_plugins.discard(plugin)
+                    ds = "Plugin %s finished after timing out"
+                    zdslog.debug(ds % (plugin.__name__))
+
+class PluginExecutor(object):
+
+    """PluginExecutor runs a ZServ's plugins outside of event handling.
+
+    .. attribute:: name
+        A string representing the name of the ZServ whose plugins this
+        PluginExecutor runs.
+
+    .. attribute:: queue
+        A Queue of plugin Tasks waiting to be performed.
+
+    .. attribute:: keep_running
+        A boolean that, when set to False, stops the plugin thread once
+        all queued Tasks have been performed.
+
+    .. attribute:: lock
+        A Lock that must be acquired before modifying stuck_plugins.
+
+    .. attribute:: stuck_plugins
+        A set of plugins that timed out and haven't finished yet.
+
+    Plugins are run in the order events were handled, one at a time, by
+    a single thread per ZServ.  So a plugin can block (sending commands
+    to the zserv, for example) without holding up the recording of
+    stats.
+
+    Each call is given a time budget: the 'timeout' attribute of the
+    plugin if it has one, otherwise the ZServ's 'plugin_timeout'.  A
+    plugin that goes over its budget is left to finish in the
+    background, and it's skipped until it does, so no plugin is ever
+    running twice at the same time.
+
+    """
+
+    def __init__(self, name):
+        """Initializes a PluginExecutor.
+
+        :param name: the name of the ZServ whose plugins this
+                     PluginExecutor runs
+        :type name: string
+
+        """
+        self.name = name
+        self.queue = Queue.Queue()
+        self.keep_running = False
+        self.lock = Lock()
+        self.stuck_plugins = set()
+        self._runner = None
+
+    def start(self):
+        """Starts this PluginExecutor."""
+        self.keep_running = True
+        ZDSThreadPool.process_queue(
+            self.queue,
+            '%s Plugin Queue' % (self.name),
+            lambda: self.keep_running == True
+        )
+
+    def stop(self):
+        """Stops this PluginExecutor, waiting for queued plugins to run."""
+        self.keep_running = False
+        self.queue.join()
+
+    def submit(self, event, zserv, plugins):
+        """Queues plugins to be run.
+
+        :param event: the event to pass to the plugins
+        :type event: :class:`~ZDStack.LogEvent.LogEvent`
+        :param zserv: the ZServ to pass to the plugins
+        :type zserv: :class:`~ZDStack.ZServ.ZServ`
+        :param plugins: the plugins to run
+        :type plugins: a sequence of functions
+
+        """
+        self.queue.put_nowait(LightTask.get(
+            self.run_plugins,
+            args=(event, zserv, plugins, time.time()),
+            name='Plugin'
+        ))
+
+    def _get_runner(self):
+        if self._runner is None or not self._runner.is_alive():
+            self._runner = PluginRunner(self)
+        return self._runner
+
+    def run_plugins(self, event, zserv, plugins, queued_time=None):
+        """Runs plugins.
+
+        :param event: the event to pass to the plugins
+        :type event: :class:`~ZDStack.LogEvent.LogEvent`
+        :param zserv: the ZServ to pass to the plugins
+        :type zserv: :class:`~ZDStack.ZServ.ZServ`
+        :param plugins: the plugins to run
+        :type plugins: a sequence of functions
+        :param queued_time: optional, the time (from time.time()) when
+                            the plugins were queued
+        :type queued_time: float
+
+        """
+        if queued_time:
+            zserv.metrics.add_timing('plugin_queue_wait',
+                                     time.time() - queued_time)
+        for plugin in plugins:
+            if plugin in self.stuck_plugins:
+                es = "Plugin %s is still running, skipping %s"
+                zdslog.error(es % (plugin.__name__, event))
+                continue
+            ds = "Processing %s with %s"
+            zdslog.debug(ds % (event, plugin.__name__))
+            timeout = getattr(plugin, 'timeout', zserv.plugin_timeout)
+            runner = self._get_runner()
+            plugin_start = time.time()
+            finished = runner.call(plugin, event, zserv, timeout)
+            zserv.metrics.add_timing('plugin:' + plugin.__name__,
+                                     time.time() - plugin_start)
+            if finished:
+                continue
+            with self.lock:
+                if runner.done.isSet():
+                    ###
+                    # The plugin finished right after we stopped waiting.
+                    ###
+                    continue
+                es = "Plugin %s exceeded its time budget (%s seconds)"
+                zdslog.error(es % (plugin.__name__, timeout))
+                runner.abandoned = True
+                self.stuck_plugins.add(plugin)
+                self._runner = None
+
@@ -0,0 +1,416 @@
+from __future__ import with_statement
+
+import time
+
+from threading import Lock
+from collections import deque
+
+from ZDStack import get_zdslog
+from ZDStack.Utils import requires_instance_lock
+
+zdslog = get_zdslog()
+
+def get_player_key(player):
+    """Gets the key a player's state is stored under.
+
+    :param player: the player
+    :type player: :class:`~ZDStack.ZDSModels.Alias`
+    :rtype: tuple
+    :returns: (<string: name>, <string: IP address>)
+
+    State is keyed by what identifies an Alias, not by the instance
+    itself, so it doesn't depend on which instance a plugin is given.
+
+    """
+    return (player.name, player.ip_address)
+
+class Counter(object):
+
+    """Counter is a plugin's count.
+
+    .. attribute:: value
+        An int, the current count.
+
+    .. attribute:: lock
+        A Lock that must be acquired before modifying value.
+
+    """
+
+    def __init__(self):
+        """Initializes a Counter."""
+        self.value = 0
+        self.lock = Lock()
+
+    @requires_instance_lock()
+    def add(self, count=1):
+        """Adds to the count.
+
+        :param count: optional, how much to add; defaults to 1
+        :type count: int
+        :rtype: int
+        :returns: the new count
+
+        """
+        self.value += count
+        return self.value
+
+    @requires_instance_lock()
+    def reset(self):
+        """Resets the count to 0."""
+        self.value = 0
+
+    def clear(self):
+        """Resets the count to 0."""
+        self.reset()
+
+class PlayerMap(object):
+
+    """PlayerMap holds a plugin's value for each player.
+
+    .. attribute:: default
+        The value of players that haven't been given one.
+
+    .. attribute:: lock
+        A Lock that must be acquired before modifying the values.
+
+    """
+
+    def __init__(self, default=None):
+        """Initializes a PlayerMap.
+
+        :param default: optional, the value of players that haven't
+                        been given one; defaults to None
+        :type default: any immutable value
+
+        """
+        self.default = default
+        self.lock = Lock()
+        self.__values = dict()
+
+    def __len__(self):
+        return len(self.__values)
+
+    def __contains__(self, player):
+        return get_player_key(player) in self.__values
+
+    def get(self, player):
+        """Gets a player's value.
+
+        :param player: the player
+        :type player: :class:`~ZDStack.ZDSModels.Alias`
+        :returns: the player's value, or this PlayerMap's default
+
+        """
+        return self.__values.get(get_player_key(player), self.default)
+
+    @requires_instance_lock()
+    def set(self, player, value):
+        """Sets a player's value.
+
+        :param player: the player
+        :type player: :class:`~ZDStack.ZDSModels.Alias`
+        :param value: the player's new value
+
+        """
+        self.__values[get_player_key(player)] = value
+
+    @requires_instance_lock()
+    def add(self, player, count=1):
+        """Adds to a player's value.
+
+        :param player: the player
+        :type player: :class:`~ZDStack.ZDSModels.Alias`
+        :param count: optional, how much to add; defaults to 1
+        :type count: int
+        :returns: the player's new value
+
+        """
+        key = get_player_key(player)
+        value = self.__values.get(key, self.default or 0) + count
+        self.__values[key] = value
+        return value
+
+    @requires_instance_lock()
+    def pop(self, player):
+        """Removes a player's value.
+
+        :param player: the player
+        :type player: :class:`~ZDStack.ZDSModels.Alias`
+        :returns: the player's value, or this PlayerMap's default
+
+        """
+        return self.__values.pop(get_player_key(player), self.default)
+
+    @requires_instance_lock()
+    def items(self):
+        """Gets every player's value.
+
+        :rtype: list
+        :returns: a list of ((<string: name>, <string: IP address>),
+                  <value>) tuples
+
+        """
+        return self.__values.items()
+
+    @requires_instance_lock()
+    def clear(self):
+        """Removes every player's value."""
+        self.__values.clear()
+
+class SlidingWindow(object):
+
+    """SlidingWindow counts each player's recent events.
+
+    .. attribute:: seconds
+        How many seconds an event is counted for.
+
+    .. attribute:: lock
+        A Lock that must be acquired before modifying the events.
+
+    Only the times of events in the window are kept, and the oldest are
+    dropped as they're counted, so counting is proportional to the
+    number of events that have left the window, not to the number of
+    events.
+
+    """
+
+    def __init__(self, seconds):
+        """Initializes a SlidingWindow.
+
+        :param seconds: how many seconds an event is counted for
+        :type seconds: int or float
+
+        """
+        self.seconds = seconds
+        self.lock = Lock()
+        self.__times = dict()
+
+    def _count(self, key, now):
+        times = self.__times.get(key)
+        if not times:
+            return 0
+        oldest = now - self.seconds
+        while times and times[0] <= oldest:
+            times.popleft()
+        if not times:
+            del self.__times[key]
+            return 0
+        return len(times)
+
+    @requires_instance_lock()
+    def add(self, player, now=None):
+        """Counts an event.
+
+        :param player: the player the event belongs to
+        :type player: :class:`~ZDStack.ZDSModels.Alias`
+        :param now: optional, when the event happened; defaults to
+                    time.time()
+        :type now: float
+        :rtype: int
+        :returns: how many of the player's events are in the window,
+                  including this one
+
+        """
+        now = now or time.time()
+        key = get_player_key(player)
+        count = self._count(key, now)
+        self.__times.setdefault(key, deque()).append(now)
+        return count + 1
+
+    @requires_instance_lock()
+    def count(self, player, now=None):
+        """Counts a player's events in the window.
+
+        :param player: the player whose events are to be counted
+        :type player: :class:`~ZDStack.ZDSModels.Alias`
+        :param now: optional, the end of the window; defaults to
+                    time.time()
+        :type now: float
+        :rtype: int
+
+        """
+        return self._count(get_player_key(player), now or time.time())
+
+    @requires_instance_lock()
+    def clear(self):
+        """Forgets every player's events."""
+        self.__times.clear()
+
+class PluginState(object):
+
+    """PluginState holds a ZServ's state for its plugins.
+
+    .. attribute:: zserv
+        This PluginState's containing ZServ instance.
+
+    .. attribute:: lock
+        A Lock that must be acquired before modifying this
+        PluginState's values or player counts.
+
+    Plugins get their own state by name, with :meth:`counter`,
+    :meth:`player_map` and :meth:`window`, rather than setting
+    attributes on ZServs and Aliases.  The first call creates the
+    value, later calls return the same one.  Plugin names make good
+    prefixes, i.e. 'kick_limit_kicks'.
+
+    The Stack also keeps counts of playing players, by team, and of
+    connected players, by name, up to date as players join, switch
+    teams and disconnect, so plugins can read them without scanning the
+    players list.
+
+    Everything is cleared when the ZServ's round state is cleared.
+
+    """
+
+    def __init__(self, zserv):
+        """Initializes a PluginState.
+
+        :param zserv: this PluginState's containing zserv
+        :type zserv: :class:`~ZDStack.ZServ.ZServ`
+
+        """
+        self.zserv = zserv
+        self.lock = Lock()
+        self.__values = dict()
+        self.__players = dict()
+        self.__team_member_counts = dict()
+        self.__playing_player_count = 0
+        self.__name_counts = dict()
+
+    def _get_value(self, name, value_class, *args):
+        value = self.__values.get(name)
+        if value is None:
+            value = value_class(*args)
+            self.__values[name] = value
+        elif not isinstance(value, value_class):
+            es = "Plugin state [%s] is a %s, not a %s"
+            raise TypeError(es % (name, value.__class__.__name__,
+                                  value_class.__name__))
+        return value
+
+    @requires_instance_lock()
+    def counter(self, name):
+        """Gets a Counter.
+
+        :param name: the name of the Counter
+        :type name: string
+        :rtype: :class:`~ZDStack.ZDSPluginState.Counter`
+
+        """
+        return self._get_value(name, Counter)
+
+    @requires_instance_lock()
+    def player_map(self, name, default=None):
+        """Gets a PlayerMap.
+
+        :param name: the name of the PlayerMap
+        :type name: string
+        :param default: optional, the value of players that haven't
+                        been given one, only used when the PlayerMap
+                        is created; defaults to None
+        :type default: any immutable value
+        :rtype: :class:`~ZDStack.ZDSPluginState.PlayerMap`
+
+        """
+        return self._get_value(name, PlayerMap, default)
+
+    @requires_instance_lock()
+    def window(self, name, seconds):
+        """Gets a SlidingWindow.
+
+        :param name: the name of the SlidingWindow
+        :type name: string
+        :param seconds: how many seconds an event is counted for, only
+                        used when the SlidingWindow is created
+        :type seconds: int or float
+        :rtype: :class:`~ZDStack.ZDSPluginState.SlidingWindow`
+
+        """
+        return self._get_value(name, SlidingWindow, seconds)
+
+    def _count_player(self, counted, sign):
+        name, playing_color = counted
+        self.__name_counts[name] = self.__name_counts.get(name, 0) + sign
+        if not self.__name_counts[name]:
+            del self.__name_counts[name]
+        if playing_color:
+            self.__playing_player_count += sign
+            count = self.__team_member_counts.get(playing_color, 0) + sign
+            self.__team_member_counts[playing_color] = count
+
+    @requires_instance_lock()
+    def update_player(self, player):
+        """Updates the player counts after a player's state changes.
+
+        :param player: the player whose state changed
+        :type player: :class:`~ZDStack.ZDSModels.Alias`
+
+        This is called by the Stack whenever a player joins, switches
+        teams or disconnects, plugins shouldn't call it.
+
+        """
+        key = get_player_key(player)
+        if player.disconnected:
+            counted = None
+        elif player.playing and player.color:
+            counted = (player.name, player.color.lower())
+        else:
+            counted = (player.name, None)
+        previous = self.__players.get(key)
+        if counted == previous:
+            return
+        if previous:
+            self._count_player(previous, -1)
+        if counted:
+            self._count_player(counted, 1)
+            self.__players[key] = counted
+        else:
+            self.__players.pop(key, None)
+
+    def get_team_member_count(self, color):
+        """Gets the number of players playing on a team.
+
+        :param color: the color of the team
+        :type color: string
+        :rtype: int
+
+        """
+        return self.__team_member_counts.get(color.lower(), 0)
+
+    def get_playing_player_count(self):
+        """Gets the number of players playing on any team.
+
+        :rtype: int
+
+        """
+        return self.__playing_player_count
+
+    def get_name_count(self, name):
+        """Gets the number of connected players using a name.
+
+        :param name: the name
+        :type name: string
+        :rtype: int
+
+        """
+        return self.__name_counts.get(name, 0)
+
+    def get_team_score(self, color):
+        """Gets a team's score in the current round.
+
+        :param color: the color of the team
+        :type color: string
+        :rtype: int
+
+        """
+        return self.zserv.team_scores.get(color.lower(), 0)
+
+    @requires_instance_lock()
+    def clear(self):
+        """Clears all plugin state and player counts."""
+        for value in self.__values.values():
+            value.clear()
+        self.__players.clear()
+        self.__team_member_counts.clear()
+        self.__playing_player_count = 0
+        self.__name_counts.clear()
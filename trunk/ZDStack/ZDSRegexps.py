@@ -43,6 +43,19 @@ __SB = re.compile(r'(<.*>\s)')
 __SD = '> '
 __ST = re.compile(TIMESTAMP_PREFIX)
 
+def remove_timestamp(s):
+    """Removes the timestamp from the start of a line, if it has one.
+
+    :param s: the line
+    :type s: string
+    :rtype: string
+
+    """
+    m = __ST.match(s)
+    if m:
+        return s[m.end():]
+    return s
+
 def get_possible_player_names(s):
     """Parses a message, extracting potential names of the sender.
 
@@ -57,11 +70,7 @@ def get_possible_player_names(s):
     # First lop off the timestamp if it matches
     ###
     ppn = list()
-    m = __ST.match(s)
-    if m:
-        ws = s[m.end():]
-    else:
-        ws = s
+    ws = remove_timestamp(s)
     sm = __SR.match(ws)
     bm = __SB.match(ws)
     if not sm and not bm:
@@ -0,0 +1,178 @@
+from __future__ import with_statement
+
+from sqlalchemy import func, select
+
+from ZDStack import get_zdslog
+from ZDStack.ZDSTables import rounds_table, rounds_and_aliases, frags_table, \
+                              flag_touches_table, flag_returns_table, \
+                              round_alias_stats_table, \
+                              round_alias_weapon_stats_table, \
+                              archived_rounds_table
+from ZDStack.ZDSDatabase import new_session
+
+zdslog = get_zdslog()
+
+def _get_seconds(td):
+    return (td.days * 86400) + td.seconds + (td.microseconds / 1000000.0)
+
+def _get_alias_stats(round_id, alias_id):
+    return {'round_id': round_id, 'alias_id': alias_id, 'frags': 0,
+            'deaths': 0, 'suicides': 0, 'flag_touches': 0, 'flag_picks': 0,
+            'flag_captures': 0, 'flag_returns': 0, 'flag_hold_time': 0.0}
+
+def summarize_round(round_id, session):
+    """Materializes a round's summary rows.
+
+    :param round_id: the database ID of the round to summarize
+    :type round_id: int
+    :param session: a database session
+    :type session: SQLAlchemy Session
+    :rtype: int
+    :returns: the number of aliases summarized
+
+    Any existing summary rows for the round are replaced, so rounds
+    can be summarized more than once.  Every alias that played in the
+    round gets a row in round_alias_stats, and a row in
+    round_alias_weapon_stats for each weapon they fragged with or died
+    by.
+
+    Archived rounds' events have been deleted, so re-summarizing them
+    would wipe out their summaries; a ValueError is raised instead.
+
+    """
+    q = session.query(archived_rounds_table.c.round_id)
+    if q.filter(archived_rounds_table.c.round_id == round_id).count():
+        es = "Round %s has been archived, it can't be summarized again"
+        raise ValueError(es % (round_id))
+    ###
+    # Make sure pending changes (loss times set in ZServ.clean_up, for
+    # example) are included.
+    ###
+    session.flush()
+    alias_stats = dict()
+    weapon_stats = dict()
+    def get_alias_stats(alias_id):
+        try:
+            return alias_stats[alias_id]
+        except KeyError:
+            d = alias_stats[alias_id] = _get_alias_stats(round_id, alias_id)
+            return d
+    def get_weapon_stats(alias_id, weapon_name):
+        try:
+            return weapon_stats[(alias_id, weapon_name)]
+        except KeyError:
+            d = weapon_stats[(alias_id, weapon_name)] = {
+                'round_id': round_id,
+                'alias_id': alias_id,
+                'weapon_name': weapon_name,
+                'frags': 0,
+                'deaths': 0
+            }
+            return d
+    q = session.query(rounds_and_aliases.c.alias_id)
+    for (alias_id,) in q.filter(rounds_and_aliases.c.round_id == round_id):
+        get_alias_stats(alias_id)
+    ###
+    # Frags are counted by the database; a round can have thousands.
+    ###
+    fc = frags_table.c
+    q = session.query(fc.fragger_id, fc.fraggee_id, fc.weapon_name,
+                      func.count(fc.id))
+    q = q.filter(fc.round_id == round_id)
+    q = q.group_by(fc.fragger_id, fc.fraggee_id, fc.weapon_name)
+    for fragger_id, fraggee_id, weapon_name, count in q:
+        if fragger_id == fraggee_id:
+            get_alias_stats(fraggee_id)['suicides'] += count
+        else:
+            get_alias_stats(fragger_id)['frags'] += count
+            get_weapon_stats(fragger_id, weapon_name)['frags'] += count
+        get_alias_stats(fraggee_id)['deaths'] += count
+        get_weapon_stats(fraggee_id, weapon_name)['deaths'] += count
+    tc = flag_touches_table.c
+    q = session.query(tc.player_id, tc.touch_time, tc.loss_time,
+                      tc.was_picked, tc.resulted_in_score)
+    for touch in q.filter(tc.round_id == round_id):
+        player_id, touch_time, loss_time, was_picked, resulted_in_score = touch
+        d = get_alias_stats(player_id)
+        d['flag_touches'] += 1
+        if was_picked:
+            d['flag_picks'] += 1
+        if resulted_in_score:
+            d['flag_captures'] += 1
+        if touch_time and loss_time and loss_time > touch_time:
+            d['flag_hold_time'] += _get_seconds(loss_time - touch_time)
+    rc = flag_returns_table.c
+    q = session.query(rc.player_id, func.count(rc.id))
+    q = q.filter(rc.round_id == round_id).group_by(rc.player_id)
+    for player_id, count in q:
+        get_alias_stats(player_id)['flag_returns'] += count
+    ###
+    # Frags and touches by unknown players aren't summarized.
+    ###
+    alias_stats.pop(None, None)
+    weapon_stats = [y for x, y in weapon_stats.items() if x[0] is not None]
+    for table in (round_alias_stats_table, round_alias_weapon_stats_table):
+        session.execute(table.delete(table.c.round_id == round_id))
+    if alias_stats:
+        session.execute(round_alias_stats_table.insert(), alias_stats.values())
+    if weapon_stats:
+        session.execute(round_alias_weapon_stats_table.insert(), weapon_stats)
+    ds = "Summarized %d aliases in round %s"
+    zdslog.debug(ds % (len(alias_stats), round_id))
+    return len(alias_stats)
+
+def backfill_summaries(rebuild=False, batch_size=100, callback=None):
+    """Summarizes rounds that ended before summaries were kept.
+
+    :param rebuild: optional, whether or not to re-summarize rounds
+                    that already have summaries; defaults to False
+    :type rebuild: boolean
+    :param batch_size: optional, the number of rounds to summarize in
+                       each transaction; defaults to 100
+    :type batch_size: int
+    :param callback: optional, a function called with the number of
+                     rounds summarized so far after each batch
+    :type callback: function
+    :rtype: int
+    :returns: the number of rounds summarized
+
+    Only rounds that have ended are summarized, ZServ.clean_up()
+    summarizes the others when they end.  Archived rounds are never
+    summarized, even when rebuilding, because their events are gone.
+    If a batch fails, it's rolled
+    back and no more rounds are summarized.
+
+    """
+    summarized = select([round_alias_stats_table.c.round_id])
+    archived = select([archived_rounds_table.c.round_id])
+    last_round_id = 0
+    total = 0
+    while 1:
+        ###
+        # new_session() logs and rolls back errors (including errors
+        # summarizing a round, or committing), so only count the batch if it
+        # was actually committed; otherwise we stop.
+        ###
+        round_ids = []
+        with new_session() as session:
+            q = session.query(rounds_table.c.id)
+            q = q.filter(rounds_table.c.id > last_round_id)
+            q = q.filter(rounds_table.c.end_time != None)
+            q = q.filter(~rounds_table.c.id.in_(archived))
+            if not rebuild:
+                q = q.filter(~rounds_table.c.id.in_(summarized))
+            round_ids = [x[0] for x in
+                         q.order_by(rounds_table.c.id).limit(batch_size)]
+            for round_id in round_ids:
+                summarize_round(round_id, session)
+        if not session.committed:
+            es = "Summarizing rounds after round %s failed, stopping"
+            zdslog.error(es % (last_round_id))
+            break
+        if not round_ids:
+            break
+        last_round_id = round_ids[-1]
+        total += len(round_ids)
+        if callback:
+            callback(total)
+    return total
@@ -1,17 +1,16 @@
 import datetime
 
 from sqlalchemy import Table, Column, ForeignKey, Index, String, DateTime, \
-                       Integer, Boolean, Unicode, UniqueConstraint, MetaData
+                       Integer, Boolean, Unicode, UniqueConstraint, MetaData, \
+                       Float
 
-from ZDStack import get_engine, get_metadata
+from ZDStack import get_metadata
 
 # zdslog = get_zdslog()
 
 ###
-# Get the DB engine.
+# Only get the metadata, the DB engine is created when it's first used.
 ###
-# zdslog.debug("Initializing Database")
-__engine = get_engine()
 __metadata = get_metadata()
 
 ports_and_gamemodes = Table('ports_and_gamemodes', __metadata,
@@ -166,3 +165,102 @@ rcon_denials_table = Table('rcon_denials', __metadata,
     Column('timestamp', DateTime, default=datetime.datetime.now)
 )
 
+###
+# Summaries of each alias' stats in each round, filled in when a round ends
+# (see ZDStack.ZDSSummaries), so stats can be totalled without scanning the
+# frags and flag_touches tables.
+###
+
+round_alias_stats_table = Table('round_alias_stats', __metadata,
+    Column('id', Integer, primary_key=True),
+    Column('round_id', Integer, ForeignKey('rounds.id'), nullable=False),
+    Column('alias_id', Integer, ForeignKey('aliases.id'), nullable=False,
+           index=True),
+    Column('frags', Integer, default=0, nullable=False),
+    Column('deaths', Integer, default=0, nullable=False),
+    Column('suicides', Integer, default=0, nullable=False),
+    Column('flag_touches', Integer, default=0, nullable=False),
+    Column('flag_picks', Integer, default=0, nullable=False),
+    Column('flag_captures', Integer, default=0, nullable=False),
+    Column('flag_returns', Integer, default=0, nullable=False),
+    Column('flag_hold_time', Float, default=0.0, nullable=False),
+    UniqueConstraint('round_id', 'alias_id')
+)
+
+round_alias_weapon_stats_table = Table('round_alias_weapon_stats', __metadata,
+    Column('id', Integer, primary_key=True),
+    Column('round_id', Integer, ForeignKey('rounds.id'), nullable=False),
+    Column('alias_id', Integer, ForeignKey('aliases.id'), nullable=False,
+           index=True),
+    Column('weapon_name', String(50), ForeignKey('weapons.name'),
+           nullable=False),
+    Column('frags', Integer, default=0, nullable=False),
+    Column('deaths', Integer, default=0, nullable=False),
+    UniqueConstraint('round_id', 'alias_id', 'weapon_name')
+)
+
+###
+# Checkpoints of each ZServ's rolling leaderboards (see
+# ZDStack.ZDSLeaderboards), so they survive a restart.
+###
+
+leaderboard_buckets_table = Table('leaderboard_buckets', __metadata,
+    Column('id', Integer, primary_key=True),
+    Column('zserv_name', String(255), nullable=False),
+    Column('bucket_start', Integer, nullable=False),
+    Column('stat', String(20), nullable=False),
+    Column('player_name', String(255), nullable=False),
+    Column('count', Integer, default=0, nullable=False),
+    UniqueConstraint('zserv_name', 'bucket_start', 'stat', 'player_name')
+)
+
+###
+# Composite indexes for the common access paths: a round's frags in order,
+# an alias' frags by weapon, an alias' flag touches in a round and rounds by
+# start time.  create_all() only creates indexes along with their tables, so
+# ZDStack.ZDSMigrations creates these in databases that predate them.
+###
+
+frags_round_id_timestamp_index = Index('ix_frags_round_id_timestamp',
+    frags_table.c.round_id,
+    frags_table.c.timestamp
+)
+
+frags_fragger_id_weapon_name_index = Index('ix_frags_fragger_id_weapon_name',
+    frags_table.c.fragger_id,
+    frags_table.c.weapon_name
+)
+
+flag_touches_player_id_round_id_index = Index(
+    'ix_flag_touches_player_id_round_id',
+    flag_touches_table.c.player_id,
+    flag_touches_table.c.round_id
+)
+
+rounds_start_time_index = Index('ix_rounds_start_time',
+    rounds_table.c.start_time
+)
+
+###
+# The schema migrations (see ZDStack.ZDSMigrations) applied to the database.
+###
+
+schema_versions_table = Table('schema_versions', __metadata,
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String(255), nullable=False),
+    Column('applied_time', DateTime, default=datetime.datetime.now,
+           nullable=False)
+)
+
+###
+# Rounds whose events have been moved to archive files (see
+# ZDStack.ZDSArchive).  The rounds themselves, and their summaries, are kept.
+###
+
+archived_rounds_table = Table('archived_rounds', __metadata,
+    Column('round_id', Integer, ForeignKey('rounds.id'), primary_key=True,
+           autoincrement=False),
+    Column('archive_file', String(255), nullable=False),
+    Column('archived_time', DateTime, default=datetime.datetime.now,
+           nullable=False)
+)
@@ -1,4 +1,5 @@
 from threading import Event
+from collections import deque
 
 from ZDStack import get_zdslog
 
@@ -80,3 +81,102 @@ class Task(object):
                 self.is_complete.set()
         return self.output
 
+
+class LightTask(object):
+
+    """A Task that nothing waits on.
+
+    .. attribute:: func
+        The function this LightTask will call when it is performed
+
+    .. attribute:: args
+        A list of positional arguments to pass to func
+
+    .. attribute:: name
+        The (optional) name of this task, default 'Generic'
+
+    ZDStack creates a Task for every chunk of zserv output and every
+    event, and nothing ever waits on them.  LightTask has no
+    'is_complete' Event, no 'output' and no kwargs, and performed
+    LightTasks are kept in a small pool and reused, so the hot path
+    doesn't allocate a new object (and a new Event, which itself
+    allocates a Condition and a Lock) for every line of output.  Use
+    :meth:`get` instead of instantiating LightTask directly.
+
+    """
+
+    __slots__ = ('func', 'args', 'name')
+
+    ###
+    # deque.append() and deque.pop() are atomic, so the pool doesn't
+    # require a lock.  It's allowed to grow a little over POOL_SIZE if
+    # multiple threads release tasks at once, which is fine.
+    ###
+    POOL_SIZE = 1024
+    _pool = deque()
+
+    def __init__(self, func, args=None, name=None):
+        """Initializes a LightTask.
+
+        :param func: what this LightTask calls when it's performed
+        :type func: function
+
+        :param args:
+            A list of positional arguments to pass to func, default None
+
+        :param name:
+            The (optional) name of this task, defaults 'Generic'
+
+        """
+        self.func = func
+        self.args = args or ()
+        self.name = name or 'Generic'
+
+    @classmethod
+    def get(cls, func, args=None, name=None):
+        """Gets a LightTask, reusing a pooled one if available.
+
+        :param func: what the LightTask calls when it's performed
+        :type func: function
+        :param args: optional, a list of positional arguments to pass
+                     to func
+        :param name: optional, the name of the task
+        :type name: string
+        :rtype: :class:`~ZDStack.ZDSTask.LightTask`
+
+        """
+        try:
+            task = cls._pool.pop()
+        except IndexError:
+            return cls(func, args, name)
+        task.func = func
+        task.args = args or ()
+        task.name = name or 'Generic'
+        return task
+
+    def release(self):
+        """Returns this LightTask to the pool."""
+        self.func = self.args = None
+        if len(self._pool) < self.POOL_SIZE:
+            self._pool.append(self)
+
+    def perform(self, input_queue, output_queue=None):
+        """Performs this LightTask, then returns it to the pool.
+
+        :param input_queue: the queue from which this task was created
+        :type input_queue: Queue.Queue
+        :param output_queue: optional, the queue in which to place the
+                             output of self.func
+        :type output_queue: Queue.Queue
+        :returns: the output of self.func
+
+        """
+        try:
+            output = self.func(*self.args)
+            if output and output_queue:
+                output_queue.put_nowait(output)
+        finally:
+            input_queue.task_done()
+            self.release()
+        return output
+
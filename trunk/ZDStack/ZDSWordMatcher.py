@@ -0,0 +1,217 @@
+from __future__ import with_statement
+
+import os
+
+from threading import Lock
+
+from ZDStack import get_zdslog
+
+zdslog = get_zdslog()
+
+###
+# Compiled WordMatchers, keyed by word list file.  Each value is a
+# ((size, mtime), WordMatcher) tuple, so a file is only compiled again after
+# it changes.
+###
+WORD_MATCHERS = dict()
+WORD_MATCHERS_LOCK = Lock()
+
+class WordMatcher(object):
+
+    """WordMatcher finds many words in a string in a single pass.
+
+    .. attribute:: words
+        A tuple of the words this WordMatcher finds, lowercased if
+        ignore_case is True.
+
+    .. attribute:: ignore_case
+        A boolean, whether or not case is ignored.
+
+    .. attribute:: whole_words
+        A boolean, whether or not words only match when they aren't
+        part of a larger word, i.e. 'ass' won't match 'class'.
+
+    The words are compiled into an Aho-Corasick automaton: a trie of
+    the words, where each state also knows the longest proper suffix of
+    itself that's in the trie.  Scanning a string follows one
+    transition per character (plus suffix links when a transition
+    doesn't exist), so it takes the same time whether there are 10
+    words or 10,000, unlike testing each word with 'in'.
+
+    """
+
+    def __init__(self, words, ignore_case=True, whole_words=False):
+        """Initializes a WordMatcher.
+
+        :param words: the words to find; empty words are ignored
+        :type words: list of strings
+        :param ignore_case: optional, whether or not to ignore case;
+                            defaults to True
+        :type ignore_case: boolean
+        :param whole_words: optional, whether or not to only match
+                            whole words; defaults to False
+        :type whole_words: boolean
+
+        """
+        self.ignore_case = ignore_case
+        self.whole_words = whole_words
+        if ignore_case:
+            words = [x.lower() for x in words]
+        seen = set()
+        self.words = tuple([x for x in words
+                            if x and not (x in seen or seen.add(x))])
+        ###
+        # State 0 is the root.  _transitions[state] maps characters to
+        # states, _links[state] is the state's suffix link, and
+        # _outputs[state] is a tuple of the words that end at state
+        # (including those that end at states its suffix links lead to),
+        # longest first.
+        ###
+        transitions = [dict()]
+        outputs = [list()]
+        for word in self.words:
+            state = 0
+            for c in word:
+                next_state = transitions[state].get(c)
+                if next_state is None:
+                    next_state = len(transitions)
+                    transitions[state][c] = next_state
+                    transitions.append(dict())
+                    outputs.append(list())
+                state = next_state
+            outputs[state].append(word)
+        links = [0] * len(transitions)
+        ###
+        # Suffix links are found breadth-first, so a state's link is
+        # always found before the links of the states below it.
+        ###
+        queue = transitions[0].values()
+        for state in queue:
+            for c, next_state in transitions[state].items():
+                queue.append(next_state)
+                link = links[state]
+                while link and c not in transitions[link]:
+                    link = links[link]
+                link = transitions[link].get(c, 0)
+                links[next_state] = link
+                outputs[next_state].extend(outputs[link])
+        self._transitions = transitions
+        self._links = links
+        self._outputs = [tuple(x) for x in outputs]
+
+    def __len__(self):
+        return len(self.words)
+
+    def __repr__(self):
+        return "<WordMatcher (%d words) at %x>" % (len(self.words), id(self))
+
+    __str__ = __repr__
+
+    def _is_whole_word(self, s, start, end):
+        return not ((start > 0 and s[start - 1].isalnum()) or
+                    (end < len(s) and s[end].isalnum()))
+
+    def finditer(self, s):
+        """Finds the words in a string.
+
+        :param s: the string to scan
+        :type s: string
+        :rtype: generator
+        :returns: (<int: start index>, <string: word>) tuples, in the
+                  order the words end in s
+
+        Overlapping words are all found, i.e. scanning 'asshole' for
+        'ass' and 'asshole' finds both.
+
+        """
+        if self.ignore_case:
+            s = s.lower()
+        transitions = self._transitions
+        links = self._links
+        outputs = self._outputs
+        state = 0
+        for i, c in enumerate(s):
+            while state and c not in transitions[state]:
+                state = links[state]
+            state = transitions[state].get(c, 0)
+            for word in outputs[state]:
+                start = i - len(word) + 1
+                if self.whole_words and \
+                   not self._is_whole_word(s, start, i + 1):
+                    continue
+                yield (start, word)
+
+    def findall(self, s):
+        """Finds the words in a string.
+
+        :param s: the string to scan
+        :type s: string
+        :rtype: list
+        :returns: a list of (<int: start index>, <string: word>) tuples,
+                  see :meth:`finditer`
+
+        """
+        return list(self.finditer(s))
+
+    def search(self, s):
+        """Finds the first word in a string.
+
+        :param s: the string to scan
+        :type s: string
+        :rtype: string
+        :returns: the first word that ends in s, or None
+
+        Scanning stops at the first word found.
+
+        """
+        for start, word in self.finditer(s):
+            return word
+        return None
+
+def load_word_list(word_list_file):
+    """Loads a word list file.
+
+    :param word_list_file: the full path to the word list file
+    :type word_list_file: string
+    :rtype: list of strings
+
+    Word list files have one word (or phrase) per line.  Blank lines
+    and lines starting with '#' are skipped.
+
+    """
+    fobj = open(word_list_file)
+    try:
+        words = [x.strip() for x in fobj]
+    finally:
+        fobj.close()
+    return [x for x in words if x and not x.startswith('#')]
+
+def get_word_matcher(word_list_file):
+    """Gets a WordMatcher for a word list file.
+
+    :param word_list_file: the full path to the word list file
+    :type word_list_file: string
+    :rtype: :class:`~ZDStack.ZDSWordMatcher.WordMatcher`
+
+    WordMatchers are cached, and only compiled again when their word
+    list file changes, so word lists can be changed without restarting
+    ZDStack.  ZServs that use the same word list file share the same
+    WordMatcher.
+
+    """
+    st = os.stat(word_list_file)
+    key = (st.st_size, st.st_mtime)
+    with WORD_MATCHERS_LOCK:
+        if word_list_file in WORD_MATCHERS:
+            cached_key, word_matcher = WORD_MATCHERS[word_list_file]
+            if cached_key == key:
+                return word_matcher
+    ###
+    # Compile outside the lock, a long word list can take a while.
+    ###
+    word_matcher = WordMatcher(load_word_list(word_list_file))
+    zdslog.info("Loaded %d words from %s" % (len(word_matcher),
+                                            word_list_file))
+    with WORD_MATCHERS_LOCK:
+        WORD_MATCHERS[word_list_file] = (key, word_matcher)
+    return word_matcher
@@ -2,16 +2,15 @@ from __future__ import with_statement
 
 import os
 import types
+import hashlib
 import logging
 from logging.handlers import TimedRotatingFileHandler
 
 from decimal import Decimal
 from ConfigParser import NoOptionError
 
-from ZDStack import TEAM_COLORS, get_zdslog
+from ZDStack import TEAM_COLORS, SUPPORTED_GAME_MODES, get_zdslog
 from ZDStack.Utils import check_ip, resolve_path, requires_instance_lock
-from ZDStack.ZDSModels import TeamColor
-from ZDStack.ZDSDatabase import global_session
 from ZDStack.ZDSConfigParser import ZDSConfigParser
 
 zdslog = get_zdslog()
@@ -76,6 +75,86 @@ DMFLAGS2_OPTIONS = (
     'instant_weapon_switching', # sv_insta_switch
 )
 
+###
+# Global options that ZServs use.  Other 'zdstack_' and 'zdsweb_' options
+# only affect ZDStack itself (or ZDWebStats), so they're left out of a
+# ZServ's effective config.
+###
+ZSERV_GLOBAL_OPTIONS = ('zdstack_zserv_folder', 'zdstack_banlist_file',
+                        'zdstack_whitelist_file', 'zdstack_wad_folder',
+                        'zdstack_iwad_folder', 'zdstack_log_folder')
+
+###
+# Options that only ZDStack uses, so changes to them take effect as soon as
+# a ZServ's config is reloaded.  Changes to any other option are written to
+# the zserv's .cfg file or command line, and so only take effect when the
+# zserv is (re)started.
+###
+LIVE_OPTIONS = ('enable_events', 'enable_stats', 'enable_plugins',
+                'plugins', 'plugin_timeout', 'save_empty_rounds',
+                'save_logfile', 'save_log_files',
+                'number_of_zserv_logs_to_backup',
+                'use_global_banlist', 'use_global_whitelist',
+                'copy_zdaemon_banlist', 'zdstack_banlist_file',
+                'zdstack_whitelist_file', 'zdstack_log_folder',
+                'word_list_file')
+
+def get_effective_config(config, zserv_name):
+    """Gets a ZServ's effective config.
+
+    :param config: the configuration
+    :type config: :class:`~ZDStack.ZDSConfigParser.ZDSConfigParser`
+    :param zserv_name: the name of the ZServ
+    :type zserv_name: string
+    :rtype: dict
+    :returns: {<string: option>: <string: raw value>}, the options in
+              the ZServ's section and those it inherits from DEFAULT,
+              including those prefixed with its game mode
+
+    Options prefixed with other game modes, and global options that
+    ZServs don't use, are left out.  Values aren't interpolated, but
+    the options they refer to are included, so a change to any of them
+    changes the effective config.
+
+    """
+    game_mode = config.get(zserv_name, 'mode').lower()
+    effective_config = dict()
+    for option, value in config.items(zserv_name, raw=True):
+        prefix = option.split('_', 1)[0]
+        if prefix in SUPPORTED_GAME_MODES and prefix != game_mode:
+            continue
+        if prefix in ('zdstack', 'zdsweb') and \
+           option not in ZSERV_GLOBAL_OPTIONS:
+            continue
+        effective_config[option] = value
+    return effective_config
+
+def get_config_hash(effective_config):
+    """Gets the hash of a ZServ's effective config.
+
+    :param effective_config: the effective config, as returned by
+                             :func:`get_effective_config`
+    :type effective_config: dict
+    :rtype: string
+
+    """
+    return hashlib.md5(repr(sorted(effective_config.items()))).hexdigest()
+
+def get_changed_options(old_config, new_config):
+    """Gets the options that differ between two effective configs.
+
+    :param old_config: the old effective config
+    :type old_config: dict
+    :param new_config: the new effective config
+    :type new_config: dict
+    :rtype: list of strings
+    :returns: the added, removed and changed options, sorted
+
+    """
+    options = set(old_config.keys()) | set(new_config.keys())
+    return sorted([x for x in options
+                     if old_config.get(x) != new_config.get(x)])
+
 class ZServTRFH(TimedRotatingFileHandler):
 
     def emit(self, record):
@@ -120,6 +199,7 @@ class ZServConfigParser(ZDSConfigParser):
         self.zserv = zserv
         self.game_mode = zserv.zdstack.config.get(zserv.name, 'mode').lower()
         self.set(self.zserv.name, 'name', self.zserv.name)
+        self._config_data = None
 
     def add_section(self, *args, **kwargs):
         """ZServConfigParsers don't support adding sections."""
@@ -413,7 +493,14 @@ class ZServConfigParser(ZDSConfigParser):
         ZServConfig updates its ZServ's instance variables
 
         """
+        ###
+        # The database modules are imported here rather than at the top, so
+        # tools that only use this module's constants (like bin/dmflags)
+        # don't import SQLAlchemy.
+        ###
         from ZDStack.ZServ import DUEL_MODES
+        from ZDStack.ZDSModels import TeamColor
+        from ZDStack.ZDSDatabase import global_session
         if reload:
             self.reload()
         ###
@@ -469,6 +556,7 @@ class ZServConfigParser(ZDSConfigParser):
         events_enabled = self.getboolean('enable_events', False)
         stats_enabled = self.getboolean('enable_stats', False)
         plugins_enabled = self.getboolean('enable_plugins', False)
+        plugin_timeout = self.getfloat('plugin_timeout', 5.0) or None
         save_empty_rounds = self.getboolean('save_empty_rounds', False)
         if not events_enabled:
             if save_empty_rounds:
@@ -494,6 +582,10 @@ class ZServConfigParser(ZDSConfigParser):
         use_global_banlist = self.getboolean('use_global_banlist', False)
         use_global_whitelist = self.getboolean('use_global_whitelist', False)
         copy_zdaemon_banlist = self.getboolean('copy_zdaemon_banlist', False)
+        word_list_file = self.getpath('word_list_file', '') or None
+        if word_list_file and not os.path.isfile(word_list_file):
+            es = "Word list file [%s] not found"
+            raise ValueError(es % (word_list_file))
         ###
         # End ZDStack stuff
         ###
@@ -709,6 +801,7 @@ class ZServConfigParser(ZDSConfigParser):
         self.zserv.events_enabled = events_enabled
         self.zserv.stats_enabled = stats_enabled
         self.zserv.plugins_enabled = plugins_enabled
+        self.zserv.plugin_timeout = plugin_timeout
         self.zserv.save_empty_rounds = save_empty_rounds
         self.zserv.save_logfile = save_logfile
         ds = "save_logfile is %s for %s"
@@ -716,6 +809,7 @@ class ZServConfigParser(ZDSConfigParser):
         self.zserv.use_global_banlist = use_global_banlist
         self.zserv.use_global_whitelist = use_global_whitelist
         self.zserv.copy_zdaemon_banlist = copy_zdaemon_banlist
+        self.zserv.word_list_file = word_list_file
         ###
         # ZServ-specific stuff starts here.
         ###
@@ -858,6 +952,11 @@ class ZServConfigParser(ZDSConfigParser):
         self.zserv.map_vote_percent = map_vote_percent
         self.zserv.random_captain_voting = random_captain_voting
         ###
+        # The ZServ's attributes have changed, so its configuration data has
+        # to be generated again.
+        ###
+        self._config_data = None
+        ###
         # Stuff added in 1.09 (and maybe 1.08.08 RCs
         #   sv_specteamblock
         #   sv_oldthrust
@@ -881,12 +980,22 @@ class ZServConfigParser(ZDSConfigParser):
         :rtype: string
         :returns: configuration data as a string in zserv configuration format
 
+        The data is only generated once after each time the config is
+        processed, afterwards it's returned from a cache.
+
         """
+        config_data = self._config_data
+        if config_data is None:
+            config_data = self._generate_config_data()
+            self._config_data = config_data
+        return config_data
+
+    def _generate_config_data(self):
         from ZDStack.ZServ import DUEL_MODES, DM_MODES, TEAM_MODES, CTF_MODES
-        self._new_template = ''
+        lines = list()
         def add_line(should_add, line):
             if should_add:
-                self._new_template += line + '\n'
+                lines.append(line)
                 return True
             return False
         def add_bool_line(bool, zs_option_name):
@@ -1083,5 +1192,5 @@ class ZServConfigParser(ZDSConfigParser):
             # add_var_line(map, over_t)
             if self.zserv.add_mapnum_to_hostname:
                 add_line(True, host_t % (map, map.upper()))
-        return self._new_template
+        return '\n'.join(lines) + '\n'
 
@@ -1,5 +1,6 @@
 from __future__ import with_statement
 
+import time
 import threading
 
 from ZDStack import get_zdslog
@@ -76,6 +77,7 @@ class Messenger(object):
         with self.lock:
             self.response_processed.clear()
             self.event_response_type = event_response_type
+            sent_time = time.time()
             self.__write(message)
             if not self.zserv.events_enabled or event_response_type is None:
                 return self.clear()
@@ -88,6 +90,8 @@ class Messenger(object):
             if not self.response_finished.isSet():
                 self.clear()
                 raise Exception('Timed out waiting for a response to finish')
+            self.zserv.metrics.add_timing('messenger_round_trip',
+                                          time.time() - sent_time)
             ###
             # I'm not totally happy about this hack, but so be it.
             ###
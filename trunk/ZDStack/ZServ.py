@@ -2,6 +2,7 @@ from __future__ import with_statement
 
 import os
 import time
+import hashlib
 
 from decimal import Decimal
 from datetime import date, datetime, timedelta
@@ -23,12 +24,17 @@ NUMBERS_TO_COLORS = {0: 'red', 1: 'blue', 2: 'green', 3: 'white'}
 COLORS_TO_NUMBERS = {'red': 0, 'blue': 1, 'green': 2, 'white': 3}
 
 from ZDStack.ZDSTask import Task
+from ZDStack.ZDSMetrics import Metrics
+from ZDStack.ZDSLeaderboards import Leaderboard
 from ZDStack.ZDSModels import Round, GameMode, Port, Map, Alias
 from ZDStack.ZDSDatabase import requires_session, global_session
+from ZDStack.ZDSSummaries import summarize_round
 from ZDStack.ZDSPlayersList import PlayersList
+from ZDStack.ZDSPluginState import PluginState
 from ZDStack.ZDSZServConfig import ZServConfigParser
 from ZDStack.ZDSZServMessenger import Messenger
 from ZDStack.ZDSZServAccessList import ZServAccessList
+from ZDStack.ZDSWordMatcher import get_word_matcher
 
 from sqlalchemy.orm.exc import NoResultFound
 
@@ -49,6 +55,38 @@ class ZServ(object):
     .. attribute:: name
         A string representing the name of the ZServ.
 
+    .. attribute:: metrics
+        A :class:`~ZDStack.ZDSMetrics.Metrics` instance holding timings
+        and counters for this ZServ's output and events.
+
+    .. attribute:: status
+        A dict holding a snapshot of this ZServ's status, see
+        :meth:`~ZDStack.ZServ.ZServ.refresh_status`.  The dict is
+        replaced, never modified, so it can be read without locking.
+
+    .. attribute:: status_time
+        The time (from time.time()) when the status snapshot was taken.
+
+    .. attribute:: leaderboard
+        A :class:`~ZDStack.ZDSLeaderboards.Leaderboard` holding this
+        ZServ's rolling player totals.
+
+    .. attribute:: open_flag_touches
+        A dict mapping the :class:`~ZDStack.ZDSModels.Alias` of each
+        player holding a flag to their open
+        :class:`~ZDStack.ZDSModels.FlagTouch`, which is closed when
+        they capture or lose the flag, or when the round ends.
+
+    .. attribute:: plugin_state
+        A :class:`~ZDStack.ZDSPluginState.PluginState` holding state
+        for this ZServ's plugins, and player counts they can read
+        without scanning the players list.
+
+    .. attribute:: config_file_state
+        A (<string: path>, <string: contents hash>, <float: mtime>)
+        tuple describing the zserv's configuration file when it was
+        last written, or None if it hasn't been written yet.
+
     ZServ does the following:
 
       * Handles configuration of the zserv process
@@ -78,7 +116,11 @@ class ZServ(object):
         self.round_id = None
         self.name = name
         self.zdstack = zdstack
+        self.status = None
+        self.status_time = None
         self._fragment = None
+        self.metrics = Metrics(name)
+        self.leaderboard = Leaderboard(name)
         self.messenger = Messenger(self)
         self.whitelist_lock = Lock()
         self.event_lock = Lock()
@@ -88,36 +130,146 @@ class ZServ(object):
         self.ban_timer_lock = Lock()
         self.round_id = None
         self.players = PlayersList(self)
+        self.plugin_state = PluginState(self)
         self.players_holding_flags = set()
         self.teams_holding_flags = set()
+        self.open_flag_touches = dict()
         self.fragged_runners = list()
         self.team_scores = dict()
         self._template = ''
+        self.config_file_state = None
         self.zserv = None
         self.fifo = None
         self.config = ZServConfigParser(self)
         self.access_list = ZServAccessList(self)
         self.load_config()
         self.clear_state()
+        self.load_plugins()
+        self.refresh_status()
+
+    def load_plugins(self):
+        """Loads this ZServ's plugins.
+
+        Plugin files that have changed since they were last loaded are
+        loaded again, so this also reloads plugins.
+
+        """
         if self.events_enabled and self.plugins_enabled:
             plugin_names = self.config.getlist('plugins', default=list())
             zdslog.debug("Plugin names: %s" % (plugin_names))
-            self.plugins = get_plugins(plugin_names)
-            loaded_plugin_names = [x.__name__ for x in self.plugins]
+            plugins = get_plugins(plugin_names)
+            loaded_plugin_names = [x.__name__ for x in plugins]
             for y in [x for x in plugin_names if x not in loaded_plugin_names]:
                 zdslog.error("Plugin %s not found" % (y))
-            zdslog.debug("Plugins: %s" % (self.plugins))
+            zdslog.debug("Plugins: %s" % (plugins))
         else:
             ds = "Events enabled, plugins enabled: %s, %s"
             zdslog.debug(ds % (self.events_enabled, self.plugins_enabled))
-            self.plugins = list()
+            plugins = list()
+        ###
+        # Replace the list rather than modifying it, so the Stack knows to
+        # rebuild this ZServ's plugin dispatch table.
+        ###
+        self.plugins = plugins
+
+    def get_word_matcher(self):
+        """Gets a WordMatcher for this ZServ's word list.
+
+        :rtype: :class:`~ZDStack.ZDSWordMatcher.WordMatcher`
+        :returns: a WordMatcher for the words in the 'word_list_file'
+                  option, or None if the option isn't set
+
+        The word list is loaded again whenever its file changes, so
+        plugins should call this each time they scan a message rather
+        than keeping the WordMatcher around.
+
+        """
+        word_list_file = self.word_list_file
+        if not word_list_file:
+            return None
+        try:
+            return get_word_matcher(word_list_file)
+        except (IOError, OSError), e:
+            es = "%s: Could not load word list file %s: %s"
+            zdslog.error(es % (self.name, word_list_file, e))
+            return None
+
+    def refresh_status(self, is_running=None):
+        """Takes a new snapshot of this ZServ's status.
+
+        :param is_running: optional, whether or not the zserv process
+                           is running, if the caller already knows
+        :type is_running: boolean
+
+        The snapshot is a dict::
+
+          {'name': <string: internal name of ZServ>,
+           'hostname': <string: hostname of ZServ>,
+           'mode': <string: Game mode of ZServ>,
+           'wads': <strings: list of ZServ's WADs>,
+           'optional_wads': <strings: list of ZServ's optional WADs>,
+           'ip': <string: the ZServ's IP address>,
+           'port': <int: ZServ's port>,
+           'players': <int: number of connected players>,
+           'max_players': <int: maximum number of connected players>,
+           'map_name': <string: name of the current map>,
+           'map_number': <int: number of the current map>,
+           'round_id': <int: ID of the current round>,
+           'is_running': <boolean: whether ZServ is currently running>,
+           'generation': <int: incremented every time any ZServ's
+                          snapshot changes>}
+
+        Snapshots are taken when the zserv starts or stops, when its
+        configuration is reloaded, when the map changes, when players
+        connect or disconnect, and every few seconds by the Stack's
+        spawning timer.  If nothing has changed since the last
+        snapshot, only status_time is updated, so the generation (and
+        the ETag of get_all_zserv_info_if_changed) stays the same.
+
+        """
+        with self.zdstack.status_lock:
+            if is_running is None:
+                is_running = self.is_running()
+            ###
+            # Copying a deque to a list can't be interrupted by another
+            # thread, so we don't need the PlayersList's lock for this.
+            ###
+            players = list(self.players)
+            players = len([x for x in players if not x.disconnected])
+            status = {
+                'name': self.name,
+                'hostname': self.hostname,
+                'mode': self.game_mode,
+                'wads': list(self.wads),
+                'optional_wads': list(self.optional_wads),
+                'ip': getattr(self, 'ip', self.zdstack.hostname),
+                'port': self.port,
+                'players': players,
+                'max_players': getattr(self, 'max_players', 16),
+                'map_name': self.map_name,
+                'map_number': self.map_number,
+                'round_id': self.round_id,
+                'is_running': is_running
+            }
+            if self.status is not None:
+                previous_status = dict(self.status)
+                del previous_status['generation']
+                if status == previous_status:
+                    self.status_time = time.time()
+                    return
+            self.zdstack.status_generation += 1
+            status['generation'] = self.zdstack.status_generation
+            self.status = status
+            self.status_time = time.time()
 
     def clear_state(self):
         """Clears the current state of the round."""
         with self.state_lock:
             self.players.clear(acquire_lock=False)
+            self.plugin_state.clear()
             self.players_holding_flags = set()
             self.teams_holding_flags = set()
+            self.open_flag_touches = dict()
             self.fragged_runners = list()
             if self.playing_colors:
                 self.team_scores = dict(zip(self.playing_colors,
@@ -155,19 +307,21 @@ class ZServ(object):
             ###
             zdslog.debug("Updating %s" % (round))
             session.merge(round)
-            for flag_touch in round.flag_touches:
+            with self.state_lock:
+                open_flag_touches = self.open_flag_touches.values()
+                self.open_flag_touches = dict()
+            for flag_touch in open_flag_touches:
                 ###
                 # Players can hold flags until a round ends, thus the
                 # FlagTouch will never have a loss_time.  Technically,
                 # however, the loss_time would be at the end of a round,
                 # because you can't hold a flag when there is no round.
                 ###
-                ds = "Checking that %s has a loss_time"
-                zdslog.debug(ds % (flag_touch))
                 if not flag_touch.loss_time:
                     flag_touch.loss_time = now
                     zdslog.debug("Updating %s" % (flag_touch))
                     session.merge(flag_touch)
+            summarize_round(round.id, session)
         self.round_id = None
         self.clear_state()
 
@@ -376,6 +530,9 @@ class ZServ(object):
                             raise
             if not os.path.exists(self.fifo_path):
                 os.mkfifo(self.fifo_path)
+        if reload:
+            self.load_plugins()
+            self.refresh_status()
 
     def __str__(self):
         return "<ZServ [%s:%d]>" % (self.name, self.port)
@@ -419,6 +576,31 @@ class ZServ(object):
                 # zdslog.debug(s % (loglink_path, self.fifo_path))
                 os.symlink(self.fifo_path, loglink_path)
 
+    def write_config_file(self):
+        """Writes the zserv's configuration file if it's changed.
+
+        :rtype: boolean
+        :returns: whether or not the file was written
+
+        The file is only written if its contents have changed since it
+        was last written, or if it's been modified (or removed) by
+        something else since then.
+
+        """
+        config_data = self.config.get_config_data()
+        config_hash = hashlib.md5(config_data).hexdigest()
+        try:
+            mtime = os.path.getmtime(self.config_file)
+        except OSError:
+            mtime = None
+        if self.config_file_state == (self.config_file, config_hash, mtime):
+            return False
+        with open(self.config_file, 'w') as fobj:
+            fobj.write(config_data)
+        mtime = os.path.getmtime(self.config_file)
+        self.config_file_state = (self.config_file, config_hash, mtime)
+        return True
+
     def start(self):
         """Starts the zserv process.
         
@@ -426,45 +608,55 @@ class ZServ(object):
         self.zserv.
         
         """
-        # zdslog.debug('Acquiring spawn lock [%s]' % (self.name))
+        ###
+        # Everything here but forking the zserv process is specific to this
+        # ZServ, so only the fork holds the Stack's spawn lock and several
+        # ZServs can be started at once.
+        ###
         with self.config_lock:
+            if self.is_running():
+                return
+            self.start_time = datetime.now()
+            self.restarts.append(datetime.now())
+            self.metrics.increment('restarts')
+            self.write_config_file()
+            self.ensure_loglinks_exist()
+            if self.plugins_enabled:
+                for plugin in self.plugins:
+                    zdslog.info("Loaded plugin [%s]" % (plugin))
+            else:
+                pass
+                # zdslog.info("Not loading plugins")
+            ###
+            # Should we do something with STDERR here?
+            ###
+            ###
+            # Due to the semi-complicated blocking structure of FIFOs,
+            # there is a specific order in which this has to be done.
+            #
+            #   - Writing to a FIFO blocks until there is something
+            #     listening, so self.zdstack.polling_thread has to be
+            #     spawned.
+            #   - The polling thread only handles ZServs with .fifo
+            #     attributes that are non-False, so self.fifo has to be
+            #     created.
+            #   - Then the zserv can be spawned.
+            ###
+            zdslog.info("Spawning zserv [%s]" % (' '.join(self.cmd)))
+            self.fifo = os.open(self.fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+            ###
+            # subprocess.Popen isn't safe to call from several threads at
+            # once.
+            ###
+            # zdslog.debug('Acquiring spawn lock [%s]' % (self.name))
             with self.zdstack.spawn_lock:
-                if self.is_running():
-                    return
-                self.start_time = datetime.now()
-                self.restarts.append(datetime.now())
-                with open(self.config_file, 'w') as fobj:
-                    fobj.write(self.config.get_config_data())
-                self.ensure_loglinks_exist()
-                if self.plugins_enabled:
-                    for plugin in self.plugins:
-                        zdslog.info("Loaded plugin [%s]" % (plugin))
-                else:
-                    pass
-                    # zdslog.info("Not loading plugins")
-                ###
-                # Should we do something with STDERR here?
-                ###
-                ###
-                # Due to the semi-complicated blocking structure of FIFOs,
-                # there is a specific order in which this has to be done.
-                #
-                #   - Writing to a FIFO blocks until there is something
-                #     listening, so self.zdstack.polling_thread has to be
-                #     spawned.
-                #   - The polling thread only handles ZServs with .fifo
-                #     attributes that are non-False, so self.fifo has to be
-                #     created.
-                #   - Then the zserv can be spawned.
-                ###
-                zdslog.info("Spawning zserv [%s]" % (' '.join(self.cmd)))
-                self.fifo = os.open(self.fifo_path, os.O_RDONLY | os.O_NONBLOCK)
                 self.zserv = Popen(self.cmd, stdin=PIPE, stdout=DEVNULL,
                                    stderr=DEVNULL, bufsize=0, close_fds=True,
                                    cwd=self.home_folder)
-                # self.fifo = self.zserv.stdout.fileno()
-                # zdslog.debug("%s: FIFO: %s" % (self.name, self.fifo))
-                # self.send_to_zserv('players') # avoids CPU spinning
+            self.refresh_status()
+            # self.fifo = self.zserv.stdout.fileno()
+            # zdslog.debug("%s: FIFO: %s" % (self.name, self.fifo))
+            # self.send_to_zserv('players') # avoids CPU spinning
 
     def stop(self, check_if_running=True, signum=15):
         """Stops the zserv process.
@@ -519,6 +711,7 @@ class ZServ(object):
             self.zserv = None
             self.clean_up()
             self.round_initialized.set()
+            self.refresh_status(is_running=False)
             return error_stopping
         else:
             raise Exception("[%s] already stopped" % (self.name))
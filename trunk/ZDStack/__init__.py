@@ -18,15 +18,12 @@ from ZDStack.ZDSConfigParser import RawZDSConfigParser as RCP
 
 ###
 # ORM Stuff
+#
+# SQLAlchemy is only imported by the functions that use it, so tools that
+# never touch the database (zdrpc, zservctl, etc.) don't pay for importing
+# it.
 ###
 
-from sqlalchemy import create_engine, MetaData, select, and_
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import scoped_session, sessionmaker, relation, mapper, \
-                           column_property
-from sqlalchemy.pool import StaticPool, NullPool
-from sqlalchemy.orm.exc import NoResultFound
-
 DB_SESSION_CLASS = None
 DB_METADATA = None
 DB_AUTOFLUSH = None
@@ -46,7 +43,7 @@ __all__ = [
   'CONFIGFILE',
   'CONFIGPARSER',
   'DEBUGGING',
-  'PLUGINS',
+  'PLUGIN_LOADER',
   'DATEFMT',
   'JSON_MODULE',
   'RPC_CLASS',
@@ -61,6 +58,7 @@ __all__ = [
   'TeamNotFoundError',
   'ZServNotFoundError',
   'RPCAuthenticationError',
+  'RPCServerBusyError',
   'DebugTRFH',
   'DB_SESSION_CLASS',
   'DB_METADATA',
@@ -81,6 +79,8 @@ __all__ = [
   'get_zdaemon_banlist_data',
   'get_zdaemon_banlist_file',
   'get_server_proxy',
+  'get_client_config',
+  'get_client_proxy',
   'get_plugins',
   'set_debugging',
   'get_zdslog',
@@ -160,7 +160,9 @@ class DummyLog(object):
 
 SUPPORTED_GAME_MODES = ('ctf', 'coop', 'duel', 'ffa', 'teamdm')
 
-NO_AUTH_REQUIRED = ('list_zserv_names', 'get_zserv_info', 'get_all_zserv_info')
+NO_AUTH_REQUIRED = ('list_zserv_names', 'get_zserv_info', 'get_all_zserv_info',
+                    'get_all_zserv_info_if_changed', 'get_leaderboard',
+                    'get_all_leaderboards')
 
 DEVNULL = open(os.devnull, 'w')
 DATEFMT = '%Y-%m-%d %H:%M:%S.%f'
@@ -169,7 +171,18 @@ TICK = Decimal('0.027')
 MAX_TIMEOUT = 1
 DIE_THREADS_DIE = False
 ZDAEMON_BANLIST_URL = 'http://zdaemon.ath.cx/bans/'
-URL_OPENER = urllib.FancyURLopener()
+URL_OPENER = None
+
+###
+# The only options RPC clients need.  They're cached (keyed by the
+# configuration file's path, size and modification time) in
+# CLIENT_CONFIG_CACHE, so clients like zdrpc and zservctl don't have to parse
+# and check the whole configuration file every time they run.
+###
+CLIENT_CONFIG_OPTIONS = ('zdstack_rpc_hostname', 'zdstack_port',
+                         'zdstack_rpc_protocol', 'zdstack_username',
+                         'zdstack_password')
+CLIENT_CONFIG_CACHE = '~/.zdstack_client_cache'
 
 ###
 # These are all internal __init__ globals, and they all have getters that
@@ -182,7 +195,7 @@ LOOPBACK = None
 CONFIGFILE = None
 CONFIGPARSER = None
 DEBUGGING = None
-PLUGINS = None
+PLUGIN_LOADER = None
 ZDAEMON_BANLIST_FILE = None
 DB_LOCK = None
 ###
@@ -230,6 +243,12 @@ class RPCAuthenticationError(Exception):
     def __init__(self, username):
         Exception.__init__(self, "Authentication failed for [%s]" % (username))
 
+class RPCServerBusyError(Exception):
+
+    def __init__(self, method):
+        es = "Too many concurrent [%s] requests, try again later"
+        Exception.__init__(self, es % (method))
+
 class DebugFormatter(logging.Formatter):
 
     def formatTime(self, record, datefmt=None):
@@ -254,8 +273,8 @@ class DebugFormatter(logging.Formatter):
 class JSONNotFoundError(Exception):
 
     def __init__(self):
-        es = "Using JSON-RPC requires either Python 2.6 (or higher) or "
-        es += "simplejson"
+        es = "Using JSON (JSON-RPC, archiving rounds, etc.) requires "
+        es += "either Python 2.6 (or higher) or simplejson"
         Exception.__init__(self, es)
 
 def get_hostname():
@@ -424,6 +443,22 @@ def check_server_config_section(server_name, config):
             es = "Could not locate fake logfile [%s]"
             raise ValueError(es % (d['fake_logfile']))
 
+def _load_json_module():
+    global JSON_MODULE
+    ###
+    # Python 2.6 and up have a 'json' module we can use.  Otherwise we
+    # require simplejson.
+    ###
+    try:
+        import json
+        JSON_MODULE = json
+    except ImportError:
+        try:
+            import simplejson
+            JSON_MODULE = simplejson
+        except ImportError:
+            raise JSONNotFoundError
+
 def load_configparser(check=False):
     """Loads the ZDStack configuration file into a ConfigParser.
     
@@ -474,20 +509,7 @@ def load_configparser(check=False):
     rp = zrp.lower()
     if rp in ('jsonrpc', 'json-rpc'):
         cp.set('DEFAULT', 'zdstack_rpc_protocol', 'json-rpc')
-        global JSON_MODULE
-        ###
-        # Python 2.6 and up have a 'json' module we can use.  Otherwise we
-        # require simplejson.
-        ###
-        try:
-            import json
-            JSON_MODULE = json
-        except ImportError:
-            try:
-                import simplejson
-                JSON_MODULE = simplejson
-            except ImportError:
-                raise JSONNotFoundError
+        _load_json_module()
     elif rp in ('xmlrpc', 'xml-rpc'):
         cp.set('DEFAULT', 'zdstack_rpc_protocol', 'xml-rpc')
     else:
@@ -554,6 +576,8 @@ def _get_embedded_engine(db_engine, cp):
     use of embedded databases, and this method sets them.
 
     """
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
     ZDSLOG.debug("Getting embedded engine")
     if db_engine == 'sqlite':
         db_name = cp.get('DEFAULT', 'zdstack_database_name', ':memory:')
@@ -591,6 +615,8 @@ def _get_full_engine(db_engine, cp):
     use of full databases, and this method sets them.
 
     """
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
     ZDSLOG.debug("Getting full engine")
     db_str = '%s://' % (db_engine.replace('-', ''))
     ###
@@ -660,6 +686,9 @@ def get_engine():
 
     :rtype: an SQLAlchemy Engine instance.
 
+    The engine is created the first time this is called, not when
+    ZDStack is imported.
+
     """
     ###
     # At this point, we are assuming that stats have been enabled.
@@ -668,8 +697,11 @@ def get_engine():
     global DB_ENGINE
     global DB_AUTOFLUSH
     global DB_AUTOCOMMIT
-    global DB_LOCK
-    DB_LOCK = Lock()
+    ###
+    # The DB lock may already be in use (ZDSDatabase gets it when it's
+    # imported), so don't replace it.
+    ###
+    get_db_lock()
     if not DB_ENGINE:
         cp = get_configparser()
         db_engine = cp.get('DEFAULT', 'zdstack_database_engine', 'sqlite')
@@ -686,6 +718,8 @@ def get_engine():
         else:
             DB_ENGINE = _get_full_engine(db_engine, cp)
             DB_AUTOFLUSH, DB_AUTOCOMMIT = (True, True)
+        if DB_METADATA:
+            DB_METADATA.bind = DB_ENGINE
     return DB_ENGINE
 
 def get_metadata():
@@ -693,11 +727,17 @@ def get_metadata():
 
     :rtype: an SQLAlchemy MetaData instance.
 
+    Getting the metadata doesn't create the engine, so tables can be
+    defined without connecting to the database.  The metadata is bound
+    to the engine when the engine is created.
+
     """
     global DB_METADATA
     if not DB_METADATA:
+        from sqlalchemy import MetaData
         DB_METADATA = MetaData()
-        DB_METADATA.bind = get_engine()
+        if DB_ENGINE:
+            DB_METADATA.bind = DB_ENGINE
     return DB_METADATA
 
 def get_session_class():
@@ -708,8 +748,8 @@ def get_session_class():
     """
     global DB_SESSION_CLASS
     if not DB_SESSION_CLASS:
-        if None in (DB_ENGINE, DB_AUTOFLUSH, DB_AUTOCOMMIT):
-            raise Exception("Database engine has not been created yet.")
+        from sqlalchemy.orm import scoped_session, sessionmaker
+        get_engine()
         ZDSLOG.debug("autoflush is %s" % (DB_AUTOFLUSH))
         ZDSLOG.debug("autocommit is %s" % (DB_AUTOCOMMIT))
         DB_SESSION_CLASS = scoped_session(sessionmaker())
@@ -753,6 +793,8 @@ def get_zdaemon_banlist_data():
     """
     global URL_OPENER
     global ZDAEMON_BANLIST_URL
+    if URL_OPENER is None:
+        URL_OPENER = urllib.FancyURLopener()
     url_fobj = URL_OPENER.open(ZDAEMON_BANLIST_URL)
     banlist_data = url_fobj.read()
     url_fobj.close()
@@ -811,10 +853,13 @@ def get_json_module():
     :returns: either the json module included with Python 2.6, or the
               simplejson module.
 
+    The module is loaded the first time it's needed, so this works
+    whatever the RPC protocol is.  If neither module is available, a
+    JSONNotFoundError is raised.
+
     """
-    global JSON_MODULE
     if not JSON_MODULE:
-        raise JSONNotFoundError
+        _load_json_module()
     return JSON_MODULE
 
 def get_server_proxy():
@@ -830,6 +875,103 @@ def get_server_proxy():
     ZDSLOG.debug("%s(%s)" % (RPC_PROXY_CLASS, address))
     return get_rpc_proxy_class()(address)
 
+def _load_client_config():
+    cp = CP(get_configfile())
+    d = dict()
+    for x in CLIENT_CONFIG_OPTIONS:
+        if x == 'zdstack_rpc_protocol':
+            d[x] = cp.get('DEFAULT', x, 'xml-rpc')
+        elif x == 'zdstack_rpc_hostname':
+            d[x] = cp.get('DEFAULT', x, 'localhost')
+        else:
+            d[x] = cp.get('DEFAULT', x, default=False)
+            if not d[x]:
+                raise ValueError("Required global option %s not found" % (x))
+    rp = d['zdstack_rpc_protocol'].lower()
+    if rp in ('jsonrpc', 'json-rpc'):
+        d['zdstack_rpc_protocol'] = 'json-rpc'
+    elif rp in ('xmlrpc', 'xml-rpc'):
+        d['zdstack_rpc_protocol'] = 'xml-rpc'
+    else:
+        es = "RPC Protocol [%s] not supported"
+        raise ValueError(es % (d['zdstack_rpc_protocol']))
+    if d['zdstack_rpc_hostname'] == 'localhost':
+        d['zdstack_rpc_hostname'] = get_loopback()
+    return d
+
+def get_client_config():
+    """Gets the options RPC clients need.
+
+    :rtype: dict
+    :returns: {<string: option>: <string: value>}, for each option in
+              CLIENT_CONFIG_OPTIONS
+
+    Unlike :func:`load_configparser`, this doesn't check any files,
+    folders or server sections, and the options are cached in
+    CLIENT_CONFIG_CACHE until the configuration file changes.  If the
+    cache can't be read or written, the options are just loaded from
+    the configuration file.
+
+    """
+    import cPickle
+    config_file = get_configfile()
+    st = os.stat(config_file)
+    key = (st.st_size, st.st_mtime)
+    cache_file = resolve_path(CLIENT_CONFIG_CACHE)
+    try:
+        fobj = open(cache_file, 'rb')
+        try:
+            cache = cPickle.load(fobj)
+        finally:
+            fobj.close()
+    except Exception:
+        cache = dict()
+    if config_file in cache and cache[config_file][0] == key:
+        return dict(cache[config_file][1])
+    client_config = _load_client_config()
+    cache[config_file] = (key, client_config)
+    ###
+    # The cache holds the RPC password, so only the user can read it, and
+    # it's written to a temporary file first so other clients never read
+    # half of it.
+    ###
+    tmp_file = '%s.%d' % (cache_file, os.getpid())
+    try:
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600)
+        fobj = os.fdopen(fd, 'wb')
+        try:
+            cPickle.dump(cache, fobj, cPickle.HIGHEST_PROTOCOL)
+        finally:
+            fobj.close()
+        os.rename(tmp_file, cache_file)
+    except Exception:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return dict(client_config)
+
+def get_client_proxy(client_config):
+    """Gets a ZDStack server proxy without loading the configuration.
+
+    :param client_config: the options returned by
+                          :func:`get_client_config`
+    :type client_config: dict
+    :rtype: an instance of either :class:`~ZDStack.RPCServer.XMLProxy`
+                               or :class:`~ZDStack.RPCServer.JSONProxy`
+
+    """
+    global RPC_PROXY_CLASS
+    if client_config['zdstack_rpc_protocol'] == 'json-rpc':
+        if not JSON_MODULE:
+            _load_json_module()
+        from ZDStack.RPCServer import JSONProxy
+        RPC_PROXY_CLASS = JSONProxy
+    else:
+        from ZDStack.RPCServer import XMLProxy
+        RPC_PROXY_CLASS = XMLProxy
+    address = 'http://%s:%s' % (client_config['zdstack_rpc_hostname'],
+                                client_config['zdstack_port'])
+    return RPC_PROXY_CLASS(address)
+
 def get_configparser(reload=False, raw=False, check=False):
     """Gets ZDStack's ConfigParser.
 
@@ -857,19 +999,21 @@ def get_plugins(plugins='all'):
     :param plugins: the names of the plugins to get, if 'all', returns
                     all plugins.
     :type plugins: list of strings or string
-    :rtype: a list of modules
+    :rtype: a list of functions
+
+    Plugin files that have changed since they were last loaded are
+    loaded again, so this also reloads plugins.
 
     """
-    global PLUGINS
-    if PLUGINS is None:
-        cp = get_configparser()
-        plugin_folder = cp.getpath('DEFAULT', 'zdstack_plugin_folder', False)
-        if not plugin_folder:
-            PLUGINS = []
-        else:
-            from ZDStack.Plugins import get_plugins
-            PLUGINS = get_plugins(plugin_folder)
-    return [x for x in PLUGINS if plugins == 'all' or x.__name__ in plugins]
+    global PLUGIN_LOADER
+    cp = get_configparser()
+    plugin_folder = cp.getpath('DEFAULT', 'zdstack_plugin_folder', False)
+    if not plugin_folder:
+        return []
+    if PLUGIN_LOADER is None or PLUGIN_LOADER.plugin_path != plugin_folder:
+        from ZDStack.Plugins import PluginLoader
+        PLUGIN_LOADER = PluginLoader(plugin_folder)
+    return PLUGIN_LOADER.get_plugins(plugins)
 
 def set_debugging(debugging):
     """Turns debugging on or off.
@@ -951,6 +1095,9 @@ def initialize_database(do_not_map=False, insert_initial_data=True):
 
     """
     global DB_INITIALIZED
+    from sqlalchemy import and_
+    from sqlalchemy.exc import IntegrityError
+    from sqlalchemy.orm import relation, mapper
     # zdslog = get_zdslog()
     # zdslog.debug("Initializing Database")
     engine = get_engine()
@@ -966,7 +1113,9 @@ def initialize_database(do_not_map=False, insert_initial_data=True):
                                   rounds_table, stored_players_table, \
                                   frags_table, flag_touches_table, \
                                   flag_returns_table, rcon_accesses_table, \
-                                  rcon_actions_table, rcon_denials_table
+                                  rcon_actions_table, rcon_denials_table, \
+                                  round_alias_stats_table, \
+                                  round_alias_weapon_stats_table
     ###
     # Wow do I ever wish I could do from ZDStack.ZDSModels import * here.
     # Fuck!
@@ -974,7 +1123,8 @@ def initialize_database(do_not_map=False, insert_initial_data=True):
     from ZDStack.ZDSModels import Alias, TeamColor, Wad, Map, Weapon, Port, \
                                   GameMode, Round, StoredPlayer, Frag, \
                                   FlagTouch, FlagReturn, RCONAccess, \
-                                  RCONAction, RCONDenial, RoundsAndAliases
+                                  RCONAction, RCONDenial, RoundsAndAliases, \
+                                  RoundAliasStats, RoundAliasWeaponStats
     if not do_not_map:
         ###
         # Parent cascades.
@@ -990,7 +1140,11 @@ def initialize_database(do_not_map=False, insert_initial_data=True):
          'flag_returns': relation(FlagReturn, backref='alias', cascade=_pc),
          'rcon_accesses': relation(RCONAccess, backref='alias', cascade=_pc),
          'rcon_denials': relation(RCONDenial, backref='alias', cascade=_pc),
-         'rcon_actions': relation(RCONAction, backref='alias', cascade=_pc)
+         'rcon_actions': relation(RCONAction, backref='alias', cascade=_pc),
+         'round_stats': relation(RoundAliasStats, backref='alias',
+                                 cascade=_pc),
+         'round_weapon_stats': relation(RoundAliasWeaponStats,
+                                        backref='alias', cascade=_pc)
         })
         mapper(TeamColor, team_colors_table, properties={
          'frags': relation(Frag, backref='fragger_team_color', cascade=_pc,
@@ -1027,7 +1181,11 @@ def initialize_database(do_not_map=False, insert_initial_data=True):
          'flag_returns': relation(FlagReturn, backref='round', cascade=_pc),
          'rcon_accesses': relation(RCONAccess, backref='round', cascade=_pc),
          'rcon_denials': relation(RCONDenial, backref='round', cascade=_pc),
-         'rcon_actions': relation(RCONAction, backref='round', cascade=_pc)
+         'rcon_actions': relation(RCONAction, backref='round', cascade=_pc),
+         'alias_stats': relation(RoundAliasStats, backref='round',
+                                 cascade=_pc),
+         'alias_weapon_stats': relation(RoundAliasWeaponStats,
+                                        backref='round', cascade=_pc)
         })
         mapper(RoundsAndAliases, rounds_and_aliases, properties={
           'alias': relation(Alias),
@@ -1048,8 +1206,20 @@ def initialize_database(do_not_map=False, insert_initial_data=True):
         mapper(RCONAccess, rcon_accesses_table)
         mapper(RCONDenial, rcon_denials_table)
         mapper(RCONAction, rcon_actions_table)
+        mapper(RoundAliasStats, round_alias_stats_table)
+        mapper(RoundAliasWeaponStats, round_alias_weapon_stats_table,
+               properties={'weapon': relation(Weapon)})
+    ###
+    # create_all() only creates missing tables (and their indexes), so
+    # changes to existing tables are made by migrations.  A new database's
+    # tables already match the latest schema, so its migrations are just
+    # recorded as applied.
+    ###
+    from ZDStack.ZDSMigrations import is_new_database, migrate_database
+    new_database = is_new_database(engine)
     # zdslog.debug("Creating tables")
     metadata.create_all(engine)
+    migrate_database(engine, new_database=new_database)
     # zdslog.debug("Initializing Database Data")
     if insert_initial_data:
         from ZDStack.ZDSDatabaseData import insert_initial_data
@@ -29,6 +29,7 @@ setup(
     'bin/zdrpc',
     'bin/zdsweb',
     'bin/watch_zd_fifo',
-    'bin/events_to_db'
+    'bin/events_to_db',
+    'bin/summarize_rounds'
   ]
 )